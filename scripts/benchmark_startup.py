@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Benchmark du temps de démarrage à froid de la CLI auto-heal
+
+Mesure le temps d'exécution des commandes légères (--help, status) et vérifie
+qu'aucun module lourd (Playwright, SDK LLM, GitPython) n'est importé par la CLI.
+Retourne un code non nul si la cible est dépassée (utilisable en CI).
+
+Usage:
+    python scripts/benchmark_startup.py [--runs 5] [--target-ms 800]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+FRAMEWORK_DIR = Path(__file__).resolve().parent.parent / "sources" / "gen-tests-self-healing"
+
+# Lightweight commands: (description, CLI arguments)
+COMMANDS = [
+    ("auto-heal --help", ["--help"]),
+    ("auto-heal status", ["status"]),
+    ("auto-heal run --help", ["run", "--help"]),
+]
+
+# Modules that must never be imported by the CLI module itself
+HEAVY_MODULES = ["playwright", "openai", "anthropic", "agent_framework", "git", "opentelemetry", "pytest"]
+
+
+def run_cli(args, cwd):
+    """
+    Run the CLI once in a fresh interpreter
+
+    Returns:
+        Wall time in ms, and the error output if the CLI failed (None otherwise)
+    """
+    code = f"import sys; sys.argv = ['auto-heal'] + {args!r}; from framework.cli import cli; cli()"
+    env = dict(os.environ, PYTHONPATH=str(FRAMEWORK_DIR), PYTHONDONTWRITEBYTECODE="1")
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, (result.stderr.strip() or f"exit code {result.returncode}") if result.returncode else None
+
+
+def check_heavy_imports():
+    """
+    Return the heavy modules loaded by `import framework.cli`
+
+    Returns:
+        The heavy modules, and the error output if the import failed (None otherwise)
+    """
+    code = (
+        "import sys, framework.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=str(FRAMEWORK_DIR))
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    if result.returncode:
+        return [], result.stderr.strip() or f"exit code {result.returncode}"
+    return [name for name in result.stdout.strip().split(",") if name], None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (median is reported)")
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_TARGET_MS", "800")),
+        help="Maximum median cold-start time per command",
+    )
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  Benchmark du démarrage de la CLI auto-heal")
+    print("=" * 60)
+
+    failed = False
+    work_dir = Path(os.getenv("TMPDIR", "/tmp")) if os.name != "nt" else Path(os.getenv("TEMP", "."))
+
+    for description, cli_args in COMMANDS:
+        runs = [run_cli(cli_args, work_dir) for _ in range(args.runs)]
+        error = next((error for _, error in runs if error), None)
+        if error:
+            # A CLI crashing at startup is fast: its timing means nothing
+            failed = True
+            print(f"❌ {description:<25} a échoué :\n{error}")
+            continue
+        timings = [elapsed for elapsed, _ in runs]
+        median = statistics.median(timings)
+        ok = median <= args.target_ms
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {description:<25} median {median:7.0f} ms (min {min(timings):.0f} ms)")
+
+    heavy, error = check_heavy_imports()
+    if error:
+        failed = True
+        print(f"❌ import framework.cli a échoué :\n{error}")
+    elif heavy:
+        failed = True
+        print(f"❌ framework.cli imports heavy modules: {', '.join(heavy)}")
+    else:
+        print("✅ framework.cli imports no heavy module")
+
+    print(f"\nCible: {args.target_ms:.0f} ms par commande")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,17 @@
 Gen-Tests-Self-Healing Framework
 A self-healing test automation framework with Playwright and LLM integration
 """
+from importlib import import_module
 
 __version__ = "1.0.0"
 
-from framework.core.test_runner import AutoHealTestRunner
-from framework.core.config import config
-from framework.core.logger import get_logger
+# Components are loaded on first access (PEP 562): importing the package does
+# not pull in Playwright, the agent framework or the LLM SDKs.
+_LAZY_ATTRIBUTES = {
+    "AutoHealTestRunner": "framework.core.test_runner",
+    "config": "framework.core.config",
+    "get_logger": "framework.core.logger",
+}
 
 __all__ = [
     "AutoHealTestRunner",
@@ -15,3 +20,15 @@ __all__ = [
     "get_logger",
 ]
 
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
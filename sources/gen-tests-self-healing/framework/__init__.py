@@ -1,10 +1,29 @@
 """
 Core framework components
+
+Components are loaded on first access (PEP 562) so lightweight commands
+(auto-heal --help, status, ...) do not pay for Playwright, OpenAI or GitPython.
 """
-from .core.config import config
-from .core.logger import get_logger
-from .core.test_runner import AutoHealTestRunner
-from .core.patch_manager import PatchManager
+from importlib import import_module
+
+_LAZY_ATTRIBUTES = {
+    "config": ".core.config",
+    "get_logger": ".core.logger",
+    "AutoHealTestRunner": ".core.test_runner",
+    "PatchManager": ".core.patch_manager",
+}
 
 __all__ = ["config", "get_logger", "AutoHealTestRunner", "PatchManager"]
 
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
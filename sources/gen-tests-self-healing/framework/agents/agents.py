@@ -18,6 +18,7 @@ class AnalysisResult(BaseModel):
     selector_method: str = Field(description="The Playwright method (e.g. get_by_role)")
     confidence: float = Field(description="Confidence score between 0.0 and 1.0")
     reasoning: str = Field(description="Explanation of why this selector is better")
+    alternative_selectors: list[str] = Field(description="Backup selectors, best first", default_factory=list)
 
 class PatchResult(BaseModel):
     """Result of the patch generation"""
@@ -2,11 +2,16 @@
 Orchestrator for GenTestsSH Agents
 """
 import json
+import time
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from agent_framework import Workflow
 from .agents import AgentFactory, AnalysisResult, PatchResult
+from ..core.config import config
+from ..core.event_bus import LLM_REQUEST, LLM_RESPONSE, event_bus
 from ..core.logger import get_logger
+from ..llm.prompt_builder import PromptBuilder
+from ..llm.usage import LLMCallUsage, UsageTotals, extract_usage, get_project_name, usage_tracker
 
 logger = get_logger(__name__)
 
@@ -29,54 +34,48 @@ class AgentOrchestrator:
         """
         logger.info("Starting agentic self-healing workflow...")
 
-        # 1. Analysis Step
-        analysis_prompt = self._build_analysis_prompt(context)
-        logger.info("Requesting analysis from AnalysisAgent...")
-        
-        try:
-            # Agent.run() returns an AgentRunResponse object
-            analysis_response = await self.analysis_agent.run(analysis_prompt)
-            
-            # Extract text from response
-            if hasattr(analysis_response, 'text'):
-                response_text = analysis_response.text
-            elif hasattr(analysis_response, 'content'):
-                response_text = analysis_response.content
-            elif isinstance(analysis_response, str):
-                response_text = analysis_response
-            else:
-                # Try to convert to string
-                response_text = str(analysis_response)
-            
-            # Clean up markdown if present
-            clean_response = response_text.replace("```json", "").replace("```", "").strip()
-            analysis_data = json.loads(clean_response)
-            analysis = AnalysisResult(**analysis_data)
-                
-            logger.info(f"Analysis complete. Root cause: {analysis.root_cause}")
-            logger.info(f"Confidence: {analysis.confidence}")
+        if usage_tracker.budget_exceeded:
+            logger.warning("LLM budget for this run exhausted, skipping heal")
+            return {"confidence": 0.0, "error": "LLM budget exceeded"}
 
-        except Exception as e:
-            logger.error(f"Analysis failed: {e}")
-            return {"confidence": 0.0, "error": str(e)}
+        usage = UsageTotals()
+
+        # 1. Analysis Step (extra samples run concurrently, their selectors become heal candidates)
+        analysis_prompt = self._build_analysis_prompt(context)
+        samples = 1 + max(config.auto_heal.heal_samples, 0)
+        logger.info(f"Requesting {samples} analysis sample(s) from AnalysisAgent...")
+
+        results = await asyncio.gather(
+            *(self._analyze(analysis_prompt, context) for _ in range(samples)), return_exceptions=True
+        )
+        analyses = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"Analysis failed: {result}")
+                continue
+            analysis, call_usage = result
+            usage.add(call_usage)
+            if analysis is not None:
+                analyses.append(analysis)
+
+        if not analyses:
+            error = next((str(result) for result in results if isinstance(result, BaseException)), "no valid analysis")
+            return {"confidence": 0.0, "error": error, "usage": usage.model_dump()}
+
+        analysis, extra = analyses[0], analyses[1:]
+        logger.info(f"Analysis complete. Root cause: {analysis.root_cause}")
+        logger.info(f"Confidence: {analysis.confidence}")
 
         # 2. Patch Step
         patch_prompt = self._build_patch_prompt(context, analysis)
         logger.info("Requesting patch from PatchAgent...")
         
         try:
-            patch_response = await self.patch_agent.run(patch_prompt)
-            
-            # Extract text from response
-            if hasattr(patch_response, 'text'):
-                response_text = patch_response.text
-            elif hasattr(patch_response, 'content'):
-                response_text = patch_response.content
-            elif isinstance(patch_response, str):
-                response_text = patch_response
-            else:
-                response_text = str(patch_response)
-            
+            response_text, call_usage = await self._run_agent(
+                self.patch_agent, patch_prompt, "patch", context
+            )
+            usage.add(call_usage)
+
             clean_response = response_text.replace("```json", "").replace("```", "").strip()
             patch_data = json.loads(clean_response)
             patch = PatchResult(**patch_data)
@@ -89,30 +88,100 @@ class AgentOrchestrator:
                 "patch_code": patch.patch_code,
                 "explanation": patch.explanation,
                 "confidence": analysis.confidence,
-                "root_cause": analysis.root_cause
+                "root_cause": analysis.root_cause,
+                "alternative_selectors": analysis.alternative_selectors,
+                "samples": [
+                    {
+                        "selector": sample.suggested_selector,
+                        "selector_method": sample.selector_method,
+                        "confidence": sample.confidence,
+                        "alternative_selectors": sample.alternative_selectors,
+                    }
+                    for sample in extra
+                ],
+                "usage": usage.model_dump()
             }
 
         except Exception as e:
             logger.error(f"Patch generation failed: {e}")
-            return {"confidence": 0.0, "error": str(e)}
+            return {"confidence": 0.0, "error": str(e), "usage": usage.model_dump()}
 
-    def _build_analysis_prompt(self, context: Dict[str, Any]) -> str:
-        """Build prompt for analysis"""
-        dom_snapshot = context.get("dom_snapshot", "")
-        if len(dom_snapshot) > 50000:
-            dom_snapshot = dom_snapshot[:50000] + "\n... [DOM truncated]"
+    async def _analyze(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Tuple[Optional[AnalysisResult], LLMCallUsage]:
+        """
+        Run one analysis sample
 
-        return f"""
-Analyze this test failure:
+        Returns:
+            Tuple of (analysis, None if the response is not a valid analysis; usage of the call)
+        """
+        response_text, call_usage = await self._run_agent(self.analysis_agent, prompt, "analysis", context)
+        try:
+            # Clean up markdown if present
+            clean_response = response_text.replace("```json", "").replace("```", "").strip()
+            return AnalysisResult(**json.loads(clean_response)), call_usage
+        except Exception as e:
+            logger.error(f"Analysis response is not valid: {e}")
+            return None, call_usage
+
+    async def _run_agent(
+        self,
+        agent,
+        prompt: str,
+        operation: str,
+        context: Dict[str, Any]
+    ) -> Tuple[str, LLMCallUsage]:
+        """
+        Run an agent and record its token usage
 
-Error: {context.get('message')}
-Failed Selector: {context.get('selector')}
-Line: {context.get('line_number')}
-Code: {context.get('original_code')}
+        Args:
+            agent: Agent to run
+            prompt: Prompt sent to the agent
+            operation: Kind of call (analysis, patch, ...)
+            context: Failure context (used for per-test roll-up)
 
-DOM Snapshot:
-{dom_snapshot}
-"""
+        Returns:
+            Tuple of (response text, usage of the call)
+        """
+        event_bus.publish(
+            LLM_REQUEST, test_id=context.get("test_id"), operation=operation, model=config.llm.openai_model
+        )
+        start = time.perf_counter()
+        try:
+            # Agent.run() returns an AgentRunResponse object
+            response = await agent.run(prompt)
+        except Exception as e:
+            event_bus.publish(
+                LLM_RESPONSE, test_id=context.get("test_id"), operation=operation, model=config.llm.openai_model,
+                latency_ms=(time.perf_counter() - start) * 1000, error=str(e),
+            )
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        usage = extract_usage(response, config.llm.openai_model, operation, latency_ms)
+        usage_tracker.record(
+            usage,
+            test_id=context.get("test_id"),
+            project=get_project_name(context.get("test_file")),
+        )
+
+        # Extract text from response
+        if hasattr(response, 'text'):
+            response_text = response.text
+        elif hasattr(response, 'content'):
+            response_text = response.content
+        elif isinstance(response, str):
+            response_text = response
+        else:
+            # Try to convert to string
+            response_text = str(response)
+
+        return response_text, usage
+
+    def _build_analysis_prompt(self, context: Dict[str, Any]) -> str:
+        """Build prompt for analysis within the configured token budget"""
+        builder = PromptBuilder(model=config.llm.openai_model)
+        return builder.add_failure_context(context).build(header="Analyze this test failure:")
 
     def _build_patch_prompt(self, context: Dict[str, Any], analysis: AnalysisResult) -> str:
         """Build prompt for patch generation"""
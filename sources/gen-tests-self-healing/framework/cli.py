@@ -7,11 +7,11 @@ import click
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
-import json
 
+# Heavy modules (Playwright, GitPython, LLM SDKs) are imported inside the
+# commands that need them so `auto-heal --help` and `status` start fast.
 from framework.core.config import config
 from framework.core.logger import get_logger
-from framework.core.patch_manager import PatchManager
 
 logger = get_logger(__name__)
 console = Console()
@@ -32,7 +32,9 @@ def cli():
 @click.option('--max-retries', '-r', default=3, help='Maximum healing attempts')
 @click.option('--headless/--headed', default=True, help='Run browser in headless mode')
 @click.option('--debug', is_flag=True, help='Enable debug logging')
-def run(test_file: str, max_retries: int, headless: bool, debug: bool):
+@click.option('--order', type=click.Choice(['none', 'failed-first', 'longest-first']), default=None,
+              help='Run recently failing tests first, or the slowest first (default: TEST_ORDER)')
+def run(test_file: str, max_retries: int, headless: bool, debug: bool, order: str):
     """Run tests with auto-heal capability"""
 
     console.print(Panel.fit(
@@ -67,7 +69,10 @@ def run(test_file: str, max_retries: int, headless: bool, debug: bool):
 
         # Run pytest
         import pytest
-        exit_code = pytest.main([test_file, "-v", "--tb=short"])
+        args = [test_file, "-v", "--tb=short"]
+        if order:
+            args += ["--auto-heal-order", order]
+        exit_code = pytest.main(args)
 
         if exit_code == 0:
             console.print("\n[green]✓ All tests passed![/green]")
@@ -85,8 +90,14 @@ def run(test_file: str, max_retries: int, headless: bool, debug: bool):
 @cli.command()
 @click.argument('project_path', type=click.Path(exists=True))
 @click.option('--headless/--headed', default=True, help='Run browser in headless mode')
-def test_project(project_path: str, headless: bool):
-    """Run all tests for a specific project"""
+@click.option('--changed-since', default=None, metavar='GIT_REF',
+              help='Only run the tests affected by the files changed since a git ref')
+@click.option('--order', type=click.Choice(['none', 'failed-first', 'longest-first']), default=None,
+              help='Run recently failing tests first, or the slowest first (default: TEST_ORDER)')
+@click.option('--shard', default=None, metavar='K/N',
+              help='Only run shard K of N (parallel CI jobs), shards balanced by recorded durations')
+def test_project(project_path: str, headless: bool, changed_since: str, order: str, shard: str):
+    """Run all tests for a specific project (or the ones affected by recent changes)"""
     
     project_dir = Path(project_path).resolve()
     test_dir = project_dir / "tests"
@@ -120,8 +131,18 @@ def test_project(project_path: str, headless: bool):
         trace.set_tracer_provider(provider)
         
         import pytest
-        exit_code = pytest.main([str(test_dir), "-v", "--tb=short"])
-        
+        args = [str(test_dir), "-v", "--tb=short"]
+        if changed_since:
+            args += ["--changed-since", changed_since]
+        if order:
+            args += ["--auto-heal-order", order]
+        if shard:
+            args += ["--auto-heal-shard", shard]
+        exit_code = pytest.main(args)
+
+        if exit_code == pytest.ExitCode.NO_TESTS_COLLECTED and changed_since:
+            console.print(f"\n[green]No test affected by the changes since {changed_since}[/green]")
+            sys.exit(0)
         if exit_code == 0:
             console.print(f"\n[green]SUCCESS: All tests passed for {project_dir.name}![/green]")
         else:
@@ -137,8 +158,12 @@ def test_project(project_path: str, headless: bool):
 
 @cli.command()
 @click.option('--show-backups', is_flag=True, help='Show backup files')
-def status(show_backups: bool):
+@click.option('--limit', '-n', default=10, help='Number of recent patches to show')
+@click.option('--test-file', default=None, help='Only show patches of this test file')
+@click.option('--outcome', default=None, help='Only show patches with this outcome (applied, not_found, conflict)')
+def status(show_backups: bool, limit: int, test_file: str, outcome: str):
     """Show status of patches and backups"""
+    from framework.core.heal_ledger import HealLedger
 
     console.print(Panel.fit(
         "[bold cyan]Auto-Heal Framework Status[/bold cyan]",
@@ -146,55 +171,334 @@ def status(show_backups: bool):
     ))
 
     # Show patches
-    patch_dir = config.auto_heal.patch_dir
-    patches = list(patch_dir.glob("*.json"))
-
-    if patches:
-        table = Table(title="Recent Patches", show_header=True)
-        table.add_column("Timestamp", style="cyan")
-        table.add_column("Test File", style="yellow")
-        table.add_column("Confidence", style="green")
-
-        for patch_file in sorted(patches, reverse=True)[:10]:
-            with open(patch_file, 'r') as f:
-                data = json.load(f)
+    ledger = HealLedger()
+    if not ledger.db_path.exists():
+        console.print("\n[yellow]No patches found[/yellow]")
+    else:
+        heals = ledger.recent(limit=limit, test_file=test_file, outcome=outcome)
+
+        if heals:
+            table = Table(title="Recent Patches", show_header=True)
+            table.add_column("Patch ID", style="dim")
+            table.add_column("Timestamp", style="cyan")
+            table.add_column("Test File", style="yellow")
+            table.add_column("Selector", style="white")
+            table.add_column("Outcome", style="blue")
+            table.add_column("Confidence", style="green")
+            table.add_column("Cost (USD)", style="magenta")
+
+            for heal in heals:
                 table.add_row(
-                    data.get("timestamp", "Unknown")[:19],
-                    Path(data.get("test_file", "Unknown")).name,
-                    f"{data.get('confidence', 0):.2f}"
+                    heal["patch_id"],
+                    heal["timestamp"][:19],
+                    Path(heal["test_file"]).name,
+                    heal["selector"] or "-",
+                    heal["outcome"],
+                    f"{heal['confidence'] or 0:.2f}",
+                    f"{heal['cost_usd']:.4f}"
                 )
 
-        console.print(table)
-    else:
-        console.print("\n[yellow]No patches found[/yellow]")
+            console.print(table)
+
+            stats = ledger.stats()
+            outcomes = ", ".join(f"{name}: {count}" for name, count in sorted(stats["by_outcome"].items()))
+            console.print(
+                f"\n[cyan]Total:[/cyan] {stats['total']} patches ({outcomes}) - "
+                f"avg confidence {stats['avg_confidence']:.2f}, cost ${stats['cost_usd']:.4f}"
+            )
+        else:
+            console.print("\n[yellow]No patches found[/yellow]")
+
+    legacy = ledger.count_legacy_files()
+    if legacy:
+        console.print(
+            f"\n[yellow]{legacy} legacy JSON patch file(s) not in the ledger. "
+            f"Run: auto-heal migrate-ledger[/yellow]"
+        )
 
     # Show backups if requested
     if show_backups:
-        backup_dir = config.auto_heal.backup_dir
-        backups = list(backup_dir.glob("*.py"))
+        from framework.core.backup_store import BackupStore
 
-        if backups:
-            console.print(f"\n[cyan]Backups:[/cyan] {len(backups)} files in {backup_dir}")
+        backup_dir = config.auto_heal.backup_dir
+        store = BackupStore(backup_dir)
+        backups = store.stats()
+        legacy = list(backup_dir.glob("*.py"))
+
+        if backups["blobs"] or legacy:
+            console.print(
+                f"\n[cyan]Backups:[/cyan] {backups['blobs']} blobs "
+                f"({backups['bytes'] / 1024:.1f} KB compressed) in {store.root}"
+            )
+            if legacy:
+                console.print(f"[cyan]Legacy backups:[/cyan] {len(legacy)} files in {backup_dir}")
         else:
             console.print("\n[yellow]No backups found[/yellow]")
 
 
 @cli.command()
-@click.argument('backup_file', type=click.Path(exists=True))
-@click.argument('target_file', type=click.Path())
-def restore(backup_file: str, target_file: str):
-    """Restore a test file from backup"""
+@click.option('--keep-files', is_flag=True, help='Leave the JSON files in place after import')
+def migrate_ledger(keep_files: bool):
+    """Import legacy JSON patch files into the heal ledger"""
+    from framework.core.heal_ledger import HealLedger
+
+    ledger = HealLedger()
+    imported = ledger.import_json_files(archive=not keep_files)
+    console.print(f"[green]✓ Imported {imported} patch(es) into {ledger.db_path}[/green]")
+
+
+@cli.command()
+@click.argument('patch_id')
+@click.argument('target_file', type=click.Path(), required=False)
+@click.option('--force', is_flag=True, help='Restore even if the file changed after the patch')
+def restore(patch_id: str, target_file: str, force: bool):
+    """Undo a patch by id (see `status`), or restore TARGET_FILE from a legacy backup file"""
+    from framework.core.patch_manager import PatchManager
 
     manager = PatchManager()
-    success = manager.restore_backup(Path(backup_file), Path(target_file))
+    if target_file:
+        success = manager.restore_backup(Path(patch_id), Path(target_file))
+    else:
+        success = manager.restore_patch(patch_id, force=force)
 
     if success:
-        console.print(f"[green]✓ Restored {target_file} from backup[/green]")
+        console.print(f"[green]✓ Restored {target_file or patch_id} from backup[/green]")
     else:
         console.print(f"[red]✗ Failed to restore backup[/red]")
         sys.exit(1)
 
 
+@cli.command()
+@click.argument('path', type=click.Path(exists=True), default='.')
+@click.option('--apply', 'apply_patches', is_flag=True, help='Rewrite the call sites in one batched edit and commit')
+def propagate(path: str, apply_patches: bool):
+    """List the call sites still using a selector healed elsewhere, and rewrite them with --apply"""
+    from framework.core.heal_ledger import HealLedger
+    from framework.core.patch_manager import PatchManager
+    from framework.core.selector_index import SelectorIndex
+
+    ledger = HealLedger()
+    overrides = ledger.overrides() if ledger.db_path.exists() else []
+    healed_sites = {(row["selector"], row["call_site"]) for row in overrides}
+    # Latest heal of each selector
+    latest = {row["selector"]: row for row in sorted(overrides, key=lambda row: row["timestamp"])}
+
+    index = SelectorIndex([Path(path)])
+    index.refresh()
+    rewrites = [
+        (usage, {
+            "selector": row["healed_selector"],
+            "selector_method": row["selector_method"],
+            "confidence": row["confidence"],
+            "explanation": f"Heal of '{selector}' verified at {row['call_site']}",
+            "original_selector": selector,
+            "call_site": usage.call_site,
+            "propagated_from": row["call_site"],
+        })
+        for selector, row in latest.items()
+        for usage in index.usages(selector)
+        if (selector, usage.call_site) not in healed_sites
+    ]
+    if not rewrites:
+        console.print("[green]No call site left to propagate a heal to[/green]")
+        return
+
+    table = Table(title="Call Sites Using a Healed Selector", show_header=True)
+    table.add_column("Location", style="cyan")
+    table.add_column("Selector", style="yellow")
+    table.add_column("Healed Selector", style="green")
+    table.add_column("Verified On", style="dim")
+    for usage, patch_info in rewrites:
+        row = latest[patch_info["original_selector"]]
+        table.add_row(
+            f"{Path(usage.test_file).name}:{usage.line}",
+            patch_info["original_selector"],
+            f"{row['healed_selector']} ({row['selector_method'] or 'locator'})",
+            row["page"] or "-"
+        )
+    console.print(table)
+
+    if not apply_patches:
+        console.print("[dim]Run with --apply to rewrite these call sites[/dim]")
+        return
+
+    patches, skipped = index.patches(rewrites)
+    manager = PatchManager()
+    session = manager.begin_session(commit_mode="single")
+    for patch in patches:
+        session.queue(patch)
+    result = session.flush()
+    manager.flush_commits(timeout=60)
+
+    for usage in skipped:
+        console.print(f"[yellow]{Path(usage.test_file).name}:{usage.line} must be rewritten by hand[/yellow]")
+    console.print(f"[green]✓ {len(result['applied'])} line(s) rewritten, {len(result['failed'])} failed[/green]")
+
+
+@cli.command()
+@click.option('--retention-days', type=int, default=None, help='Keep heals newer than this (default: config)')
+@click.option('--dry-run', is_flag=True, help='Show the artifacts that would be deleted, delete nothing')
+def gc(retention_days: int, dry_run: bool):
+    """Delete expired heals, test runs, events and artifacts, and the backups no heal refers to"""
+    from framework.core.artifact_store import ArtifactStore
+
+    if not dry_run:
+        from framework.core.backup_store import BackupStore
+        from framework.core.event_bus import event_bus
+        from framework.core.heal_ledger import HealLedger
+        from framework.core.test_history import TestHistory
+
+        ledger = HealLedger()
+        expired = ledger.apply_retention(retention_days)
+        result = BackupStore().gc(ledger.referenced_blobs())
+        runs = TestHistory().apply_retention(retention_days)
+        events = event_bus.apply_retention(retention_days)
+
+        console.print(
+            f"[green]✓ {expired} expired heal(s), {runs} test run(s) and {events} event(s) removed, "
+            f"{result['deleted']} backup blob(s) deleted ({result['bytes'] / 1024:.1f} KB freed)[/green]"
+        )
+
+    collected = ArtifactStore().gc(dry_run=dry_run)
+    table = Table(title="Artifacts" + (" (dry run)" if dry_run else ""), show_header=True)
+    table.add_column("Kind", style="cyan")
+    table.add_column("Deleted", justify="right")
+    table.add_column("Freed (MB)", justify="right", style="green")
+    table.add_column("Compressed", justify="right")
+    table.add_column("Saved (MB)", justify="right", style="green")
+    for kind, stats in collected.items():
+        table.add_row(
+            kind, str(stats["deleted"]), f"{stats['bytes'] / 1048576:.1f}",
+            str(stats["compressed"]), f"{stats['saved'] / 1048576:.1f}",
+        )
+    console.print(table)
+
+
+@cli.command()
+@click.option('--test', 'test_id', default=None, help='List the artifacts of a test')
+@click.option('--run', 'run_id', default=None, help='List the artifacts of a run')
+def artifacts(test_id: str, run_id: str):
+    """Show the disk usage of the artifacts against their limits, or the artifacts of a test or run"""
+    from datetime import datetime
+
+    from framework.core.artifact_store import ArtifactStore
+
+    store = ArtifactStore()
+    store.scan()
+    if test_id or run_id:
+        table = Table(title="Artifacts", show_header=True)
+        table.add_column("Kind", style="cyan")
+        table.add_column("Path", style="yellow")
+        table.add_column("Run", style="dim")
+        table.add_column("Written", style="cyan")
+        table.add_column("KB", justify="right")
+        for artifact in store.artifacts(run_id=run_id, test_id=test_id):
+            table.add_row(
+                artifact.kind, artifact.path, artifact.run_id or "-",
+                datetime.fromtimestamp(artifact.created).strftime("%Y-%m-%d %H:%M:%S"), f"{artifact.size / 1024:.1f}",
+            )
+        console.print(table)
+        return
+
+    def limit(value: int, unit: str = "") -> str:
+        return f"{value}{unit}" if value else "-"
+
+    table = Table(title="Artifact Usage", show_header=True)
+    table.add_column("Kind", style="cyan")
+    table.add_column("Files", justify="right")
+    table.add_column("Size (MB)", justify="right", style="green")
+    table.add_column("Max files", justify="right", style="dim")
+    table.add_column("Max size (MB)", justify="right", style="dim")
+    table.add_column("Max age", justify="right", style="dim")
+    for kind, usage in store.summary().items():
+        table.add_row(
+            kind, str(usage["count"]), f"{usage['bytes'] / 1048576:.1f}", limit(usage["max_count"]),
+            limit(usage["max_bytes"] // 1048576), limit(usage["max_age_days"], " days"),
+        )
+    console.print(table)
+
+
+@cli.command()
+@click.option('--quarantine', 'quarantine_id', default=None, help='Quarantine a test by id (never healed)')
+@click.option('--release', 'release_id', default=None, help='Take a test out of quarantine')
+def flaky(quarantine_id: str, release_id: str):
+    """Show flaky and quarantined tests"""
+    from framework.core.test_history import TestHistory
+
+    history = TestHistory()
+    if quarantine_id:
+        history.quarantine(quarantine_id, reason="manual")
+        console.print(f"[green]✓ {quarantine_id} quarantined[/green]")
+        return
+    if release_id:
+        if history.release(release_id):
+            console.print(f"[green]✓ {release_id} released from quarantine[/green]")
+        else:
+            console.print(f"[yellow]{release_id} was not quarantined[/yellow]")
+        return
+
+    tests = history.flaky_tests() if history.db_path.exists() else []
+    if not tests:
+        console.print("[green]No flaky tests[/green]")
+        return
+
+    table = Table(title=f"Flaky Tests (last {config.auto_heal.flake_window} runs)", show_header=True)
+    table.add_column("Test", style="yellow")
+    table.add_column("Flaky", style="magenta")
+    table.add_column("Runs", style="cyan")
+    table.add_column("Last Run", style="dim")
+    table.add_column("Quarantined", style="red")
+    for test in tests:
+        table.add_row(
+            test["test_id"],
+            str(test["flaky"]),
+            str(test["runs"]),
+            (test["last_run"] or "-")[:19],
+            "yes" if test["quarantined"] else "no"
+        )
+    console.print(table)
+
+
+@cli.command()
+@click.option('--limit', '-n', default=20, help='Number of tests to show')
+@click.option('--sort', 'sort_by', type=click.Choice(['duration', 'heals', 'recent']), default='duration',
+              help='Sort by average duration, heals or last run')
+def history(limit: int, sort_by: str):
+    """Show the duration, heals and last outcome of each test"""
+    from framework.core.test_history import TestHistory
+
+    test_history = TestHistory()
+    stats = list(test_history.stats().values()) if test_history.db_path.exists() else []
+    if not stats:
+        console.print("[yellow]No test run recorded yet[/yellow]")
+        return
+
+    keys = {
+        "duration": lambda entry: entry["duration"] or 0,
+        "heals": lambda entry: entry["heals"] or 0,
+        "recent": lambda entry: entry["last_run"] or "",
+    }
+    stats.sort(key=keys[sort_by], reverse=True)
+
+    table = Table(title=f"Test History (last {config.auto_heal.flake_window} runs per test)", show_header=True)
+    table.add_column("Test", style="yellow")
+    table.add_column("Runs", style="cyan")
+    table.add_column("Avg Duration", style="green")
+    table.add_column("Heals", style="magenta")
+    table.add_column("Last Outcome")
+    table.add_column("Last Run", style="dim")
+    for entry in stats[:limit]:
+        table.add_row(
+            entry["test_id"],
+            str(entry["runs"]),
+            f"{entry['duration']:.2f}s" if entry["duration"] is not None else "-",
+            str(entry["heals"] or 0),
+            entry["last_outcome"] or "-",
+            (entry["last_run"] or "-")[:19]
+        )
+    console.print(table)
+
+
 @cli.command()
 def config_check():
     """Check configuration and dependencies"""
@@ -272,16 +576,35 @@ def config_check():
 
 @cli.command()
 @click.option('--port', default=8080, help='Port to run the UI on')
-def ui(port: int):
+@click.option('--events-port', type=int, default=None, help='Port of the live event stream (default: port + 1)')
+def ui(port: int, events_port: int):
     """Start the Agent Dev UI"""
     from framework.ui.dev_ui import start_dev_ui
     try:
-        start_dev_ui(port)
+        start_dev_ui(port, events_port)
     except Exception as e:
         console.print(f"[red]Failed to start UI: {e}[/red]")
         sys.exit(1)
 
 
+@cli.command()
+@click.option('--port', default=8081, help='Port to serve the events on')
+@click.option('--host', default='127.0.0.1', help='Interface to listen on')
+def events(port: int, host: str):
+    """Serve the live run events (SSE on /events, statistics on /stats) without the Dev UI"""
+    import time
+
+    from framework.ui.event_stream import serve_events
+
+    server = serve_events(port, host)
+    console.print(f"[green]Event stream on http://{host}:{port}/events, statistics on /stats (Ctrl+C to stop)[/green]")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
 @cli.command()
 @click.argument('project_name')
 @click.option('--path', default='sources/src', help='Base path for projects')
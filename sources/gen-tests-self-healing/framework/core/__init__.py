@@ -1,10 +1,48 @@
 """
 Core framework components
+
+Heavy components (Playwright runner, GitPython patch manager) are loaded on
+first access (PEP 562) so lightweight commands start fast.
 """
+from importlib import import_module
+
 from .config import config
 from .logger import get_logger
-from .test_runner import AutoHealTestRunner
-from .patch_manager import PatchManager
 
-__all__ = ["config", "get_logger", "AutoHealTestRunner", "PatchManager"]
+_LAZY_ATTRIBUTES = {
+    "ArtifactStore": ".artifact_store",
+    "AutoHealTestRunner": ".test_runner",
+    "Collector": ".collectors",
+    "ContextCapture": ".collectors",
+    "classify_error": ".error_classifier",
+    "EventBus": ".event_bus",
+    "event_bus": ".event_bus",
+    "HealLedger": ".heal_ledger",
+    "HealingPage": ".selector_override",
+    "HealMap": ".selector_override",
+    "PatchManager": ".patch_manager",
+    "PatchRequest": ".patch_manager",
+    "PatchSession": ".patch_manager",
+    "SelectorIndex": ".selector_index",
+    "SourceIndex": ".source_index",
+    "TestHistory": ".test_history",
+}
+
+__all__ = [
+    "config", "get_logger", "ArtifactStore", "AutoHealTestRunner", "Collector", "ContextCapture", "classify_error",
+    "EventBus", "event_bus", "HealLedger", "HealingPage", "HealMap", "PatchManager", "PatchRequest", "PatchSession",
+    "SelectorIndex", "SourceIndex", "TestHistory",
+]
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
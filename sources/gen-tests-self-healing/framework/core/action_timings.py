@@ -0,0 +1,97 @@
+"""
+Action Timings - Observed action durations and the adaptive timeouts derived from them
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from .config import config
+from .logger import get_logger
+from .test_history import TestHistory
+
+logger = get_logger(__name__)
+
+# Durations kept per page and selector
+MAX_SAMPLES = 50
+
+# Durations needed before the timeout of a selector is adapted
+MIN_SAMPLES = 5
+
+
+def page_key(url: str) -> str:
+    """Page an action ran on: URL without query string and fragment"""
+    parts = urlsplit(url or "")
+    if not parts.netloc:
+        return url or ""
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class ActionTimings:
+    """
+    Durations of the actions run on each page and selector
+
+    A selector that always resolves in 200 ms does not need to wait 30 s
+    to report that it is broken: once enough durations were observed, its
+    actions get a timeout of ADAPTIVE_TIMEOUT_FACTOR times their 95th
+    percentile, bounded by ADAPTIVE_TIMEOUT_MIN and the Playwright timeout.
+    Durations are stored in the test history, so later runs start adapted.
+    """
+
+    def __init__(self, history: Optional[TestHistory] = None):
+        self.history = history
+        self._samples: Optional[Dict[Tuple[str, str], Deque[float]]] = None
+        self._changed: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[Tuple[str, str], Deque[float]]:
+        if self._samples is None:
+            with self._lock:
+                if self._samples is None:
+                    stored = self.history.action_timings() if self.history else {}
+                    self._samples = {
+                        key: deque(samples, maxlen=MAX_SAMPLES) for key, samples in stored.items()
+                    }
+                    logger.debug(f"Action timings of {len(stored)} selector(s) loaded")
+        return self._samples
+
+    def record(self, url: str, selector: str, seconds: float):
+        """Record the duration of a successful action"""
+        key = (page_key(url), selector)
+        samples = self._load()
+        with self._lock:
+            samples.setdefault(key, deque(maxlen=MAX_SAMPLES)).append(round(seconds, 3))
+            self._changed.add(key)
+
+    def percentile(self, url: str, selector: str, fraction: float = 0.95) -> Optional[float]:
+        """Duration percentile of a selector on a page in seconds, None until MIN_SAMPLES were observed"""
+        samples = self._load().get((page_key(url), selector))
+        if not samples or len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+    def timeout_for(self, url: str, selector: str) -> Optional[float]:
+        """
+        Adaptive timeout of an action
+
+        Returns:
+            Timeout in milliseconds, None to keep the default timeout
+        """
+        if not config.playwright.adaptive_timeouts:
+            return None
+        p95 = self.percentile(url, selector)
+        if p95 is None:
+            return None
+        timeout = p95 * 1000 * config.playwright.adaptive_timeout_factor
+        return min(max(timeout, config.playwright.adaptive_timeout_min), config.playwright.timeout)
+
+    def save(self):
+        """Store the durations recorded since the last save"""
+        if self.history is None or not self._changed:
+            return
+        with self._lock:
+            changed = {key: list(self._samples[key]) for key in self._changed}
+            self._changed.clear()
+        self.history.save_action_timings(changed)
+        logger.debug(f"Action timings of {len(changed)} selector(s) saved")
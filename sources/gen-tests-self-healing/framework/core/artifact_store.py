@@ -0,0 +1,357 @@
+"""
+Artifact Store - Index, retention and eviction of the run artifacts (traces, screenshots, logs)
+"""
+import gzip
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from .config import config
+from .event_bus import event_bus
+from .file_lock import FileLock
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    run_id TEXT,
+    test_id TEXT,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts (kind, accessed);
+CREATE INDEX IF NOT EXISTS idx_artifacts_run ON artifacts (run_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_test ON artifacts (test_id);
+"""
+
+# Kinds of artifacts
+KIND_TRACE = "trace"
+KIND_SCREENSHOT = "screenshot"
+# Rotated log files (the files being written are never evicted)
+KIND_LOG = "log"
+
+KINDS = (KIND_TRACE, KIND_SCREENSHOT, KIND_LOG)
+
+# Compressed copies saving less than this fraction of the size are not kept
+MIN_COMPRESSION_GAIN = 0.1
+
+# Artifacts younger than this many seconds are never evicted (a running test may still refer to them)
+GRACE_SECONDS = 300
+
+
+class Artifact(BaseModel):
+    """An artifact file of a run"""
+    path: str = Field(description="File path")
+    kind: str = Field(description="Kind of artifact (trace, screenshot, log)")
+    run_id: Optional[str] = Field(default=None, description="Run that produced it")
+    test_id: Optional[str] = Field(default=None, description="Test it belongs to")
+    size: int = Field(description="Size in bytes")
+    created: float = Field(description="Unix time it was written")
+    accessed: float = Field(description="Unix time it was last written or used")
+    compressed: bool = Field(default=False, description="Compression was attempted (gzipped if it saved space)")
+
+
+class ArtifactStore:
+    """
+    Keeps the artifact directories within their retention limits
+
+    Traces and screenshots are indexed when written, with the run and the
+    test producing them; files found on disk without an index row (older
+    runs, rotated logs) are indexed by `gc()`. Each kind has an age, count
+    and total size limit (see ArtifactConfig): expired artifacts are
+    deleted, then the least recently used ones until the kind fits its
+    limits. Artifacts unused for a few days are gzipped when it saves space.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.artifacts.index_file)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), timeout=config.auto_heal.lock_timeout, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema and upgrade it to SCHEMA_VERSION"""
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def directories(self) -> Dict[str, Path]:
+        """Directory of each kind of artifact"""
+        return {
+            KIND_TRACE: config.playwright.trace_dir,
+            KIND_SCREENSHOT: config.playwright.screenshot_dir,
+            KIND_LOG: config.logging.file.parent,
+        }
+
+    def _active_files(self) -> Set[str]:
+        """Files still being written, never indexed nor evicted"""
+        active = {config.logging.file, config.llm.usage_file}
+        if config.logging.json_file:
+            active.add(Path(config.logging.json_file))
+        return {str(path.resolve()) for path in active}
+
+    def register(
+        self, kind: str, path: Union[str, Path], test_id: Optional[str] = None, run_id: Optional[str] = None
+    ):
+        """
+        Index an artifact just written (or written again)
+
+        Args:
+            kind: Kind of artifact (see KINDS)
+            path: File written
+            test_id: Test it belongs to
+            run_id: Run producing it (current run if None)
+        """
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        run_id = run_id or event_bus.run_id
+        now = time.time()
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    """
+                    INSERT INTO artifacts (path, kind, run_id, test_id, size, created, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (path) DO UPDATE SET
+                        run_id = excluded.run_id, test_id = COALESCE(excluded.test_id, test_id),
+                        size = excluded.size, created = excluded.created, accessed = excluded.accessed,
+                        compressed = 0
+                    """,
+                    (str(path), kind, run_id, test_id, size, now, now),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not index artifact {path}: {e}")
+
+    def touch(self, path: Union[str, Path]):
+        """Mark an artifact as used now (evicted last among the artifacts of its kind)"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE artifacts SET accessed = ? WHERE path = ?", (time.time(), str(path)))
+
+    def artifacts(
+        self, kind: Optional[str] = None, run_id: Optional[str] = None, test_id: Optional[str] = None
+    ) -> List[Artifact]:
+        """Indexed artifacts, most recently used first"""
+        clauses, values = [], []
+        for column, value in (("kind", kind), ("run_id", run_id), ("test_id", test_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT * FROM artifacts {where} ORDER BY accessed DESC", values).fetchall()
+        return [Artifact(**{**dict(row), "compressed": bool(row["compressed"])}) for row in rows]
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Number of artifacts and bytes of each kind"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, COUNT(*) AS count, COALESCE(SUM(size), 0) AS bytes FROM artifacts GROUP BY kind"
+            ).fetchall()
+        usage = {kind: {"count": 0, "bytes": 0} for kind in KINDS}
+        usage.update({row["kind"]: {"count": row["count"], "bytes": row["bytes"]} for row in rows})
+        return usage
+
+    def scan(self, dry_run: bool = False) -> Tuple[List[Artifact], Set[str]]:
+        """
+        Reconcile the index with the artifact directories
+
+        Files without an index row are indexed (with their modification
+        time), rows of deleted files are removed.
+
+        Args:
+            dry_run: Report the differences without changing the index
+
+        Returns:
+            Artifacts of the files found without an index row, and paths of
+            the rows whose file is gone
+        """
+        with self._lock:
+            known = {row["path"] for row in self.conn.execute("SELECT path FROM artifacts")}
+        active = self._active_files()
+        found: List[Artifact] = []
+        present = set()
+        for kind, directory in self.directories().items():
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                if not path.is_file() or path.name.startswith(".") or str(path.resolve()) in active:
+                    continue
+                if str(path) in known:
+                    present.add(str(path))
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    # Deleted since it was listed (e.g. by the log rotation's own retention)
+                    continue
+                present.add(str(path))
+                found.append(Artifact(
+                    path=str(path), kind=kind, size=stat.st_size, created=stat.st_mtime, accessed=stat.st_mtime,
+                    compressed=path.suffix == ".gz",
+                ))
+
+        missing = known - present
+        if dry_run or not (found or missing):
+            return found, missing
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO artifacts (path, kind, size, created, accessed, compressed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (artifact.path, artifact.kind, artifact.size, artifact.created, artifact.accessed,
+                     artifact.compressed)
+                    for artifact in found
+                ],
+            )
+            self.conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in missing])
+        logger.debug(f"Artifact index: {len(found)} file(s) indexed, {len(missing)} missing file(s) forgotten")
+        return found, missing
+
+    def gc(self, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+        """
+        Enforce the retention limits of every kind of artifact
+
+        For each kind, artifacts older than its maximum age are deleted,
+        then the least recently used ones while the kind exceeds its count
+        or size limit. The artifacts left that were not used for
+        compress_after_days are gzipped.
+
+        Collections of concurrent processes (pytest-xdist workers tearing
+        down) run one after the other.
+
+        Args:
+            dry_run: Report what would be deleted without deleting anything (nor indexing new files)
+
+        Returns:
+            Per kind: artifacts deleted, bytes freed, artifacts compressed and bytes saved
+        """
+        with FileLock(self.db_path, timeout=config.auto_heal.lock_timeout):
+            return self._gc(dry_run)
+
+    def _gc(self, dry_run: bool) -> Dict[str, Dict[str, int]]:
+        found, missing = self.scan(dry_run)
+        now = time.time()
+        result: Dict[str, Dict[str, int]] = {}
+        for kind in KINDS:
+            limits = config.artifacts.limits(kind)
+            # Least recently used first (files found by a dry run scan are not indexed yet)
+            artifacts = [artifact for artifact in self.artifacts(kind=kind) if artifact.path not in missing]
+            if dry_run:
+                artifacts += [artifact for artifact in found if artifact.kind == kind]
+            artifacts.sort(key=lambda artifact: artifact.accessed)
+            count = len(artifacts)
+            total = sum(artifact.size for artifact in artifacts)
+            cutoff = now - limits["max_age_days"] * 86400 if limits["max_age_days"] else None
+
+            evicted: List[Artifact] = []
+            kept: List[Artifact] = []
+            for artifact in artifacts:
+                too_old = cutoff is not None and artifact.created < cutoff
+                too_many = bool(limits["max_count"]) and count > limits["max_count"]
+                too_big = bool(limits["max_bytes"]) and total > limits["max_bytes"]
+                if (too_old or too_many or too_big) and artifact.accessed < now - GRACE_SECONDS:
+                    evicted.append(artifact)
+                    count -= 1
+                    total -= artifact.size
+                else:
+                    kept.append(artifact)
+
+            stats = {"deleted": len(evicted), "bytes": sum(artifact.size for artifact in evicted),
+                     "compressed": 0, "saved": 0}
+            if not dry_run:
+                self._delete(evicted)
+                stats["compressed"], stats["saved"] = self._compress_cold(kept, now)
+            result[kind] = stats
+
+        deleted = sum(stats["deleted"] for stats in result.values())
+        freed = sum(stats["bytes"] for stats in result.values())
+        logger.info(
+            f"Artifact GC{' (dry run)' if dry_run else ''}: {deleted} artifact(s) deleted, {freed} bytes freed"
+        )
+        return result
+
+    def _delete(self, artifacts: List[Artifact]):
+        """Delete artifact files and their index rows"""
+        deleted = []
+        for artifact in artifacts:
+            try:
+                Path(artifact.path).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not delete artifact {artifact.path}: {e}")
+                continue
+            deleted.append((artifact.path,))
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM artifacts WHERE path = ?", deleted)
+
+    def _compress_cold(self, artifacts: List[Artifact], now: float) -> Tuple[int, int]:
+        """
+        Gzip the artifacts unused for compress_after_days
+
+        Returns:
+            Number of artifacts compressed and bytes saved
+        """
+        days = config.artifacts.compress_after_days
+        if not days:
+            return 0, 0
+        cutoff = now - days * 86400
+        compressed = saved = 0
+        for artifact in artifacts:
+            if artifact.compressed or artifact.accessed >= cutoff:
+                continue
+            source = Path(artifact.path)
+            target = source.with_name(f"{source.name}.gz")
+            try:
+                with source.open("rb") as reader, gzip.open(target, "wb") as writer:
+                    shutil.copyfileobj(reader, writer)
+                size = target.stat().st_size
+            except OSError as e:
+                logger.warning(f"Could not compress artifact {source}: {e}")
+                target.unlink(missing_ok=True)
+                continue
+
+            with self._lock, self.conn:
+                if size <= artifact.size * (1 - MIN_COMPRESSION_GAIN):
+                    source.unlink(missing_ok=True)
+                    self.conn.execute(
+                        "UPDATE artifacts SET path = ?, size = ?, compressed = 1 WHERE path = ?",
+                        (str(target), size, artifact.path),
+                    )
+                    compressed += 1
+                    saved += artifact.size - size
+                else:
+                    # Already compressed (JPEG, zip): not worth it, not tried again
+                    target.unlink(missing_ok=True)
+                    self.conn.execute("UPDATE artifacts SET compressed = 1 WHERE path = ?", (artifact.path,))
+        return compressed, saved
+
+    def summary(self) -> Dict[str, Any]:
+        """Usage of each kind of artifact with its limits"""
+        usage = self.usage()
+        return {kind: {**usage[kind], **config.artifacts.limits(kind)} for kind in KINDS}
@@ -0,0 +1,127 @@
+"""
+Backup Store - Content-addressed, compressed storage of test file versions
+"""
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from .config import config
+from .file_lock import atomic_write, content_hash
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BackupStore:
+    """
+    Stores file contents as zlib-compressed blobs keyed by their SHA-256
+
+    Identical contents are stored once, so a file healed many times only
+    costs one blob per distinct version. Blobs live under
+    `<backup_dir>/objects/<first 2 hex>/<remaining hex>`.
+    """
+
+    def __init__(self, root: Optional[Path] = None, compression_level: int = 6):
+        self.root = Path(root or config.auto_heal.backup_dir) / "objects"
+        self.compression_level = compression_level
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def put(self, data: Union[str, bytes]) -> str:
+        """
+        Store a content (no-op if already stored)
+
+        Args:
+            data: File content
+
+        Returns:
+            SHA-256 of the uncompressed content
+        """
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        digest = content_hash(payload)
+        path = self._blob_path(digest)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, zlib.compress(payload, self.compression_level))
+            logger.debug(f"Backup blob stored: {digest[:12]} ({len(payload)} bytes)")
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """
+        Read a stored content
+
+        Returns:
+            The uncompressed content, None if missing or corrupted
+        """
+        path = self._blob_path(digest)
+        try:
+            payload = zlib.decompress(path.read_bytes())
+        except FileNotFoundError:
+            logger.error(f"Backup blob {digest[:12]} not found in {self.root}")
+            return None
+        except zlib.error as e:
+            logger.error(f"Backup blob {digest[:12]} is corrupted: {e}")
+            return None
+
+        if content_hash(payload) != digest:
+            logger.error(f"Backup blob {digest[:12]} does not match its hash")
+            return None
+        return payload
+
+    def exists(self, digest: str) -> bool:
+        """True if a content is stored"""
+        return self._blob_path(digest).exists()
+
+    def blobs(self) -> Iterator[Path]:
+        """Iterate over stored blob files"""
+        if not self.root.exists():
+            return
+        for path in self.root.glob("??/*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+    def stats(self) -> Dict[str, int]:
+        """Number of blobs and their total compressed size in bytes"""
+        count = size = 0
+        for path in self.blobs():
+            count += 1
+            size += path.stat().st_size
+        return {"blobs": count, "bytes": size}
+
+    def gc(self, referenced: Iterable[str], grace_seconds: float = 3600) -> Dict[str, int]:
+        """
+        Delete blobs no heal record refers to
+
+        Blobs younger than the grace period are kept: a running heal stores
+        its blobs before recording the patch in the ledger.
+
+        Args:
+            referenced: Hashes still referenced by the heal ledger
+            grace_seconds: Minimum age of a blob before it can be deleted
+
+        Returns:
+            Number of blobs deleted and bytes freed
+        """
+        keep = set(referenced)
+        cutoff = time.time() - grace_seconds
+        deleted = freed = 0
+
+        for path in self.blobs():
+            digest = path.parent.name + path.name
+            if digest in keep:
+                continue
+            try:
+                stat = path.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            freed += stat.st_size
+
+        logger.info(f"Backup GC: {deleted} blob(s) deleted, {freed} bytes freed")
+        return {"deleted": deleted, "bytes": freed}
@@ -0,0 +1,331 @@
+"""
+Collectors - Concurrent failure context capture
+"""
+import asyncio
+import inspect
+import json
+import time
+import traceback
+import weakref
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import Page
+
+from .file_lock import file_hash
+from .logger import get_logger
+from .screenshots import ScreenshotRecorder
+from .source_index import SourceIndex
+
+logger = get_logger(__name__)
+
+_TRUNCATED = "\n... [truncated]"
+
+
+class Collector(ABC):
+    """
+    Base class of failure context collectors
+
+    A collector gathers one kind of information when a test fails and
+    returns the context fields it fills. Every collector runs concurrently
+    with the others, bounded by its own timeout and size cap, so a slow
+    one only loses its own fields.
+    """
+
+    name = "collector"
+    timeout: float = 2.0
+    max_chars: int = 50_000
+    max_items: int = 50
+
+    def __init__(self, timeout: Optional[float] = None, max_chars: Optional[int] = None):
+        if timeout is not None:
+            self.timeout = timeout
+        if max_chars is not None:
+            self.max_chars = max_chars
+
+    def attach(self, page: Page):
+        """Called when a test page is created (register event listeners here)"""
+
+    @abstractmethod
+    async def collect(self, page: Page, error: Exception, test_func, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Collect context fields
+
+        Args:
+            page: Page of the failed test
+            error: Exception raised by the test
+            test_func: Failed test function
+            context: Context being captured, holding the base fields (error, message, url,
+                selector, stack trace); return new fields rather than modifying it
+
+        Returns:
+            Context fields to add
+        """
+
+    def cap(self, value: Any) -> Any:
+        """Apply the size cap to a collected value"""
+        if isinstance(value, str) and len(value) > self.max_chars:
+            return value[:self.max_chars] + _TRUNCATED
+        if isinstance(value, list) and len(value) > self.max_items:
+            return value[-self.max_items:]
+        return value
+
+
+class DOMCollector(Collector):
+    """HTML of the page at the time of failure"""
+
+    name = "dom"
+    timeout = 3.0
+    max_chars = 200_000
+
+    async def collect(self, page, error, test_func, context):
+        return {"dom_snapshot": await page.content()}
+
+
+class AccessibilityCollector(Collector):
+    """Accessibility tree of the page (ARIA snapshot, or the legacy accessibility API)"""
+
+    name = "accessibility"
+    timeout = 2.0
+
+    async def collect(self, page, error, test_func, context):
+        locator = page.locator("body")
+        if hasattr(locator, "aria_snapshot"):
+            tree = await locator.aria_snapshot(timeout=self.timeout * 1000)
+        else:
+            tree = json.dumps(await page.accessibility.snapshot(), indent=1)
+        return {"accessibility_tree": tree}
+
+
+class ScreenshotCollector(Collector):
+    """Failure screenshot (encoded and written in the background)"""
+
+    name = "screenshot"
+    timeout = 5.0
+
+    def __init__(self, recorder: ScreenshotRecorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    async def collect(self, page, error, test_func, context):
+        # The recorder sets context["screenshot"] itself once the file is written
+        await self.recorder.capture(page, test_func.__name__, context.get("selector"), context)
+        return {}
+
+
+class _PageEventCollector(Collector):
+    """Collector buffering page events from the moment the page is created"""
+
+    timeout = 0.5
+    max_chars = 10_000
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._buffers: "weakref.WeakKeyDictionary[Page, List[str]]" = weakref.WeakKeyDictionary()
+
+    def _buffer(self, page: Page) -> List[str]:
+        return self._buffers.setdefault(page, [])
+
+    def _append(self, page: Page, entry: str):
+        buffer = self._buffer(page)
+        buffer.append(entry)
+        if len(buffer) > self.max_items:
+            del buffer[0]
+
+    def _entries(self, page: Page) -> str:
+        return self.cap("\n".join(self._buffers.get(page, [])))
+
+
+class ConsoleCollector(_PageEventCollector):
+    """Browser console errors and warnings, plus uncaught page errors"""
+
+    name = "console"
+
+    def attach(self, page):
+        page.on("console", lambda message: self._on_console(page, message))
+        page.on("pageerror", lambda exception: self._append(page, f"[pageerror] {exception}"))
+
+    def _on_console(self, page: Page, message):
+        if message.type in ("error", "warning"):
+            self._append(page, f"[{message.type}] {message.text}")
+
+    async def collect(self, page, error, test_func, context):
+        return {"console_logs": self._entries(page)}
+
+
+class NetworkCollector(_PageEventCollector):
+    """Failed requests and HTTP error responses"""
+
+    name = "network"
+
+    def attach(self, page):
+        page.on("requestfailed", lambda request: self._append(
+            page, f"[failed] {request.method} {request.url} ({request.failure})"
+        ))
+        page.on("response", lambda response: self._on_response(page, response))
+
+    def _on_response(self, page: Page, response):
+        if response.status >= 400:
+            self._append(page, f"[{response.status}] {response.request.method} {response.url}")
+
+    async def collect(self, page, error, test_func, context):
+        return {"network_errors": self._entries(page)}
+
+
+class SourceCollector(Collector):
+    """Failing statement, its location and the surrounding source lines"""
+
+    name = "source"
+    timeout = 2.0
+    max_chars = 20_000
+
+    def __init__(self, radius: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.radius = radius
+
+    async def collect(self, page, error, test_func, context):
+        # Reading and indexing the file is blocking work: keep it off the event loop
+        return await asyncio.to_thread(self._collect, test_func, error, context.get("call_location"))
+
+    def _collect(self, test_func, error: Exception, location: Optional[Tuple[str, int]] = None) -> Dict[str, Any]:
+        test_file, line_number, original_code = self.get_test_location(test_func, error, location)
+        index = SourceIndex.for_file(test_file)
+        return {
+            "test_file": str(test_file),
+            "source_hash": index.content_hash if index else file_hash(test_file),
+            "line_number": line_number,
+            "original_code": original_code,
+            "source_context": self.get_source_context(test_file, line_number, self.radius),
+        }
+
+    @staticmethod
+    def get_test_location(test_func, error: Exception, location: Optional[Tuple[str, int]] = None) -> tuple:
+        """
+        Get test file path, line number, and original code (the full failing statement)
+
+        The statement is found in the error's traceback, unless its location
+        (file, line) is given: failures caught inside the selector override
+        proxy have no test frame in their traceback.
+        """
+        try:
+            # Get source file
+            source_file = Path(location[0] if location else inspect.getfile(test_func))
+
+            # Get line number from the location or the traceback
+            if location:
+                line_numbers = [location[1]]
+            else:
+                tb = traceback.extract_tb(error.__traceback__)
+                line_numbers = [frame.lineno for frame in reversed(tb) if frame.filename == str(source_file)]
+            for line_number in line_numbers:
+                # Look up the statement in the cached source index
+                index = SourceIndex.for_file(source_file)
+                statement = index.statement_at(line_number) if index else None
+                if statement is not None:
+                    return source_file, line_number, statement.text
+                if index and 0 <= line_number - 1 < len(index.lines):
+                    return source_file, line_number, index.lines[line_number - 1].strip()
+
+            # Fallback
+            return source_file, 1, ""
+
+        except Exception as e:
+            logger.error(f"Failed to get test location: {e}")
+            return Path("unknown"), 0, ""
+
+    @staticmethod
+    def get_source_context(source_file: Path, line_number: int, radius: int = 5) -> str:
+        """Get the source lines around the failing statement (statement lines marked with '>')"""
+        index = SourceIndex.for_file(source_file)
+        if index is None:
+            return ""
+
+        statement = index.statement_at(line_number)
+        first, last = (statement.start_line, statement.end_line) if statement else (line_number, line_number)
+        lines = index.lines
+
+        start = max(first - 1 - radius, 0)
+        end = min(last + radius, len(lines))
+        return "".join(
+            f"{'>' if first <= i + 1 <= last else ' '} {i + 1:4d} | {lines[i]}" for i in range(start, end)
+        )
+
+
+def default_collectors(recorder: ScreenshotRecorder) -> List[Collector]:
+    """Collectors used by the test runner"""
+    return [
+        SourceCollector(),
+        DOMCollector(),
+        AccessibilityCollector(),
+        ScreenshotCollector(recorder),
+        ConsoleCollector(),
+        NetworkCollector(),
+    ]
+
+
+class ContextCapture:
+    """Runs collectors concurrently and merges their fields into the failure context"""
+
+    def __init__(self, collectors: List[Collector]):
+        self.collectors = collectors
+
+    def attach(self, page: Page):
+        """Let collectors listen to a new test page"""
+        for collector in self.collectors:
+            try:
+                collector.attach(page)
+            except Exception as e:
+                logger.warning(f"Collector '{collector.name}' could not attach to page: {e}")
+
+    async def capture(self, page: Page, error: Exception, test_func, base: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Capture the failure context
+
+        Args:
+            page: Page of the failed test
+            error: Exception raised by the test
+            test_func: Failed test function
+            base: Fields already known (error, message, url, selector, stack trace)
+
+        Returns:
+            Context with every field collected in time; timings in `capture_ms`
+            and failures in `capture_errors`
+        """
+        context = dict(base)
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._run(collector, page, error, test_func, context) for collector in self.collectors)
+        )
+
+        timings: Dict[str, float] = {}
+        errors: Dict[str, str] = {}
+        for collector, (fields, elapsed, failure) in zip(self.collectors, results):
+            timings[collector.name] = elapsed
+            if failure:
+                errors[collector.name] = failure
+            context.update({key: collector.cap(value) for key, value in fields.items()})
+
+        context["capture_ms"] = timings
+        if errors:
+            context["capture_errors"] = errors
+
+        logger.debug(
+            f"Failure context captured in {(time.perf_counter() - start) * 1000:.0f} ms "
+            f"({len(errors)} collector(s) failed)"
+        )
+        return context
+
+    async def _run(self, collector: Collector, page: Page, error: Exception, test_func, context: Dict[str, Any]):
+        """Run one collector within its timeout"""
+        start = time.perf_counter()
+        try:
+            fields = await asyncio.wait_for(collector.collect(page, error, test_func, context), collector.timeout)
+            failure = None
+        except asyncio.TimeoutError:
+            fields, failure = {}, f"timed out after {collector.timeout}s"
+            logger.warning(f"Collector '{collector.name}' {failure}")
+        except Exception as e:
+            fields, failure = {}, str(e)
+            logger.warning(f"Collector '{collector.name}' failed: {e}")
+        return fields or {}, round((time.perf_counter() - start) * 1000, 1), failure
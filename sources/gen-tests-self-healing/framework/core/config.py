@@ -3,6 +3,7 @@ Configuration for Playwright Auto-Heal Framework
 """
 import os
 from pathlib import Path
+from typing import Dict
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 
@@ -14,8 +15,20 @@ class PlaywrightConfig(BaseModel):
     headless: bool = Field(default_factory=lambda: os.getenv("HEADLESS", "true").lower() == "true")
     slow_mo: int = Field(default_factory=lambda: int(os.getenv("SLOW_MO", "0")))
     timeout: int = Field(default_factory=lambda: int(os.getenv("TIMEOUT", "30000")))
-    trace_dir: Path = Field(default=Path("traces"))
-    screenshot_dir: Path = Field(default=Path("screenshots"))
+    trace_dir: Path = Field(default_factory=lambda: Path(os.getenv("TRACE_DIR", "traces")))
+    screenshot_dir: Path = Field(default_factory=lambda: Path(os.getenv("SCREENSHOT_DIR", "screenshots")))
+    # Failure screenshots: region (around the failed element), viewport, full_page or off
+    screenshot_mode: str = Field(default_factory=lambda: os.getenv("SCREENSHOT_MODE", "region"))
+    screenshot_format: str = Field(default_factory=lambda: os.getenv("SCREENSHOT_FORMAT", "jpeg"))  # jpeg, png, webp
+    screenshot_quality: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_QUALITY", "70")))
+    screenshot_padding: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_PADDING", "32")))
+    screenshot_dedupe_distance: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_DEDUPE_DISTANCE", "4")))
+    # Action timeouts adapted to observed durations (p95 x factor, at least adaptive_timeout_min ms, at most timeout)
+    adaptive_timeouts: bool = Field(default_factory=lambda: os.getenv("ADAPTIVE_TIMEOUTS", "true").lower() == "true")
+    adaptive_timeout_factor: float = Field(default_factory=lambda: float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "3")))
+    adaptive_timeout_min: int = Field(default_factory=lambda: int(os.getenv("ADAPTIVE_TIMEOUT_MIN", "2000")))
+    # Fail an action whose selector matches nothing after this many ms on an idle page (0 = wait for the timeout)
+    fail_fast_probe: int = Field(default_factory=lambda: int(os.getenv("FAIL_FAST_PROBE", "2000")))
 
 class LLMConfig(BaseModel):
     """LLM configuration"""
@@ -27,6 +40,13 @@ class LLMConfig(BaseModel):
     anthropic_model: str = Field(default_factory=lambda: os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229"))
     temperature: float = 0.0
     max_tokens: int = 1000
+    prompt_token_budget: int = Field(default_factory=lambda: int(os.getenv("PROMPT_TOKEN_BUDGET", "6000")))
+    # DOM snapshots larger than dom_retrieval_min_tokens are reduced to the dom_top_k elements nearest to the
+    # failed selector and their ancestors (local hashed embeddings, 0 = whole DOM truncated to the budget)
+    dom_top_k: int = Field(default_factory=lambda: int(os.getenv("DOM_TOP_K", "12")))
+    dom_retrieval_min_tokens: int = Field(default_factory=lambda: int(os.getenv("DOM_RETRIEVAL_MIN_TOKENS", "800")))
+    max_run_cost: float = Field(default_factory=lambda: float(os.getenv("MAX_RUN_COST", "0")))  # USD, 0 = unlimited
+    usage_file: Path = Field(default=Path("logs/usage.jsonl"))
 
 class AutoHealConfig(BaseModel):
     """Auto-heal configuration"""
@@ -34,8 +54,74 @@ class AutoHealConfig(BaseModel):
     auto_pr: bool = Field(default_factory=lambda: os.getenv("AUTO_PR", "false").lower() == "true")
     confidence_threshold: float = Field(default_factory=lambda: float(os.getenv("CONFIDENCE_THRESHOLD", "0.7")))
     max_retries: int = Field(default_factory=lambda: int(os.getenv("MAX_RETRIES", "3")))
+    async_commit: bool = Field(default_factory=lambda: os.getenv("ASYNC_COMMIT", "true").lower() == "true")
+    commit_coalesce_window: float = Field(default_factory=lambda: float(os.getenv("COMMIT_COALESCE_SECONDS", "2")))
+    patch_commit_mode: str = Field(default_factory=lambda: os.getenv("PATCH_COMMIT_MODE", "single"))  # single, per_file
+    hot_reload: bool = Field(default_factory=lambda: os.getenv("HOT_RELOAD", "true").lower() == "true")
+    # patch: fix the source and re-run the test; override: heal selectors in place while the test runs
+    heal_mode: str = Field(default_factory=lambda: os.getenv("HEAL_MODE", "override"))
+    # In override mode, also patch the source in one batch when the runner is torn down
+    override_patch_source: bool = Field(
+        default_factory=lambda: os.getenv("OVERRIDE_PATCH_SOURCE", "true").lower() == "true"
+    )
+    # Candidate selectors of a heal validated against the page at the same time, best one applied (1 = LLM's only)
+    heal_candidates: int = Field(default_factory=lambda: int(os.getenv("HEAL_CANDIDATES", "6")))
+    # Extra analysis samples requested concurrently for more candidates (each one is an LLM call)
+    heal_samples: int = Field(default_factory=lambda: int(os.getenv("HEAL_SAMPLES", "0")))
+    lock_timeout: float = Field(default_factory=lambda: float(os.getenv("PATCH_LOCK_TIMEOUT", "30")))
     patch_dir: Path = Field(default=Path("patches"))
     backup_dir: Path = Field(default=Path("backups"))
+    retention_days: int = Field(default_factory=lambda: int(os.getenv("HEAL_RETENTION_DAYS", "90")))  # 0 = forever
+    ledger_file: Path = Field(default_factory=lambda: Path(os.getenv("HEAL_LEDGER", "patches/heal_ledger.db")))
+    history_file: Path = Field(default_factory=lambda: Path(os.getenv("TEST_HISTORY", "patches/test_history.db")))
+    # Flake gate: plain re-runs of a failed test (timeouts relaxed) before asking the LLM to heal it
+    flake_reruns: int = Field(default_factory=lambda: int(os.getenv("FLAKE_RERUNS", "2")))
+    flake_timeout_factor: float = Field(default_factory=lambda: float(os.getenv("FLAKE_TIMEOUT_FACTOR", "2.0")))
+    # Tests flaky this many times in their last flake_window runs are quarantined (never healed, 0 = never)
+    flake_window: int = Field(default_factory=lambda: int(os.getenv("FLAKE_WINDOW", "20")))
+    flake_quarantine_threshold: int = Field(default_factory=lambda: int(os.getenv("FLAKE_QUARANTINE_THRESHOLD", "3")))
+    # Order of the tests run by the pytest plugin: none, failed-first or longest-first
+    test_order: str = Field(default_factory=lambda: os.getenv("TEST_ORDER", "none"))
+    # Run events (tests, failures, LLM calls, patches) shared with the Dev UI event stream
+    events_enabled: bool = Field(default_factory=lambda: os.getenv("EVENTS_ENABLED", "true").lower() == "true")
+    event_log: Path = Field(default_factory=lambda: Path(os.getenv("EVENT_LOG", "patches/events.db")))
+
+class LoggingConfig(BaseModel):
+    """Logging configuration"""
+    level: str = Field(default_factory=lambda: os.getenv("LOG_LEVEL", "INFO"))  # Console
+    file: Path = Field(default_factory=lambda: Path(os.getenv("LOG_FILE", "logs/auto-heal.log")))
+    file_level: str = Field(default_factory=lambda: os.getenv("LOG_FILE_LEVEL", "DEBUG"))
+    # Compact JSON-lines log (one object per message with the test context), empty = disabled
+    json_file: str = Field(default_factory=lambda: os.getenv("LOG_JSON", ""))
+    # Messages formatted by the caller, written by a background thread (the tests never wait on the disk)
+    enqueue: bool = Field(default_factory=lambda: os.getenv("LOG_ENQUEUE", "true").lower() == "true")
+    # DEBUG messages per second kept for each logging call site, the others are counted (0 = unlimited)
+    debug_rate: int = Field(default_factory=lambda: int(os.getenv("LOG_DEBUG_RATE", "50")))
+
+class ArtifactConfig(BaseModel):
+    """Retention of the run artifacts (traces, screenshots, rotated logs); 0 = no limit"""
+    index_file: Path = Field(default_factory=lambda: Path(os.getenv("ARTIFACT_INDEX", "patches/artifacts.db")))
+    trace_max_age_days: int = Field(default_factory=lambda: int(os.getenv("TRACE_MAX_AGE_DAYS", "14")))
+    trace_max_count: int = Field(default_factory=lambda: int(os.getenv("TRACE_MAX_COUNT", "50")))
+    trace_max_mb: int = Field(default_factory=lambda: int(os.getenv("TRACE_MAX_MB", "500")))
+    screenshot_max_age_days: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_MAX_AGE_DAYS", "30")))
+    screenshot_max_count: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_MAX_COUNT", "2000")))
+    screenshot_max_mb: int = Field(default_factory=lambda: int(os.getenv("SCREENSHOT_MAX_MB", "200")))
+    log_max_age_days: int = Field(default_factory=lambda: int(os.getenv("LOG_MAX_AGE_DAYS", "14")))
+    log_max_count: int = Field(default_factory=lambda: int(os.getenv("LOG_MAX_COUNT", "0")))
+    log_max_mb: int = Field(default_factory=lambda: int(os.getenv("LOG_MAX_MB", "100")))
+    # Artifacts not used for this many days are gzipped when it saves space (0 = never)
+    compress_after_days: int = Field(default_factory=lambda: int(os.getenv("ARTIFACT_COMPRESS_AFTER_DAYS", "3")))
+    # Enforce the limits when the runner is torn down (otherwise only with `auto-heal gc`)
+    gc_on_teardown: bool = Field(default_factory=lambda: os.getenv("ARTIFACT_GC_ON_TEARDOWN", "true").lower() == "true")
+
+    def limits(self, kind: str) -> Dict[str, int]:
+        """Age in days, count and total size in bytes allowed for a kind of artifact"""
+        return {
+            "max_age_days": getattr(self, f"{kind}_max_age_days"),
+            "max_count": getattr(self, f"{kind}_max_count"),
+            "max_bytes": getattr(self, f"{kind}_max_mb") * 1024 * 1024,
+        }
 
 class Config:
     """Main configuration class"""
@@ -43,10 +129,20 @@ class Config:
         self.playwright = PlaywrightConfig()
         self.llm = LLMConfig()
         self.auto_heal = AutoHealConfig()
-        self._create_directories()
+        self.logging = LoggingConfig()
+        self.artifacts = ArtifactConfig()
+        self._directories_created = False
+
+    def ensure_directories(self):
+        """
+        Create necessary directories if they don't exist
+
+        Called by the components that write artifacts, so importing the
+        config (e.g. for `auto-heal --help`) has no filesystem side effects.
+        """
+        if self._directories_created:
+            return
 
-    def _create_directories(self):
-        """Create necessary directories if they don't exist"""
         directories = [
             self.playwright.trace_dir,
             self.playwright.screenshot_dir,
@@ -56,7 +152,7 @@ class Config:
         ]
         for directory in directories:
             directory.mkdir(parents=True, exist_ok=True)
+        self._directories_created = True
 
 # Global config instance
 config = Config()
-
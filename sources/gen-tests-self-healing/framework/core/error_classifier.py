@@ -0,0 +1,214 @@
+"""
+Error Classifier - Sort Playwright errors into heal classes
+"""
+import ast
+import re
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from .selector_override import LOCATOR_FACTORIES
+
+# Error classes
+# The locator matched no element (before the timeout)
+NOT_FOUND = "not_found"
+# The locator matched several elements of a strict action
+STRICT_MODE = "strict_mode"
+# The locator matched an element that never became visible
+NOT_VISIBLE = "not_visible"
+# The element was removed from the DOM while acting on it (re-render)
+DETACHED = "detached"
+# The element was found but never became actionable (disabled, covered, moving), or no locator was involved
+TIMEOUT = "timeout"
+# Page load, network or crashed/closed page
+NAVIGATION = "navigation"
+# An assertion failed on an element that was found (wrong text, value, state...)
+ASSERTION = "assertion"
+# Anything else (errors of the test code itself)
+UNKNOWN = "unknown"
+
+# Classes a new selector can fix
+HEALABLE = frozenset({NOT_FOUND, STRICT_MODE, NOT_VISIBLE, UNKNOWN})
+
+# Guidance given to the healer for each healable class
+HINTS = {
+    NOT_FOUND: "The selector matches no element of the page: find the element it was meant to target.",
+    STRICT_MODE: "The selector matches several elements: make it specific to the element the test targets.",
+    NOT_VISIBLE: "The selector matches a hidden element: target the visible element the test interacts with.",
+}
+
+# Why errors of the other classes are not sent to the healer
+SKIP_REASONS = {
+    DETACHED: "the element was re-rendered while acting on it, the selector still matches",
+    TIMEOUT: "the element was found but never became actionable (disabled, covered or moving)",
+    NAVIGATION: "page load or network failure, not a selector problem",
+    ASSERTION: "the assertion failed on an element that was found",
+}
+
+_STRICT_RE = re.compile(r"strict mode violation: (?P<locator>.+?) resolved to (?P<count>\d+) elements")
+_NAVIGATION_RE = re.compile(
+    r"net::ERR_|NS_ERROR_|NS_BINDING_ABORTED|Navigation failed|navigating to \"|Navigating frame was detached"
+    r"|frame was detached|page crashed|Target (?:page, context or browser|closed)|has been closed"
+    r"|^(?:Page|Frame)\.(?:goto|reload|go_back|go_forward|wait_for_url|wait_for_load_state|wait_for_navigation):",
+    re.MULTILINE,
+)
+_EXPECT_RE = re.compile(r"^(?:Locator|Page) expected (?:not )?to |Expect \"(?:not_)?to_", re.MULTILINE)
+_MISSING_RE = re.compile(r"element\(s\) not found|Actual value: <element\(s\) not found>")
+_DETACHED_RE = re.compile(r"element was detached from the DOM|Element is not attached to the DOM", re.IGNORECASE)
+_NOT_VISIBLE_RE = re.compile(r"element is not visible|element is outside of the viewport")
+_NOT_ACTIONABLE_RE = re.compile(r"element is not (?:enabled|stable|editable)|intercepts pointer events")
+_TIMEOUT_RE = re.compile(r"Timeout \d+ms exceeded")
+_TIMEOUT_MS_RE = re.compile(r"Timeout (\d+)ms exceeded")
+_WAITING_RE = re.compile(
+    r"waiting for (?P<locator>.+?)(?: to be (?:attached|detached|visible|hidden))?\s*$", re.MULTILINE
+)
+_SELECTOR_RE = re.compile(r"(?:waiting for )?selector [\"'](?P<selector>[^\"']+)[\"']")
+
+
+class LocatorDetails(BaseModel):
+    """Locator named in a Playwright error"""
+    expression: str = Field(description="Locator as printed by Playwright, e.g. get_by_role(\"button\")")
+    method: str = Field(default="locator", description="Locator method targeting the element (get_by_role...)")
+    selector: str = Field(description="First argument of the method (selector, role, label, text...)")
+    options: Dict[str, Any] = Field(default_factory=dict, description="Keyword arguments of the method")
+
+    @property
+    def heal_selector(self) -> str:
+        """Selector to heal: the plain selector of a single locator() call, the whole expression otherwise"""
+        if self.method == "locator" and self.expression.startswith("locator(") and ")." not in self.expression:
+            return self.selector
+        return self.expression
+
+
+class ErrorClassification(BaseModel):
+    """Class of a test error and the details extracted from it"""
+    error_class: str = Field(description="not_found, strict_mode, not_visible, detached, timeout, navigation, "
+                                         "assertion or unknown")
+    locator: Optional[LocatorDetails] = Field(default=None, description="Locator the error is about, if any")
+    matches: Optional[int] = Field(default=None, description="Elements matched (strict mode violations)")
+    timeout_ms: Optional[int] = Field(default=None, description="Timeout exceeded, in milliseconds")
+
+    @property
+    def healable(self) -> bool:
+        """True if a new selector can fix the error"""
+        return self.error_class in HEALABLE
+
+    @property
+    def hint(self) -> Optional[str]:
+        """Guidance for the healer"""
+        return HINTS.get(self.error_class)
+
+    @property
+    def skip_reason(self) -> Optional[str]:
+        """Why the error is not healed, None if it is healable"""
+        return None if self.healable else SKIP_REASONS.get(self.error_class, self.error_class)
+
+    @property
+    def selector(self) -> str:
+        """Selector of the error, "unknown" if none was found"""
+        return self.locator.heal_selector if self.locator else "unknown"
+
+
+def _literal(node: ast.AST) -> Any:
+    """Value of an argument node (source text when it is not a literal, e.g. re.compile(...))"""
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return ast.unparse(node)
+
+
+def parse_locator(expression: str) -> Optional[LocatorDetails]:
+    """
+    Parse a locator printed by Playwright (Python syntax)
+
+    In a chain such as `locator("form").get_by_role("button").first`, the
+    last locator method is the one targeting the element.
+
+    Returns:
+        The locator details, None if the expression is not a locator
+    """
+    expression = expression.strip()
+    try:
+        node = ast.parse(expression, mode="eval").body
+    except SyntaxError:
+        node = None
+
+    while node is not None:
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if name in LOCATOR_FACTORIES and node.args:
+                selector = _literal(node.args[0])
+                return LocatorDetails(
+                    expression=expression,
+                    method=name,
+                    selector=str(selector),
+                    options={keyword.arg: _literal(keyword.value) for keyword in node.keywords if keyword.arg},
+                )
+            node = func.value if isinstance(func, ast.Attribute) else None
+        elif isinstance(node, ast.Attribute):
+            node = node.value
+        else:
+            node = None
+
+    # Selector engines printed as is (internal:role=..., css, xpath)
+    if expression and not expression.endswith(")") and " " not in expression.split("=", 1)[0]:
+        return LocatorDetails(expression=expression, selector=expression)
+    return None
+
+
+def _find_locator(message: str) -> Optional[LocatorDetails]:
+    """Locator an error message is about (last one waited for)"""
+    for match in reversed(list(_WAITING_RE.finditer(message))):
+        locator = parse_locator(match.group("locator"))
+        if locator is not None:
+            return locator
+    match = _SELECTOR_RE.search(message)
+    if match:
+        return LocatorDetails(expression=match.group("selector"), selector=match.group("selector"))
+    return None
+
+
+def classify_error(error: BaseException) -> ErrorClassification:
+    """
+    Classify a test error
+
+    Args:
+        error: Exception raised by the test (Playwright error, AssertionError from expect(), other)
+
+    Returns:
+        The error class and the locator details found in the message
+    """
+    message = str(error)
+    timeout = _TIMEOUT_MS_RE.search(message)
+    timeout_ms = int(timeout.group(1)) if timeout else None
+
+    strict = _STRICT_RE.search(message)
+    if strict:
+        return ErrorClassification(
+            error_class=STRICT_MODE,
+            locator=parse_locator(strict.group("locator")),
+            matches=int(strict.group("count")),
+            timeout_ms=timeout_ms,
+        )
+
+    if _NAVIGATION_RE.search(message):
+        return ErrorClassification(error_class=NAVIGATION, timeout_ms=timeout_ms)
+
+    locator = _find_locator(message)
+    if isinstance(error, AssertionError) or _EXPECT_RE.search(message):
+        # Failed expect(): only a missing element is a selector problem
+        error_class = NOT_FOUND if locator and _MISSING_RE.search(message) else ASSERTION
+    elif _DETACHED_RE.search(message):
+        error_class = DETACHED
+    elif _NOT_VISIBLE_RE.search(message):
+        error_class = NOT_VISIBLE
+    elif _NOT_ACTIONABLE_RE.search(message):
+        error_class = TIMEOUT
+    elif locator is not None and (_TIMEOUT_RE.search(message) or _SELECTOR_RE.search(message)):
+        error_class = NOT_FOUND
+    elif _TIMEOUT_RE.search(message):
+        error_class = TIMEOUT
+    else:
+        error_class = UNKNOWN
+    return ErrorClassification(error_class=error_class, locator=locator, timeout_ms=timeout_ms)
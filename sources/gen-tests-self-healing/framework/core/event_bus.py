@@ -0,0 +1,277 @@
+"""
+Event Bus - Structured run events, delivered in process and shared with other processes
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .config import config
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    run_id TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp);
+"""
+
+# Event types
+# A test started (test_id)
+TEST_STARTED = "test_started"
+# A test finished (test_id, outcome, duration in seconds, heals)
+TEST_FINISHED = "test_finished"
+# The failure context of a test was captured (error_class, selector, seconds)
+FAILURE_CAPTURED = "failure_captured"
+# A prompt was sent to the LLM (operation, model)
+LLM_REQUEST = "llm_request"
+# The LLM answered (operation, model, latency_ms, input/output/cached tokens, cost_usd)
+LLM_RESPONSE = "llm_response"
+# A patch was applied to a test file (patch_id, test_file, selector, seconds)
+PATCH_APPLIED = "patch_applied"
+# A test or an action is run again (test_id, reason: flake, heal, in_place, propagated)
+RETRY = "retry"
+
+EVENT_TYPES = (TEST_STARTED, TEST_FINISHED, FAILURE_CAPTURED, LLM_REQUEST, LLM_RESPONSE, PATCH_APPLIED, RETRY)
+
+# Events waiting for the writer thread; events published beyond are dropped (tests never wait on the log)
+MAX_PENDING = 10000
+
+# Seconds the writer waits for more events before writing a batch
+WRITE_INTERVAL = 0.2
+
+_STOP = object()
+
+Subscriber = Callable[["Event"], None]
+
+
+class Event(BaseModel):
+    """A structured event of a run"""
+    id: Optional[int] = Field(default=None, description="Position in the event log (set once written)")
+    type: str = Field(description="Event type (test_started, llm_response...)")
+    timestamp: float = Field(description="Unix time of the event")
+    run_id: str = Field(description="Run (process) publishing the event")
+    pid: int = Field(description="Process id of the publisher")
+    data: Dict[str, Any] = Field(default_factory=dict, description="Event payload")
+
+
+class EventBus:
+    """
+    Publishes run events to in-process subscribers and to a shared SQLite log
+
+    Subscribers are called synchronously by `publish()`, so they must be
+    fast. Events are also queued for a writer thread that appends them in
+    batches to the event log (WAL mode): other processes, such as the Dev
+    UI event stream, read them with `since()`. Publishing never blocks on
+    the database; when the writer falls MAX_PENDING events behind, new
+    events are dropped and counted.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, enabled: Optional[bool] = None):
+        self.db_path = Path(db_path or config.auto_heal.event_log)
+        self.enabled = config.auto_heal.events_enabled if enabled is None else enabled
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.dropped = 0
+        self._subscribers: List[Subscriber] = []
+        self._queue: "queue.Queue[Any]" = queue.Queue(MAX_PENDING)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        atexit.register(self.shutdown)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), timeout=config.auto_heal.lock_timeout, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema and upgrade it to SCHEMA_VERSION"""
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def subscribe(self, subscriber: Subscriber):
+        """Call a function with every event published by this process"""
+        self._subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Stop calling a subscriber"""
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    def publish(self, event_type: str, **data: Any) -> Optional[Event]:
+        """
+        Publish an event
+
+        Args:
+            event_type: Event type (see EVENT_TYPES)
+            **data: Event payload (JSON serializable)
+
+        Returns:
+            The event, None if events are disabled
+        """
+        if not self.enabled:
+            return None
+
+        event = Event(type=event_type, timestamp=time.time(), run_id=self.run_id, pid=os.getpid(), data=data)
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber(event)
+            except Exception as e:
+                logger.debug(f"Event subscriber failed on {event_type}: {e}")
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+        return event
+
+    def since(self, last_id: int = 0, limit: int = 500) -> List[Event]:
+        """Events written to the log after an id, oldest first (from every process)"""
+        if not self.db_path.exists():
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+            ).fetchall()
+        return [
+            Event(
+                id=row["id"], type=row["type"], timestamp=row["timestamp"], run_id=row["run_id"], pid=row["pid"],
+                data=json.loads(row["data"]),
+            )
+            for row in rows
+        ]
+
+    def last_id(self) -> int:
+        """Id of the last event written to the log (0 if empty)"""
+        if not self.db_path.exists():
+            return 0
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every published event is written to the log
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if self._thread is None or not self._thread.is_alive():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning(f"Event log flush timed out with {self._queue.qsize()} event(s) pending")
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = 10.0):
+        """Write pending events and stop the writer thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        self.flush(timeout)
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+        if self.dropped:
+            logger.warning(f"{self.dropped} event(s) dropped (event log writer too slow)")
+
+    def apply_retention(self, days: Optional[int] = None) -> int:
+        """
+        Delete events older than the retention period
+
+        Args:
+            days: Retention in days, config.auto_heal.retention_days if None (0 keeps everything)
+
+        Returns:
+            Number of events deleted
+        """
+        days = config.auto_heal.retention_days if days is None else days
+        if not days or not self.db_path.exists():
+            return 0
+
+        cutoff = time.time() - days * 86400
+        with self._lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM events WHERE timestamp < ?", (cutoff,)).rowcount
+        logger.info(f"Event log retention ({days} days): {deleted} event(s) deleted")
+        return deleted
+
+    def _ensure_started(self):
+        """Start the writer thread on first use"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="auto-heal-events", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Writer loop: collect the events published meanwhile, append them in one transaction"""
+        while True:
+            item = self._queue.get()
+            batch = [] if item is _STOP else [item]
+            stop = item is _STOP
+            deadline = time.monotonic() + WRITE_INTERVAL
+            while not stop:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch: List[Event]):
+        try:
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    "INSERT INTO events (type, timestamp, run_id, pid, data) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (event.type, event.timestamp, event.run_id, event.pid, json.dumps(event.data, default=str))
+                        for event in batch
+                    ],
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Could not write {len(batch)} event(s) to {self.db_path}: {e}")
+
+
+# Global event bus of the current process
+event_bus = EventBus()
@@ -0,0 +1,126 @@
+"""
+File Lock - Cross-process file locking and atomic writes
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+LOCK_DIR = Path(tempfile.gettempdir()) / "auto-heal-locks"
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, shared by every process of the machine
+
+    The lock is taken on a separate lock file (keyed by the resolved path of the
+    target) so the target itself can be atomically replaced while locked.
+    """
+
+    def __init__(self, path: Path, timeout: float = 30.0, poll_interval: float = 0.05):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        digest = hashlib.sha1(str(self.path.resolve()).encode("utf-8")).hexdigest()
+        self.lock_path = LOCK_DIR / f"{digest}.lock"
+        self._handle = None
+
+    def acquire(self):
+        """Acquire the lock, raising TimeoutError after `timeout` seconds"""
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.lock_path, "a+b")
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            try:
+                if os.name == "nt":
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._handle = handle
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    handle.close()
+                    raise TimeoutError(f"Could not lock {self.path} within {self.timeout}s")
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        """Release the lock"""
+        if self._handle is None:
+            return
+        try:
+            if os.name == "nt":
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def atomic_write(path: Path, data: Union[str, bytes], encoding: str = "utf-8"):
+    """
+    Write a file atomically (temp file in the same directory + rename)
+
+    Readers never observe a half-written file, and a crash leaves the
+    previous content untouched.
+    """
+    path = Path(path)
+    payload = data.encode(encoding) if isinstance(data, str) else data
+
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_name)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def content_hash(data: Union[str, bytes]) -> str:
+    """SHA-256 of a text or binary content"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: Path) -> Optional[str]:
+    """SHA-256 of a file, None if it cannot be read"""
+    try:
+        return content_hash(Path(path).read_bytes())
+    except OSError:
+        return None
+
+
+def unique_suffix() -> str:
+    """Collision-free suffix for artifact names (microsecond timestamp + random part)"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
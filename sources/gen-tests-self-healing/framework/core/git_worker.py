@@ -0,0 +1,169 @@
+"""
+Git Worker - Background git commits off the test critical path
+"""
+import atexit
+import queue
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from git.exc import GitCommandError
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+Heal = Tuple[Path, Dict[str, Any]]
+
+_STOP = object()
+
+# Live workers, flushed by a single exit hook (weak references: a discarded worker is not kept alive)
+_workers: "weakref.WeakSet[GitCommitWorker]" = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown_workers():
+    """Flush pending commits of every live worker when the interpreter exits"""
+    for worker in list(_workers):
+        worker.shutdown()
+
+
+def is_lock_contention(error: Exception) -> bool:
+    """True when a git error is caused by another process holding the index lock"""
+    message = str(error)
+    return "index.lock" in message or ("Unable to create" in message and ".lock" in message)
+
+
+class GitCommitWorker:
+    """
+    Commits heals from a background thread
+
+    Heals submitted close together are combined into a single commit, commits
+    failing on index lock contention are retried with backoff, and pending
+    commits are flushed on shutdown.
+    """
+
+    def __init__(
+        self,
+        commit_fn: Callable[[List[Heal]], None],
+        coalesce_window: float = 2.0,
+        max_retries: int = 5,
+        retry_delay: float = 0.2,
+    ):
+        """
+        Args:
+            commit_fn: Function committing a batch of heals (raises on failure)
+            coalesce_window: Seconds to wait for more heals before committing
+            max_retries: Attempts on index lock contention
+            retry_delay: Initial backoff delay in seconds (doubled on each retry)
+        """
+        self.commit_fn = commit_fn
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        _workers.add(self)
+
+    def submit(self, heals: List[Heal]):
+        """Queue heals for commit and return immediately"""
+        if not heals:
+            return
+        self._ensure_started()
+        with self._idle:
+            self._pending += len(heals)
+        for heal in heals:
+            self._queue.put(heal)
+        logger.debug(f"{len(heals)} heal(s) queued for commit")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued heal has been committed (or given up)
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"Git worker flush timed out with {self._pending} heal(s) pending")
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = 30.0):
+        """Flush pending commits and stop the worker thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self.flush(timeout)
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    def _ensure_started(self):
+        """Start the worker thread on first use"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="auto-heal-git", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Worker loop: collect a batch, commit it, repeat"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stop = False
+            # Combine heals arriving within the coalesce window (bounded so a
+            # steady stream of heals still gets committed)
+            deadline = time.monotonic() + self.coalesce_window * 5
+            while True:
+                wait = min(self.coalesce_window, deadline - time.monotonic())
+                if wait <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=wait)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit_with_retry(batch)
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+            if stop:
+                return
+
+    def _commit_with_retry(self, batch: List[Heal]):
+        """Commit a batch, retrying on index lock contention"""
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.commit_fn(batch)
+                return
+            except (GitCommandError, OSError) as e:
+                if not is_lock_contention(e) or attempt == self.max_retries:
+                    logger.error(f"Git commit of {len(batch)} heal(s) failed: {e}")
+                    return
+                logger.debug(f"Git index locked, retrying in {delay:.1f}s ({attempt}/{self.max_retries})")
+                time.sleep(delay)
+                delay *= 2
+            except Exception as e:
+                logger.error(f"Git commit of {len(batch)} heal(s) failed: {e}")
+                return
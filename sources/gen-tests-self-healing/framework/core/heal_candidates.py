@@ -0,0 +1,283 @@
+"""
+Heal Candidates - Collect candidate selectors for a heal and rank them against the live page
+"""
+import ast
+import asyncio
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from playwright.async_api import Error as PlaywrightError, Page
+from pydantic import BaseModel, Field
+
+from .logger import get_logger
+from .selector_override import LOCATOR_FACTORIES, build_locator
+
+logger = get_logger(__name__)
+
+# Origin of a candidate
+# Selector of the LLM patch
+SOURCE_LLM = "llm"
+# Backup selector suggested by the LLM (`alternative_selectors`)
+SOURCE_ALTERNATIVE = "alternative"
+# Selector of an extra analysis sample
+SOURCE_SAMPLE = "sample"
+# Selector derived locally from the failed one
+SOURCE_HEURISTIC = "heuristic"
+
+# Confidence of a backup selector, relative to the one of the analysis suggesting it
+ALTERNATIVE_DISCOUNT = 0.8
+
+# Confidence given to the selectors derived locally (no LLM judged them)
+HEURISTIC_CONFIDENCE = 0.3
+
+# Weights of the ranking score: uniqueness on the page, stability of the selector method, confidence
+UNIQUENESS_WEIGHT = 0.5
+STABILITY_WEIGHT = 0.2
+CONFIDENCE_WEIGHT = 0.3
+
+# Stability of the locator methods: user-facing attributes survive markup refactors best
+METHOD_STABILITY = {
+    "get_by_test_id": 1.0,
+    "get_by_role": 0.9,
+    "get_by_label": 0.85,
+    "get_by_placeholder": 0.8,
+    "get_by_alt_text": 0.8,
+    "get_by_title": 0.75,
+    "get_by_text": 0.7,
+}
+
+# Stability of plain selectors by shape, first matching pattern wins
+SELECTOR_STABILITY = (
+    (re.compile(r"^\[data-(testid|test-id|test|qa)[~|^$*]?="), 1.0),
+    (re.compile(r"^role="), 0.9),
+    (re.compile(r"^\[(aria-label|name|placeholder)[~|^$*]?="), 0.8),
+    (re.compile(r"^text="), 0.7),
+    (re.compile(r"^#[\w-]+$"), 0.6),
+    (re.compile(r"^(xpath=|//|\(//)"), 0.2),
+    (re.compile(r":nth-|>>|\s>\s|\s\S+\s"), 0.3),
+)
+
+# Stability of the other plain selectors (tags, classes, short CSS)
+DEFAULT_STABILITY = 0.5
+
+# Identifier of the element targeted by a failed selector (id, test id, name, text...)
+_TOKEN = re.compile(
+    r"""^#([\w-]+)$|^\.([\w-]+)$|\[(?:data-testid|data-test|name|id)\s*[*^$~|]?=\s*["']?([^"'\]]+)["']?\]"""
+)
+
+
+class SelectorCandidate(BaseModel):
+    """A candidate selector for a heal, with its validation against the live page"""
+    selector: str = Field(description="Selector (argument of the locator method)")
+    method: Optional[str] = Field(default=None, description="Locator method building it (None: locator)")
+    source: str = Field(description="Origin of the candidate (llm, alternative, sample, heuristic)")
+    confidence: float = Field(default=0.0, description="Confidence of the origin (0.0 to 1.0)")
+    matches: Optional[int] = Field(default=None, description="Elements matched on the live page (None: invalid)")
+    score: float = Field(default=0.0, description="Ranking score (higher is better)")
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.selector, self.method or "locator"
+
+
+def parse_selector(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Selector and method of a suggested selector
+
+    Suggestions written as a locator call (`get_by_test_id("login")`,
+    `page.get_by_role("button", name="Log in")`) are converted to the
+    selector and method the heal map records; role calls with options
+    become a `role=` selector. Anything else is a plain selector.
+    """
+    text = text.strip()
+    try:
+        node = ast.parse(text, mode="eval").body
+    except SyntaxError:
+        return text, None
+    if not (isinstance(node, ast.Call) and isinstance(node.func, (ast.Name, ast.Attribute))):
+        return text, None
+
+    method = node.func.id if isinstance(node.func, ast.Name) else node.func.attr
+    if method not in LOCATOR_FACTORIES or len(node.args) != 1:
+        return text, None
+    try:
+        argument = ast.literal_eval(node.args[0])
+        options = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+    except ValueError:
+        return text, None
+    if not isinstance(argument, str) or None in options:
+        return text, None
+
+    if not options:
+        return argument, None if method == "locator" else method
+    if method == "get_by_role":
+        # exact=True is the case-sensitive "s" flag of the name, other options are role attributes
+        exact = options.pop("exact", False)
+        attributes = "".join(
+            f"[{name.replace('_', '-')}={_role_value(value, exact and name == 'name')}]"
+            for name, value in options.items()
+        )
+        return f"role={argument}{attributes}", None
+    return text, None
+
+
+def _role_value(value: Any, exact: bool = False) -> str:
+    """Attribute value of a role selector (quoted strings, `s` suffix for an exact match)"""
+    if isinstance(value, str):
+        return json.dumps(value) + ("s" if exact else "")
+    return str(value).lower()
+
+
+def selector_stability(selector: str, method: Optional[str] = None) -> float:
+    """How well a selector survives markup changes (0.0 to 1.0)"""
+    if method and method != "locator":
+        return METHOD_STABILITY.get(method, DEFAULT_STABILITY)
+    for pattern, stability in SELECTOR_STABILITY:
+        if pattern.search(selector):
+            return stability
+    return DEFAULT_STABILITY
+
+
+def heuristic_candidates(selector: str) -> List[SelectorCandidate]:
+    """
+    Selectors derived from the identifier of a failed selector
+
+    `#submit-btn` yields the elements whose test id, name or id still
+    carries `submit-btn`, so a renamed id or a class moved to a test id
+    is found without the LLM.
+    """
+    text, method = parse_selector(selector)
+    if method in ("get_by_test_id", "get_by_text", "get_by_label", "get_by_placeholder"):
+        token = text
+    else:
+        match = _TOKEN.search(text)
+        token = next((group for group in match.groups() if group), None) if match else None
+    if not token:
+        return []
+
+    quoted = json.dumps(token)
+    suggestions = [
+        (token, "get_by_test_id"),
+        (f"[data-test={quoted}]", None),
+        (f"[name={quoted}]", None),
+        (f"[id*={quoted}]", None),
+        (f"[aria-label={quoted} i]", None),
+    ]
+    if re.search(r"[A-Za-z]{3}", token):
+        suggestions.append((token.replace("-", " ").replace("_", " "), "get_by_text"))
+    return [
+        SelectorCandidate(selector=candidate, method=candidate_method, source=SOURCE_HEURISTIC,
+                          confidence=HEURISTIC_CONFIDENCE)
+        for candidate, candidate_method in suggestions
+        if (candidate, candidate_method or "locator") != (text, method or "locator")
+    ]
+
+
+def collect_candidates(
+    patch_info: Dict[str, Any],
+    original: str,
+    limit: int,
+    samples: Iterable[Dict[str, Any]] = (),
+) -> List[SelectorCandidate]:
+    """
+    Candidate selectors of a heal, most trusted first, without duplicates
+
+    Args:
+        patch_info: Patch information of the heal (`selector`, `selector_method`,
+            `confidence`, `alternative_selectors`, `samples`)
+        original: Selector that failed (source of the heuristic candidates)
+        limit: Maximum number of candidates
+        samples: Extra analyses (defaults to patch_info["samples"])
+
+    Returns:
+        Up to `limit` candidates
+    """
+    confidence = float(patch_info.get("confidence") or 0.0)
+    candidates: List[SelectorCandidate] = []
+    if patch_info.get("selector"):
+        candidates.append(SelectorCandidate(
+            selector=patch_info["selector"], method=patch_info.get("selector_method"), source=SOURCE_LLM,
+            confidence=confidence,
+        ))
+    for alternative in patch_info.get("alternative_selectors") or []:
+        if isinstance(alternative, str) and alternative.strip():
+            selector, method = parse_selector(alternative)
+            candidates.append(SelectorCandidate(
+                selector=selector, method=method, source=SOURCE_ALTERNATIVE,
+                confidence=confidence * ALTERNATIVE_DISCOUNT,
+            ))
+    for sample in samples or patch_info.get("samples") or []:
+        sample_confidence = float(sample.get("confidence") or 0.0)
+        if sample.get("selector"):
+            candidates.append(SelectorCandidate(
+                selector=sample["selector"], method=sample.get("selector_method"), source=SOURCE_SAMPLE,
+                confidence=sample_confidence,
+            ))
+        for alternative in sample.get("alternative_selectors") or []:
+            if isinstance(alternative, str) and alternative.strip():
+                selector, method = parse_selector(alternative)
+                candidates.append(SelectorCandidate(
+                    selector=selector, method=method, source=SOURCE_SAMPLE,
+                    confidence=sample_confidence * ALTERNATIVE_DISCOUNT,
+                ))
+    candidates.extend(heuristic_candidates(original))
+
+    unique: Dict[Tuple[str, str], SelectorCandidate] = {}
+    for candidate in candidates:
+        if candidate.key not in unique:
+            unique[candidate.key] = candidate
+        elif candidate.confidence > unique[candidate.key].confidence:
+            # The same selector suggested twice keeps its best confidence, not its origin
+            unique[candidate.key].confidence = candidate.confidence
+    return list(unique.values())[:max(limit, 1)]
+
+
+async def _count(page: Page, candidate: SelectorCandidate) -> SelectorCandidate:
+    """
+    Count the elements a candidate matches
+
+    The suggested method is tried first, then the selector as a plain
+    Playwright selector (LLMs often pair a CSS selector with a get_by_* method).
+    """
+    methods = [candidate.method, None] if candidate.method and candidate.method != "locator" else [None]
+    for method in methods:
+        try:
+            matches = await build_locator(page, candidate.selector, method).count()
+        except PlaywrightError as e:
+            logger.debug(f"Candidate '{candidate.selector}' ({method or 'locator'}) is not valid: {e}")
+            continue
+        if matches:
+            candidate.method, candidate.matches = method, matches
+            return candidate
+        candidate.matches = 0
+    return candidate
+
+
+async def rank_candidates(page: Page, candidates: List[SelectorCandidate]) -> List[SelectorCandidate]:
+    """
+    Validate candidates against the live page at the same time and rank them
+
+    Candidates matching no element are dropped. The others are scored by
+    uniqueness (one match is best: actions on several elements fail in
+    strict mode), stability of their selector method and confidence; ties
+    keep the collection order.
+
+    Returns:
+        The matching candidates, best first
+    """
+    counted = await asyncio.gather(*(_count(page, candidate) for candidate in candidates))
+    valid = [candidate for candidate in counted if candidate.matches]
+    for candidate in valid:
+        candidate.score = round(
+            UNIQUENESS_WEIGHT / candidate.matches
+            + STABILITY_WEIGHT * selector_stability(candidate.selector, candidate.method)
+            + CONFIDENCE_WEIGHT * candidate.confidence,
+            4,
+        )
+    valid.sort(key=lambda candidate: -candidate.score)
+    logger.info(
+        f"{len(valid)}/{len(candidates)} candidate selector(s) match the page"
+        + (f", best: '{valid[0].selector}' ({valid[0].source}, score {valid[0].score})" if valid else "")
+    )
+    return valid
@@ -0,0 +1,388 @@
+"""
+Heal Ledger - Append-only SQLite history of applied patches
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .config import config
+from .file_lock import unique_suffix
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS heals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patch_id TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    test_file TEXT NOT NULL,
+    selector TEXT,
+    selector_method TEXT,
+    confidence REAL,
+    outcome TEXT NOT NULL,
+    explanation TEXT,
+    patch_code TEXT,
+    backup_file TEXT,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    usage TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_heals_timestamp ON heals (timestamp);
+CREATE INDEX IF NOT EXISTS idx_heals_test_file ON heals (test_file, timestamp);
+CREATE INDEX IF NOT EXISTS idx_heals_selector ON heals (selector);
+CREATE INDEX IF NOT EXISTS idx_heals_outcome ON heals (outcome, timestamp);
+CREATE TABLE IF NOT EXISTS selector_overrides (
+    selector TEXT NOT NULL,
+    call_site TEXT NOT NULL,
+    healed_selector TEXT NOT NULL,
+    selector_method TEXT,
+    confidence REAL,
+    test_file TEXT,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (selector, call_site)
+);
+"""
+
+# Statements upgrading the schema to each version
+_MIGRATIONS = {
+    2: [
+        "ALTER TABLE heals ADD COLUMN before_hash TEXT",
+        "ALTER TABLE heals ADD COLUMN after_hash TEXT",
+    ],
+    3: [
+        "ALTER TABLE selector_overrides ADD COLUMN page TEXT",
+    ],
+}
+
+# Outcomes recorded by the patch manager
+OUTCOME_APPLIED = "applied"
+OUTCOME_NOT_FOUND = "not_found"
+OUTCOME_CONFLICT = "conflict"
+# Selector healed at runtime by the selector override layer, source left untouched
+OUTCOME_OVERRIDE = "override"
+
+_COLUMNS = [
+    "patch_id", "timestamp", "test_file", "selector", "selector_method", "confidence",
+    "outcome", "explanation", "patch_code", "backup_file", "cost_usd", "usage", "before_hash", "after_hash",
+]
+
+
+class HealLedger:
+    """
+    Heal history stored in a single SQLite database
+
+    The database runs in WAL mode so test processes can append heals while
+    `auto-heal status` reads, and every column used to filter the history
+    (timestamp, test file, selector, outcome) is indexed.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.auto_heal.ledger_file)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), timeout=config.auto_heal.lock_timeout, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema and upgrade it to SCHEMA_VERSION"""
+        conn.executescript(_SCHEMA)
+        # Serialize migrations between processes opening the ledger together
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0] or 1
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in _MIGRATIONS.get(target, []):
+                    conn.execute(statement)
+                logger.debug(f"Heal ledger schema upgraded to version {target}")
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(
+        self,
+        test_file: Path,
+        patch_info: Dict[str, Any],
+        before_hash: Optional[str] = None,
+        after_hash: Optional[str] = None,
+        outcome: str = OUTCOME_APPLIED,
+        patch_id: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> str:
+        """
+        Append a heal to the ledger
+
+        Args:
+            test_file: Patched test file
+            patch_info: Patch information from LLM (selector, confidence, usage...)
+            before_hash: Backup store hash of the file before patching
+            after_hash: Backup store hash of the file after patching
+            outcome: Result of the patch (applied, not_found, conflict)
+            patch_id: Identifier of the heal, generated if None
+            timestamp: ISO timestamp, now if None
+
+        Returns:
+            The patch identifier
+        """
+        usage = patch_info.get("usage") or {}
+        row = {
+            "patch_id": patch_id or f"patch_{unique_suffix()}",
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "test_file": str(test_file),
+            "selector": patch_info.get("selector"),
+            "selector_method": patch_info.get("selector_method"),
+            "confidence": patch_info.get("confidence"),
+            "outcome": outcome,
+            "explanation": patch_info.get("explanation"),
+            "patch_code": patch_info.get("patch_code"),
+            "backup_file": None,
+            "cost_usd": usage.get("cost_usd", 0.0) if isinstance(usage, dict) else 0.0,
+            "usage": json.dumps(usage) if usage else None,
+            "before_hash": before_hash,
+            "after_hash": after_hash,
+        }
+        self._insert([row])
+        return row["patch_id"]
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows, ignoring patch ids already present; returns the number inserted"""
+        placeholders = ", ".join(f":{column}" for column in _COLUMNS)
+        sql = f"INSERT OR IGNORE INTO heals ({', '.join(_COLUMNS)}) VALUES ({placeholders})"
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(sql, rows)
+            return self.conn.total_changes - before
+
+    def recent(
+        self,
+        limit: int = 10,
+        test_file: Optional[str] = None,
+        selector: Optional[str] = None,
+        outcome: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Most recent heals, newest first
+
+        Args:
+            limit: Maximum number of heals
+            test_file: Only heals of this test file
+            selector: Only heals of this selector
+            outcome: Only heals with this outcome
+
+        Returns:
+            List of heal records
+        """
+        filters = {"test_file": test_file, "selector": selector, "outcome": outcome}
+        clauses = [f"{column} = :{column}" for column, value in filters.items() if value is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM heals {where} ORDER BY timestamp DESC LIMIT :limit"
+
+        with self._lock:
+            rows = self.conn.execute(sql, {**filters, "limit": limit}).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get(self, patch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a heal by its patch identifier"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM heals WHERE patch_id = ?", (patch_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def stats(self, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aggregate figures over the ledger
+
+        Args:
+            since: ISO timestamp, only heals recorded after it
+
+        Returns:
+            Dictionary with totals, per-outcome counts and average confidence
+        """
+        where, params = ("WHERE timestamp >= ?", (since,)) if since else ("", ())
+        with self._lock:
+            total = self.conn.execute(
+                f"SELECT COUNT(*), AVG(confidence), COALESCE(SUM(cost_usd), 0) FROM heals {where}", params
+            ).fetchone()
+            outcomes = self.conn.execute(
+                f"SELECT outcome, COUNT(*) FROM heals {where} GROUP BY outcome", params
+            ).fetchall()
+
+        return {
+            "total": total[0],
+            "avg_confidence": total[1] or 0.0,
+            "cost_usd": total[2],
+            "by_outcome": {outcome: count for outcome, count in outcomes},
+        }
+
+    def top_selectors(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Selectors healed most often"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT selector, COUNT(*) AS heals, MAX(timestamp) AS last_healed FROM heals "
+                "WHERE selector IS NOT NULL GROUP BY selector ORDER BY heals DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def apply_retention(self, days: Optional[int] = None) -> int:
+        """
+        Delete heals older than the retention period
+
+        Args:
+            days: Retention in days, config.auto_heal.retention_days if None (0 keeps everything)
+
+        Returns:
+            Number of heals deleted
+        """
+        days = config.auto_heal.retention_days if days is None else days
+        if not days:
+            return 0
+
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM heals WHERE timestamp < ?", (cutoff,)).rowcount
+        logger.info(f"Heal ledger retention ({days} days): {deleted} heal(s) deleted")
+        return deleted
+
+    def referenced_blobs(self) -> Set[str]:
+        """Backup store hashes referenced by at least one heal"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT before_hash FROM heals WHERE before_hash IS NOT NULL "
+                "UNION SELECT after_hash FROM heals WHERE after_hash IS NOT NULL"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def import_json_files(self, patch_dir: Optional[Path] = None, archive: bool = True) -> int:
+        """
+        Migrate legacy `patch_*.json` metadata files into the ledger
+
+        Args:
+            patch_dir: Directory holding the JSON files
+            archive: Move imported files to `<patch_dir>/migrated` so they are not scanned again
+
+        Returns:
+            Number of heals imported
+        """
+        patch_dir = Path(patch_dir or config.auto_heal.patch_dir)
+        files = sorted(patch_dir.glob("patch_*.json"))
+        rows = []
+
+        for patch_file in files:
+            try:
+                data = json.loads(patch_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable patch file {patch_file}: {e}")
+                continue
+            usage = data.get("usage") or {}
+            rows.append({
+                "patch_id": patch_file.stem,
+                "timestamp": data.get("timestamp") or datetime.fromtimestamp(patch_file.stat().st_mtime).isoformat(),
+                "test_file": data.get("test_file", "unknown"),
+                "selector": data.get("selector"),
+                "selector_method": data.get("selector_method"),
+                "confidence": data.get("confidence"),
+                "outcome": data.get("outcome", OUTCOME_APPLIED),
+                "explanation": data.get("explanation"),
+                "patch_code": data.get("patch_code"),
+                "backup_file": data.get("backup_file"),
+                "cost_usd": usage.get("cost_usd", 0.0),
+                "usage": json.dumps(usage) if usage else None,
+                "before_hash": None,
+                "after_hash": None,
+            })
+
+        imported = self._insert(rows) if rows else 0
+
+        if archive and files:
+            archive_dir = patch_dir / "migrated"
+            archive_dir.mkdir(exist_ok=True)
+            for patch_file in files:
+                try:
+                    patch_file.replace(archive_dir / patch_file.name)
+                except OSError as e:
+                    logger.warning(f"Could not archive {patch_file}: {e}")
+
+        logger.info(f"Imported {imported} heal(s) from {len(files)} JSON file(s) into {self.db_path}")
+        return imported
+
+    def count_legacy_files(self, patch_dir: Optional[Path] = None) -> int:
+        """Number of JSON metadata files not migrated yet"""
+        patch_dir = Path(patch_dir or config.auto_heal.patch_dir)
+        return sum(1 for _ in patch_dir.glob("patch_*.json"))
+
+    def overrides(self) -> List[Dict[str, Any]]:
+        """Every selector override (healed selector by original selector and call site)"""
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM selector_overrides").fetchall()
+        return [dict(row) for row in rows]
+
+    def save_override(
+        self,
+        selector: str,
+        call_site: str,
+        healed_selector: str,
+        selector_method: Optional[str] = None,
+        confidence: Optional[float] = None,
+        test_file: Optional[str] = None,
+        page: Optional[str] = None,
+    ):
+        """
+        Store the healed selector of a selector used at a call site (replacing a previous one)
+
+        Args:
+            selector: Original selector, as written in the test
+            call_site: Statement using the selector (see selector_override.call_site)
+            healed_selector: Selector to use instead
+            selector_method: Playwright method building the healed locator (get_by_role, locator...)
+            confidence: Confidence of the heal
+            test_file: Test file holding the call site
+            page: Page the healed selector was verified on (URL without query string)
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO selector_overrides "
+                "(selector, call_site, healed_selector, selector_method, confidence, test_file, page, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (selector, call_site, healed_selector, selector_method, confidence, test_file, page,
+                 datetime.now().isoformat()),
+            )
+
+    def delete_override(self, selector: str, call_site: str) -> bool:
+        """Delete a selector override; returns True if it existed"""
+        with self._lock, self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM selector_overrides WHERE selector = ? AND call_site = ?", (selector, call_site)
+            ).rowcount
+        return deleted > 0
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a row to a heal record"""
+        record = dict(row)
+        record["usage"] = json.loads(record["usage"]) if record.get("usage") else {}
+        return record
@@ -0,0 +1,145 @@
+"""
+Hot Reload - Make patched test code effective without restarting the session
+"""
+import ast
+import importlib
+import inspect
+import sys
+import types
+from typing import Any, Callable, Optional
+
+from .logger import get_logger
+from .source_index import SourceIndex
+
+logger = get_logger(__name__)
+
+# Function code flags (class bodies have neither)
+_FUNCTION_FLAGS = inspect.CO_OPTIMIZED | inspect.CO_NEWLOCALS
+
+
+def find_code(code: types.CodeType, qualname: str, prefix: str = "") -> Optional[types.CodeType]:
+    """
+    Find the code object of a function by qualified name in compiled module code
+
+    Nested closures are found too (`outer.<locals>.inner`), since their code
+    is a constant of the enclosing function's code.
+    """
+    for const in code.co_consts:
+        if not isinstance(const, types.CodeType):
+            continue
+        is_function = bool(const.co_flags & _FUNCTION_FLAGS)
+        name = getattr(const, "co_qualname", f"{prefix}{const.co_name}")
+        if name == qualname and is_function:
+            return const
+        child_prefix = f"{name}.<locals>." if is_function else f"{name}."
+        if qualname.startswith(child_prefix):
+            found = find_code(const, qualname, child_prefix)
+            if found is not None:
+                return found
+    return None
+
+
+def _compile_module(source: str, filename: str, module: Optional[types.ModuleType]) -> types.CodeType:
+    """Compile module source, with pytest assertion rewriting when pytest imported the module that way"""
+    tree = ast.parse(source, filename)
+    if module is not None and "@py_builtins" in vars(module):
+        try:
+            from _pytest.assertion.rewrite import rewrite_asserts
+
+            rewrite_asserts(tree, source.encode("utf-8"), filename)
+        except Exception as e:
+            logger.debug(f"Could not rewrite asserts of {filename}: {e}")
+    return compile(tree, filename, "exec", dont_inherit=True)
+
+
+def _resolve(module: types.ModuleType, qualname: str) -> Any:
+    """Get a module-level object by qualified name (no `<locals>`)"""
+    obj: Any = module
+    for part in qualname.split("."):
+        obj = getattr(obj, part, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def _reload_module(test_func: Callable, module: types.ModuleType) -> Callable:
+    """Re-import a module and return the reloaded test function"""
+    qualname = test_func.__qualname__
+    if "<locals>" in qualname or sys.modules.get(module.__name__) is not module:
+        logger.warning(f"Cannot reload {qualname}: not reachable from module {module.__name__}")
+        return test_func
+
+    reloaded = _resolve(importlib.reload(module), qualname)
+    if not callable(reloaded):
+        logger.warning(f"{qualname} not found after reloading {module.__name__}")
+        return test_func
+    logger.info(f"Module {module.__name__} reloaded for {qualname}")
+    return reloaded
+
+
+def reload_patched_code(test_func: Callable, line_number: int) -> Callable:
+    """
+    Make a patch applied to a test file effective for the next call of a test
+
+    Only the function holding the patched statement is recompiled: its code
+    object is swapped in place, so every reference to it (pytest items,
+    class attributes, decorators) runs the patched code and module state is
+    untouched. A patch inside the test function or one of its nested
+    closures swaps the test's code; a patch in another function of the file
+    (helper, page object method) swaps that function's code. Patches at
+    module level re-import the module.
+
+    Args:
+        test_func: Test function that was healed
+        line_number: Line of the patched statement in the test file
+
+    Returns:
+        The function to call on retry
+    """
+    original = inspect.unwrap(test_func)
+    module = inspect.getmodule(original)
+    try:
+        filename = inspect.getsourcefile(original) or inspect.getfile(original)
+    except TypeError:
+        logger.warning(f"Cannot reload {test_func.__qualname__}: no source file")
+        return test_func
+
+    SourceIndex.invalidate(filename)
+    index = SourceIndex.for_file(filename)
+    if index is None:
+        return test_func
+
+    try:
+        module_code = _compile_module("".join(index.lines), filename, module)
+    except SyntaxError as e:
+        logger.error(f"Patched file {filename} does not compile: {e}")
+        return test_func
+
+    statement = index.statement_at(line_number)
+    test_qualname = original.__qualname__
+    scope = statement.scope if statement else test_qualname
+
+    if scope is None:
+        return _reload_module(test_func, module) if module else test_func
+
+    if scope == test_qualname or scope.startswith(f"{test_qualname}.<locals>."):
+        target, target_qualname = original, test_qualname
+    else:
+        # Patch in another function of the file: swap the outermost function holding it
+        target_qualname = scope.split(".<locals>.")[0]
+        target = inspect.unwrap(_resolve(module, target_qualname)) if module else None
+        if not isinstance(target, types.FunctionType):
+            return _reload_module(test_func, module) if module else test_func
+
+    new_code = find_code(module_code, target_qualname)
+    if new_code is None:
+        logger.warning(f"{target_qualname} not found in patched {filename}")
+        return test_func
+    if new_code.co_freevars != target.__code__.co_freevars:
+        # The patch changed the variables captured by a closure: the code cannot be swapped
+        logger.warning(f"Captured variables of {target_qualname} changed, reloading module instead")
+        return _reload_module(test_func, module) if module else test_func
+
+    target.__code__ = new_code
+    logger.info(f"Hot-reloaded {target_qualname} from {filename}")
+    return test_func
@@ -1,52 +1,174 @@
 """
 Logging configuration for Auto-Heal Framework
 """
+import json
+import os
 import sys
-from pathlib import Path
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Tuple
+
 from loguru import logger
-import structlog
+
+from .config import config
+
+# Test context added to every message (see log_context), with its values outside of a test
+CONTEXT_DEFAULTS = {"test_id": "-", "retry": 0, "worker": os.getenv("PYTEST_XDIST_WORKER", "main")}
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("auto_heal_log_context", default={})
+
+
+@contextmanager
+def log_context(**values: Any) -> Iterator[None]:
+    """
+    Add values (test_id, retry...) to the messages logged in a block
+
+    The values live in a context variable, so concurrent tests (asyncio
+    tasks, threads) each log their own.
+    """
+    token = _context.set({**_context.get(), **values})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def set_log_context(**values: Any):
+    """Update the values of the enclosing log_context block (e.g. the retry number)"""
+    _context.set({**_context.get(), **values})
+
+
+class _DebugRateLimiter:
+    """
+    Keeps at most `rate` DEBUG messages per second from each logging call site
+
+    The first message kept after a drop tells how many were dropped.
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._windows: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]):
+        """Patcher: add the test context, mark the messages over the rate as dropped"""
+        extra = record["extra"]
+        for key, value in {**CONTEXT_DEFAULTS, **_context.get()}.items():
+            extra.setdefault(key, value)
+        if self.rate <= 0 or record["level"].no > 10:
+            return
+
+        site = (record["name"] or "", record["line"])
+        now = int(time.monotonic())
+        with self._lock:
+            # Second of the window, messages of the site in it, messages dropped
+            window = self._windows.setdefault(site, [now, 0, 0])
+            if window[0] != now:
+                suppressed = window[2]
+                window[:] = [now, 0, 0]
+                if suppressed:
+                    record["message"] += f" ({suppressed} similar message(s) dropped)"
+            window[1] += 1
+            if window[1] > self.rate:
+                window[2] += 1
+                extra["_dropped"] = True
+
+
+def _kept(record: Dict[str, Any]) -> bool:
+    return not record["extra"].get("_dropped")
+
+
+def _json_format(record: Dict[str, Any]) -> str:
+    """Compact JSON line of a message"""
+    entry = {
+        "time": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "message": record["message"],
+        "test_id": record["extra"]["test_id"],
+        "retry": record["extra"]["retry"],
+        "worker": record["extra"]["worker"],
+    }
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"])).rstrip()
+    record["extra"]["_json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
 
 # Configure loguru
 logger.remove()  # Remove default handler
+logger.configure(patcher=_DebugRateLimiter(config.logging.debug_rate))
 
 # Add console handler with colors
 logger.add(
     sys.stdout,
     colorize=True,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level=config.logging.level,
+    filter=_kept,
 )
 
-# Add file handler
-log_file = Path("logs/auto-heal.log")
-log_file.parent.mkdir(parents=True, exist_ok=True)
+# Add file handler (the file and its directory are created on the first message)
+log_file = config.logging.file
 
 logger.add(
     log_file,
     rotation="10 MB",
     retention="7 days",
     compression="zip",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="DEBUG"
+    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[worker]} {extra[test_id]}#{extra[retry]} | "
+           "{name}:{function}:{line} - {message}",
+    level=config.logging.file_level,
+    filter=_kept,
+    enqueue=config.logging.enqueue,
+    delay=True
 )
 
-# Configure structlog for structured logging
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    cache_logger_on_first_use=True,
-)
+if config.logging.json_file:
+    logger.add(
+        config.logging.json_file,
+        rotation="10 MB",
+        retention="7 days",
+        compression="zip",
+        format=_json_format,
+        level=config.logging.file_level,
+        filter=_kept,
+        enqueue=config.logging.enqueue,
+        delay=True
+    )
+
+_structlog_configured = False
+
+
+def _configure_structlog():
+    """Configure structlog for structured logging (on first use)"""
+    global _structlog_configured
+    import structlog
+
+    if _structlog_configured:
+        return structlog
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            structlog.processors.UnicodeDecoder(),
+            structlog.processors.JSONRenderer()
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        cache_logger_on_first_use=True,
+    )
+    _structlog_configured = True
+    return structlog
 
 def get_logger(name: str):
     """Get a logger instance"""
@@ -54,5 +176,4 @@ def get_logger(name: str):
 
 def get_struct_logger(name: str):
     """Get a structured logger instance"""
-    return structlog.get_logger(name)
-
+    return _configure_structlog().get_logger(name)
@@ -1,27 +1,53 @@
 """
 Patch Manager - Handles creation and application of test patches
 """
-import shutil
-import re
-from typing import Dict, Any, Optional
+import textwrap
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
-from datetime import datetime
 import git
 from git.exc import GitCommandError
+from pydantic import BaseModel, Field
 
+from .backup_store import BackupStore
 from .config import config
+from .event_bus import PATCH_APPLIED, event_bus
+from .file_lock import FileLock, atomic_write, file_hash
+from .git_worker import GitCommitWorker
+from .heal_ledger import OUTCOME_CONFLICT, OUTCOME_NOT_FOUND, HealLedger
 from .logger import get_logger
+from .source_index import SourceIndex, normalize_code, split_lines
 
 logger = get_logger(__name__)
 
 
+class PatchRequest(BaseModel):
+    """A patch waiting to be applied to a test file"""
+    test_file: Path = Field(description="Test file to patch")
+    line_number: int = Field(description="Line number where the error occurred")
+    original_code: str = Field(description="Original code that failed")
+    patch_code: str = Field(description="New code to apply")
+    patch_info: Dict[str, Any] = Field(default_factory=dict, description="Full patch information from LLM")
+    expected_hash: Optional[str] = Field(default=None, description="File hash when the failure was captured")
+
+
 class PatchManager:
     """Manages test patches and Git integration"""
 
     def __init__(self):
+        config.ensure_directories()
         self.patch_dir = config.auto_heal.patch_dir
         self.backup_dir = config.auto_heal.backup_dir
+        self.ledger = HealLedger()
+        self.backups = BackupStore(self.backup_dir)
         self.repo = self._init_repo()
+        self.git_worker: Optional[GitCommitWorker] = None
+        if self.repo and config.auto_heal.async_commit:
+            self.git_worker = GitCommitWorker(
+                self._commit_heals_now,
+                coalesce_window=config.auto_heal.commit_coalesce_window,
+            )
 
     def _init_repo(self) -> Optional[git.Repo]:
         """Initialize Git repository"""
@@ -33,16 +59,23 @@ class PatchManager:
             logger.warning("Not a git repository. Auto-commit disabled.")
             return None
 
-    def create_backup(self, file_path: Path) -> Path:
-        """Create backup of test file before patching"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{file_path.stem}_{timestamp}{file_path.suffix}"
-        backup_path = self.backup_dir / backup_name
+    def create_backup(self, file_path: Path, content: Optional[str] = None) -> str:
+        """
+        Create backup of test file before patching
+
+        The content is stored once in the content-addressed backup store, so
+        backing up an unchanged file again costs nothing.
 
-        shutil.copy2(file_path, backup_path)
-        logger.info(f"Backup created: {backup_path}")
+        Args:
+            file_path: Path to the file to backup
+            content: Content to back up (already read under lock), read from disk if None
 
-        return backup_path
+        Returns:
+            Backup store hash of the content
+        """
+        digest = self.backups.put(Path(file_path).read_bytes() if content is None else content)
+        logger.info(f"Backup created: {file_path.name} @ {digest[:12]}")
+        return digest
 
     def apply_patch(
         self,
@@ -50,73 +83,200 @@ class PatchManager:
         line_number: int,
         original_code: str,
         patch_code: str,
-        patch_info: Dict[str, Any]
+        patch_info: Dict[str, Any],
+        expected_hash: Optional[str] = None
     ) -> bool:
-        """Apply patch to test file"""
+        """
+        Apply patch to test file
+
+        The file is locked for the whole read-modify-write cycle and replaced
+        atomically. When its content changed since the failure was captured
+        (hash mismatch), the patch is rebased onto the current content.
+
+        Args:
+            test_file: Path to the test file
+            line_number: Line number where the error occurred
+            original_code: Original code that failed
+            patch_code: New code to apply
+            patch_info: Full patch information from LLM
+            expected_hash: SHA-256 of the file when the failure was captured
+
+        Returns:
+            True if patch applied successfully, False otherwise; the line of the
+            patched statement in the new content is set in patch_info["patched_line"]
+        """
+        request = PatchRequest(
+            test_file=test_file,
+            line_number=line_number,
+            original_code=original_code,
+            patch_code=patch_code,
+            patch_info=patch_info,
+            expected_hash=expected_hash,
+        )
+        return self.apply_file_patches(test_file, [request])[0]
+
+    def apply_file_patches(self, test_file: Path, patches: List[PatchRequest]) -> List[bool]:
+        """
+        Apply several patches to one test file with a single read and write
+
+        Every patch is located against the content read under lock, then all
+        edits are applied together, one backup is taken and the file is
+        replaced atomically once.
+
+        Args:
+            test_file: Path to the test file
+            patches: Patches targeting this file
+
+        Returns:
+            One success flag per patch, in the same order (the patch_info of each
+            applied patch gets the new line of its statement in "patched_line")
+        """
+        results = [False] * len(patches)
+        start = time.perf_counter()
         try:
-            backup_path = self.create_backup(test_file)
-
-            with open(test_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            if line_number > 0 and line_number <= len(lines):
-                if self._normalize_code(lines[line_number - 1]) == self._normalize_code(original_code):
-                    lines[line_number - 1] = patch_code if patch_code.endswith('\n') else patch_code + '\n'
-                    logger.info(f"Exact match found at line {line_number}")
-                else:
-                    found = False
-                    for i, line in enumerate(lines):
-                        if self._normalize_code(line) == self._normalize_code(original_code):
-                            lines[i] = patch_code if patch_code.endswith('\n') else patch_code + '\n'
-                            logger.info(f"Fuzzy match found at line {i + 1}")
-                            found = True
-                            break
-
-                    if not found:
-                        logger.error(f"Could not find matching line in {test_file}")
-                        return False
-            else:
-                logger.error(f"Invalid line number: {line_number}")
-                return False
-
-            with open(test_file, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
-
-            self._save_patch_metadata(test_file, patch_info, backup_path)
-            logger.success(f"Patch applied to {test_file}")
-            return True
+            with FileLock(test_file, timeout=config.auto_heal.lock_timeout):
+                with open(test_file, 'r', encoding='utf-8', newline='') as f:
+                    content = f.read()
+                index = SourceIndex.for_content(test_file, content)
+                lines = list(index.lines)
+
+                # First line index -> (last line index, patch position)
+                edits: Dict[int, Tuple[int, int]] = {}
+                for position, patch in enumerate(patches):
+                    if patch.expected_hash and patch.expected_hash != index.content_hash:
+                        logger.warning(f"{test_file} changed since the failure was captured, rebasing patch")
+
+                    span = self._find_span(index, patch.line_number, patch.original_code)
+                    if span is None:
+                        present = self._find_span(index, patch.line_number, patch.patch_code)
+                        if present is not None:
+                            logger.info(f"Patch already present in {test_file} (applied concurrently)")
+                            patch.patch_info["patched_line"] = present[0] + 1
+                            results[position] = True
+                        else:
+                            logger.error(f"Could not find matching line in {test_file}")
+                            self.ledger.record(test_file, patch.patch_info, outcome=OUTCOME_NOT_FOUND)
+                        continue
+
+                    overlapping = [
+                        first for first, (last, _) in edits.items() if first <= span[1] and span[0] <= last
+                    ]
+                    if overlapping:
+                        first = patches[edits[overlapping[0]][1]]
+                        same = normalize_code(first.patch_code) == normalize_code(patch.patch_code)
+                        results[position] = same
+                        if not same:
+                            logger.error(
+                                f"Conflicting patches for line {span[0] + 1} of {test_file}, keeping the first"
+                            )
+                            self.ledger.record(test_file, patch.patch_info, outcome=OUTCOME_CONFLICT)
+                        continue
+
+                    edits[span[0]] = (span[1], position)
+
+                if not edits:
+                    return results
+
+                before_hash = self.create_backup(test_file, content)
+                # Bottom-up so earlier line indexes stay valid when line counts change
+                sizes: Dict[int, int] = {}
+                for first in sorted(edits, reverse=True):
+                    last, position = edits[first]
+                    replacement = self._format_patch(lines[first], patches[position].patch_code)
+                    lines[first:last + 1] = [replacement]
+                    sizes[first] = len(split_lines(replacement))
+                # Line of each patched statement in the new content (edits above it may add or remove lines)
+                shift = 0
+                for first in sorted(edits):
+                    last, position = edits[first]
+                    patches[position].patch_info["patched_line"] = first + shift + 1
+                    shift += sizes[first] - (last - first + 1)
+                patched = "".join(lines)
+                after_hash = self.backups.put(patched)
+                atomic_write(test_file, patched)
+                SourceIndex.invalidate(test_file)
+
+            # Save patch metadata
+            seconds = time.perf_counter() - start
+            for _, position in edits.values():
+                patch_info = patches[position].patch_info
+                patch_id = self._save_patch_metadata(test_file, patch_info, before_hash, after_hash)
+                results[position] = True
+                event_bus.publish(
+                    PATCH_APPLIED, patch_id=patch_id, test_file=str(test_file),
+                    line_number=patches[position].line_number, selector=patch_info.get("selector"),
+                    confidence=patch_info.get("confidence"), seconds=seconds,
+                )
+
+            logger.success(f"{len(edits)} patch(es) applied to {test_file}")
+            return results
 
         except Exception as e:
             logger.error(f"Failed to apply patch: {e}")
-            return False
+            return results
+
+    def begin_session(self, commit_mode: Optional[str] = None) -> "PatchSession":
+        """Start a patch session that batches patches per file"""
+        return PatchSession(self, commit_mode=commit_mode)
+
+    def _find_span(self, index: SourceIndex, line_number: int, code: str) -> Optional[Tuple[int, int]]:
+        """
+        Find the lines (0-based, inclusive) to replace with a patch
+
+        The whole statement matching the code is replaced, preferring the one
+        at the reported line, then the closest one so a shifted file (rebase)
+        still patches the right occurrence. Code matching a single physical
+        line of a multi-line statement replaces only that line.
+        """
+        statement = index.find(code, line_number)
+        if statement is not None:
+            logger.info(f"Statement match found at lines {statement.start_line}-{statement.end_line}")
+            return statement.start_line - 1, statement.end_line - 1
 
-    def _normalize_code(self, code: str) -> str:
-        """Normalize code for comparison"""
-        return ' '.join(code.split())
-
-    def _save_patch_metadata(self, test_file: Path, patch_info: Dict[str, Any], backup_path: Path):
-        """Save patch metadata for tracking"""
-        timestamp = datetime.now().isoformat()
-        metadata = {
-            "timestamp": timestamp,
-            "test_file": str(test_file),
-            "backup_file": str(backup_path),
-            "selector": patch_info.get("selector"),
-            "selector_method": patch_info.get("selector_method"),
-            "confidence": patch_info.get("confidence"),
-            "explanation": patch_info.get("explanation"),
-            "patch_code": patch_info.get("patch_code")
-        }
-
-        import json
-        metadata_file = self.patch_dir / f"patch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
-
-        logger.info(f"Patch metadata saved: {metadata_file}")
+        number = index.find_line(code, line_number)
+        if number is not None:
+            logger.info(f"Line match found at line {number}")
+            return number - 1, number - 1
+        return None
+
+    def _format_patch(self, original_line: str, patch_code: str) -> str:
+        """Indent the patch like the first replaced line and keep its line ending"""
+        stripped = original_line.rstrip('\r\n')
+        ending = original_line[len(stripped):] or '\n'
+        indent = stripped[:len(stripped) - len(stripped.lstrip())]
+        patch_lines = textwrap.dedent(patch_code.strip('\r\n')).splitlines()
+        return "".join(f"{indent}{line}{ending}" if line.strip() else ending for line in patch_lines)
+
+    def _save_patch_metadata(
+        self, test_file: Path, patch_info: Dict[str, Any], before_hash: str, after_hash: str
+    ) -> str:
+        """Record the applied patch in the heal ledger and return its patch id"""
+        patch_id = self.ledger.record(test_file, patch_info, before_hash, after_hash)
+        logger.info(f"Patch {patch_id} recorded in {self.ledger.db_path}")
+        return patch_id
 
     def commit_changes(self, test_file: Path, patch_info: Dict[str, Any]) -> bool:
-        """Commit changes to Git"""
+        """
+        Commit changes to Git
+
+        With ASYNC_COMMIT enabled the commit is handed to the background git
+        worker and this returns as soon as it is queued.
+        """
+        return self.commit_heals([(test_file, patch_info)])
+
+    def commit_heals(self, heals: List[Tuple[Path, Dict[str, Any]]]) -> bool:
+        """
+        Commit several healed files in a single commit
+
+        Args:
+            heals: (test file, patch info) pairs applied during the session
+
+        Returns:
+            True if committed (or queued for commit) successfully, False otherwise
+        """
+        if not heals:
+            return False
+
         if not config.auto_heal.auto_commit:
             logger.info("Auto-commit disabled")
             return False
@@ -125,17 +285,52 @@ class PatchManager:
             logger.warning("No Git repository available")
             return False
 
+        if self.git_worker:
+            self.git_worker.submit(heals)
+            return True
+
         try:
-            self.repo.index.add([str(test_file)])
-            commit_msg = self._create_commit_message(test_file, patch_info)
-            self.repo.index.commit(commit_msg)
-            logger.success(f"Changes committed: {commit_msg[:50]}...")
+            self._commit_heals_now(heals)
             return True
 
         except GitCommandError as e:
             logger.error(f"Git commit failed: {e}")
             return False
 
+    def _commit_heals_now(self, heals: List[Tuple[Path, Dict[str, Any]]]):
+        """Stage and commit heals synchronously (raises GitCommandError on failure)"""
+        files = list(OrderedDict.fromkeys(str(test_file) for test_file, _ in heals))
+        self.repo.index.add(files)
+        commit_msg = self._create_session_commit_message(heals)
+        self.repo.index.commit(commit_msg)
+        logger.success(f"Changes committed: {len(heals)} heal(s) in {len(files)} file(s)")
+
+    def flush_commits(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the background git worker to commit every queued heal"""
+        if not self.git_worker:
+            return True
+        return self.git_worker.flush(timeout)
+
+    def _create_session_commit_message(self, heals: List[Tuple[Path, Dict[str, Any]]]) -> str:
+        """Create a commit message listing every heal of a session"""
+        if len(heals) == 1:
+            return self._create_commit_message(*heals[0])
+
+        files = list(OrderedDict.fromkeys(test_file.name for test_file, _ in heals))
+        title = files[0] if len(files) == 1 else f"{len(files)} test files"
+        entries = "\n".join(
+            f"- {test_file.name}: {patch_info.get('selector', 'unknown')} "
+            f"({patch_info.get('selector_method', 'unknown')}, confidence {patch_info.get('confidence', 0.0):.2f})"
+            for test_file, patch_info in heals
+        )
+
+        return f"""[Auto-Heal] Fix {len(heals)} selectors in {title}
+
+{entries}
+
+Auto-generated by Playwright Auto-Heal Framework
+"""
+
     def _create_commit_message(self, test_file: Path, patch_info: Dict[str, Any]) -> str:
         """Create descriptive commit message"""
         selector = patch_info.get("selector", "unknown")
@@ -155,12 +350,114 @@ Auto-generated by Playwright Auto-Heal Framework
 """
 
     def restore_backup(self, backup_path: Path, original_path: Path) -> bool:
-        """Restore file from backup"""
+        """Restore file from a legacy backup file"""
         try:
-            shutil.copy2(backup_path, original_path)
+            with FileLock(original_path, timeout=config.auto_heal.lock_timeout):
+                atomic_write(original_path, backup_path.read_bytes())
             logger.success(f"Restored {original_path} from backup")
             return True
         except Exception as e:
             logger.error(f"Failed to restore backup: {e}")
             return False
 
+    def restore_patch(self, patch_id: str, force: bool = False) -> bool:
+        """
+        Undo a heal by restoring the test file content from before the patch
+
+        Args:
+            patch_id: Patch identifier from the heal ledger
+            force: Restore even if the file changed after the patch
+
+        Returns:
+            True if the file was restored, False otherwise
+        """
+        heal = self.ledger.get(patch_id)
+        if heal is None:
+            logger.error(f"Unknown patch id: {patch_id}")
+            return False
+
+        test_file = Path(heal["test_file"])
+        if not heal.get("before_hash"):
+            if heal.get("backup_file"):
+                return self.restore_backup(Path(heal["backup_file"]), test_file)
+            logger.error(f"Patch {patch_id} has no backup")
+            return False
+
+        content = self.backups.get(heal["before_hash"])
+        if content is None:
+            return False
+
+        try:
+            with FileLock(test_file, timeout=config.auto_heal.lock_timeout):
+                current = file_hash(test_file)
+                if current != heal["after_hash"] and not force:
+                    logger.error(f"{test_file} changed since patch {patch_id}, use force to restore anyway")
+                    return False
+                atomic_write(test_file, content)
+            logger.success(f"Restored {test_file} to its state before patch {patch_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to restore patch {patch_id}: {e}")
+            return False
+
+
+class PatchSession:
+    """
+    Queues patches during a run and applies them grouped by file
+
+    Each file gets one read, one combined edit and one write; the session
+    ends with a single commit (or one per file) listing every heal.
+
+    Usage:
+        with patch_manager.begin_session() as session:
+            session.queue(PatchRequest(...))
+    """
+
+    def __init__(self, manager: PatchManager, commit_mode: Optional[str] = None):
+        self.manager = manager
+        self.commit_mode = commit_mode or config.auto_heal.patch_commit_mode
+        self.pending: "OrderedDict[Path, List[PatchRequest]]" = OrderedDict()
+
+    def queue(self, patch: PatchRequest):
+        """Queue a patch until the session is flushed"""
+        self.pending.setdefault(Path(patch.test_file).resolve(), []).append(patch)
+        logger.debug(f"Patch queued for {patch.test_file} ({len(self)} pending)")
+
+    def __len__(self) -> int:
+        return sum(len(patches) for patches in self.pending.values())
+
+    def flush(self) -> Dict[str, Any]:
+        """
+        Apply every queued patch and commit the result
+
+        Returns:
+            Dictionary with applied and failed patches
+        """
+        applied: List[PatchRequest] = []
+        failed: List[PatchRequest] = []
+
+        for test_file, patches in self.pending.items():
+            results = self.manager.apply_file_patches(test_file, patches)
+            for patch, success in zip(patches, results):
+                (applied if success else failed).append(patch)
+
+            if self.commit_mode == "per_file":
+                self.manager.commit_heals(
+                    [(test_file, patch.patch_info) for patch, success in zip(patches, results) if success]
+                )
+
+        if self.commit_mode == "single":
+            self.manager.commit_heals([(Path(patch.test_file), patch.patch_info) for patch in applied])
+
+        logger.info(
+            f"Patch session flushed: {len(applied)} applied, {len(failed)} failed "
+            f"across {len(self.pending)} file(s)"
+        )
+        self.pending.clear()
+        return {"applied": applied, "failed": failed}
+
+    def __enter__(self) -> "PatchSession":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
@@ -0,0 +1,248 @@
+"""
+Screenshots - Failure screenshot policies and background storage
+"""
+import asyncio
+import io
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import Page
+
+from .artifact_store import KIND_SCREENSHOT, ArtifactStore
+from .config import config
+from .file_lock import atomic_write, content_hash
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Screenshot modes
+MODE_REGION = "region"
+MODE_VIEWPORT = "viewport"
+MODE_FULL_PAGE = "full_page"
+MODE_OFF = "off"
+
+# Selector separators: Playwright chains (>>) and CSS combinators
+_CHAIN_RE = re.compile(r"\s*>>\s*")
+_COMBINATOR_RE = re.compile(r"\s*[>+~]\s*|\s+")
+
+
+@lru_cache(maxsize=1)
+def _load_pillow():
+    """Pillow's Image module, None if Pillow is not installed"""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.debug("Pillow not installed, screenshots deduplicated by exact content only")
+        return None
+    return Image
+
+
+def ancestor_selectors(selector: Optional[str]) -> List[str]:
+    """
+    Selector followed by its ancestor selectors, deepest first
+
+    `#login .form button.submit` gives `#login .form button.submit`,
+    `#login .form` and `#login`. Playwright chains (`a >> b`) are shortened
+    one step at a time before their CSS parts.
+    """
+    if not selector or selector == "unknown":
+        return []
+
+    candidates = []
+    steps = _CHAIN_RE.split(selector.strip())
+    for count in range(len(steps), 0, -1):
+        chain = " >> ".join(steps[:count - 1])
+        last = steps[count - 1]
+
+        # Only plain CSS can be shortened at combinators (quotes and brackets are kept whole)
+        parts = [last]
+        if not re.search(r"[\"'()\[\]=]", last):
+            separators = list(_COMBINATOR_RE.finditer(last))
+            parts = [last[:match.start()] for match in reversed(separators)]
+            parts.insert(0, last)
+
+        for part in parts:
+            candidate = f"{chain} >> {part}" if chain else part
+            if part and candidate not in candidates:
+                candidates.append(candidate)
+    return candidates
+
+
+def perceptual_hash(data: bytes) -> Optional[int]:
+    """64-bit difference hash (dHash) of an image, None without Pillow"""
+    Image = _load_pillow()
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            pixels = list(image.convert("L").resize((9, 8)).getdata())
+    except Exception as e:
+        logger.debug(f"Could not compute perceptual hash: {e}")
+        return None
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+class ScreenshotRecorder:
+    """
+    Captures failure screenshots according to the configured policy
+
+    The browser captures a JPEG (or PNG) of the region around the element
+    that failed, falling back to the viewport. Hashing, optional WebP
+    re-encoding and the disk write run in a worker thread, and images
+    identical (or perceptually identical) to one already taken for the
+    same test are not written again.
+    """
+
+    def __init__(self, artifacts: Optional[ArtifactStore] = None):
+        self.settings = config.playwright
+        # Index of the stored screenshots, for their retention
+        self.artifacts = artifacts or ArtifactStore()
+        self._seen: Dict[str, List[Tuple[Optional[int], str, Path]]] = {}
+        self._seen_lock = threading.Lock()
+        self._tasks: List["asyncio.Task[Optional[Path]]"] = []
+
+    async def capture(
+        self,
+        page: Page,
+        test_name: str,
+        selector: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Optional["asyncio.Task[Optional[Path]]"]:
+        """
+        Take a failure screenshot and store it in the background
+
+        Args:
+            page: Page of the failed test
+            test_name: Test name (used in the file name)
+            selector: Failed selector, its last matched ancestor is captured
+            context: Failure context receiving the screenshot path once stored
+
+        Returns:
+            Task resolving to the stored file, None if nothing was captured
+        """
+        mode = self.settings.screenshot_mode
+        if mode == MODE_OFF:
+            return None
+
+        image_format = self.settings.screenshot_format
+        if image_format == "webp" and _load_pillow() is None:
+            logger.warning("WebP screenshots need Pillow, falling back to JPEG")
+            image_format = "jpeg"
+
+        # Playwright encodes PNG or JPEG only; WebP is re-encoded from PNG in the worker
+        options: Dict[str, Any] = {"type": "jpeg" if image_format == "jpeg" else "png"}
+        if image_format == "jpeg":
+            options["quality"] = self.settings.screenshot_quality
+        if mode == MODE_FULL_PAGE:
+            options["full_page"] = True
+        elif mode == MODE_REGION:
+            clip = await self._region_clip(page, selector)
+            if clip:
+                options["clip"] = clip
+
+        try:
+            data = await page.screenshot(**options)
+        except Exception as e:
+            logger.warning(f"Failed to take screenshot: {e}")
+            return None
+
+        task = asyncio.ensure_future(asyncio.to_thread(self._store, data, test_name, image_format))
+        if context is not None:
+            def record_path(done: "asyncio.Task[Optional[Path]]"):
+                if not done.cancelled() and done.exception() is None and done.result():
+                    context["screenshot"] = str(done.result())
+
+            task.add_done_callback(record_path)
+        self._tasks.append(task)
+        return task
+
+    async def drain(self) -> List[Path]:
+        """Wait for every pending screenshot write"""
+        tasks, self._tasks = self._tasks, []
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to store screenshot: {result}")
+        return list(dict.fromkeys(result for result in results if isinstance(result, Path)))
+
+    def screenshots_for(self, test_name: str) -> List[str]:
+        """Distinct screenshots stored for a test"""
+        with self._seen_lock:
+            return [str(path) for _, _, path in self._seen.get(test_name, [])]
+
+    async def _region_clip(self, page: Page, selector: Optional[str]) -> Optional[Dict[str, float]]:
+        """Clip rectangle around the deepest element matched by the selector or an ancestor"""
+        viewport = page.viewport_size
+        if not viewport:
+            return None
+
+        for candidate in ancestor_selectors(selector):
+            try:
+                locator = page.locator(candidate)
+                if not await locator.count():
+                    continue
+                box = await locator.first.bounding_box(timeout=500)
+            except Exception:
+                # Not a valid selector once shortened, or element detached
+                continue
+            if not box or box["width"] <= 0 or box["height"] <= 0:
+                continue
+
+            padding = self.settings.screenshot_padding
+            x = max(box["x"] - padding, 0)
+            y = max(box["y"] - padding, 0)
+            width = min(box["x"] + box["width"] + padding, viewport["width"]) - x
+            height = min(box["y"] + box["height"] + padding, viewport["height"]) - y
+            if width <= 0 or height <= 0:
+                # Element outside the viewport
+                continue
+
+            logger.debug(f"Screenshot clipped to '{candidate}' ({width:.0f}x{height:.0f})")
+            return {"x": x, "y": y, "width": width, "height": height}
+        return None
+
+    def _store(self, data: bytes, test_name: str, image_format: str) -> Optional[Path]:
+        """Deduplicate, encode and write a screenshot (runs in a worker thread)"""
+        digest = content_hash(data)
+        phash = perceptual_hash(data)
+
+        with self._seen_lock:
+            for seen_phash, seen_digest, seen_path in self._seen.get(test_name, []):
+                same = seen_digest == digest or (
+                    phash is not None and seen_phash is not None
+                    and bin(phash ^ seen_phash).count("1") <= self.settings.screenshot_dedupe_distance
+                )
+                if same:
+                    logger.debug(f"Screenshot identical to {seen_path.name}, not stored again")
+                    self.artifacts.touch(seen_path)
+                    return seen_path
+
+            safe_name = re.sub(r"[^\w.-]", "_", test_name)
+            extension = "jpg" if image_format == "jpeg" else image_format
+            path = self.settings.screenshot_dir / f"failure_{safe_name}_{digest[:12]}.{extension}"
+            self._seen.setdefault(test_name, []).append((phash, digest, path))
+
+        if image_format == "webp":
+            data = self._to_webp(data)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, data)
+        self.artifacts.register(KIND_SCREENSHOT, path, test_id=test_name)
+        logger.info(f"Screenshot saved: {path}")
+        return path
+
+    def _to_webp(self, data: bytes) -> bytes:
+        """Re-encode a PNG capture as WebP"""
+        Image = _load_pillow()
+        with Image.open(io.BytesIO(data)) as image:
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=self.settings.screenshot_quality)
+        return output.getvalue()
@@ -0,0 +1,385 @@
+"""
+Selector Index - Selector usages of the test files, to propagate a heal to every call site
+"""
+import ast
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field
+
+from .logger import get_logger
+from .patch_manager import PatchRequest
+from .selector_override import (
+    LOCATOR_CHAIN_PROPERTIES, LOCATOR_CHAINS, LOCATOR_FACTORIES, PAGE_ACTIONS, describe, site_key,
+)
+from .source_index import SourceIndex
+
+logger = get_logger(__name__)
+
+# Usage kinds
+# Locator built with locator() or get_by_*(), possibly refined (.first, .nth(), chained locator())
+KIND_LOCATOR = "locator"
+# Page action taking the selector as first argument (page.click("#submit"))
+KIND_ACTION = "action"
+
+# Test files (pytest default patterns)
+TEST_PATTERNS = ("test_*.py", "*_test.py")
+
+# Directories never searched for test files
+_SKIPPED_DIRS = frozenset({"__pycache__", "node_modules", "venv", "site-packages", "build", "dist"})
+
+# Node of a locator chain: locator call (locator(), get_by_*(), nth()...) or property (.first, .last)
+ChainNode = Union[ast.Call, ast.Attribute]
+
+
+class SelectorUsage(BaseModel):
+    """A selector written in a test file"""
+    selector: str = Field(description="Selector as looked up in the heal map (see selector_override.describe)")
+    kind: str = Field(description="locator or action")
+    method: str = Field(description="Locator factory or page action using the selector")
+    test_file: str = Field(description="Test file holding the usage")
+    line: int = Field(description="Line of the usage (1-based)")
+    call_site: str = Field(description="Call site key of the statement (see selector_override.call_site)")
+    quote: str = Field(default='"', description="Quote character of the selector literal")
+    literal_cols: Optional[Tuple[int, int]] = Field(
+        default=None, description="Columns of the selector literal, when replacing it alone heals the usage"
+    )
+    chain_cols: Optional[Tuple[int, int]] = Field(
+        default=None, description="Columns of the locator calls after the page (.locator(...).first...)"
+    )
+
+
+def quote_literal(text: str, quote: str = '"') -> str:
+    """Python string literal of a text with the given quote character"""
+    body = text.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r").replace(quote, f"\\{quote}")
+    return f"{quote}{body}{quote}"
+
+
+def rewrite_line(usage: SelectorUsage, line: str, healed: str, method: Optional[str] = None) -> Optional[str]:
+    """
+    Physical line of a usage with its selector replaced by a healed one
+
+    A plain healed selector replaces the literal when it is the whole
+    selector (locator("...") or page action); otherwise the locator calls
+    after the page are replaced by one call of the healed method.
+
+    Returns:
+        The rewritten line, None if the usage cannot be rewritten in place
+        (page action healed with a get_by_* method, multi-line call)
+    """
+    if (not method or method == "locator") and usage.literal_cols:
+        start, end = usage.literal_cols
+        return f"{line[:start]}{quote_literal(healed, usage.quote)}{line[end:]}"
+    if usage.chain_cols:
+        start, end = usage.chain_cols
+        return f"{line[:start]}.{method or 'locator'}({quote_literal(healed, usage.quote)}){line[end:]}"
+    return None
+
+
+def _is_page(node: ast.expr) -> bool:
+    """True if an expression names a page (page, self.page, admin_page...)"""
+    if isinstance(node, ast.Name):
+        return node.id.lower().endswith("page")
+    return isinstance(node, ast.Attribute) and node.attr.lower().endswith("page")
+
+
+def _literal_arguments(call: ast.Call) -> Optional[Tuple[tuple, Dict[str, Any]]]:
+    """Positional and keyword arguments of a call, None unless they are all literals"""
+    kwargs: Dict[str, Any] = {}
+    try:
+        args = tuple(ast.literal_eval(arg) for arg in call.args)
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                return None
+            kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+    except ValueError:
+        return None
+    return args, kwargs
+
+
+def _chain(node: ast.expr) -> Optional[Tuple[ast.expr, List[ChainNode], List[str]]]:
+    """
+    Locator chain of an expression: page.locator("form").get_by_role("button").first
+
+    Returns:
+        The page expression, the chain nodes (innermost first) and their
+        descriptions, None if the expression is not a locator chain built
+        from literals on a page
+    """
+    nodes: List[ChainNode] = []
+    parts: List[str] = []
+    while True:
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in LOCATOR_CHAINS:
+            arguments = _literal_arguments(node)
+            if arguments is None:
+                return None
+            parts.append(describe(node.func.attr, *arguments))
+            nodes.append(node)
+            node = node.func.value
+        elif isinstance(node, ast.Attribute) and node.attr in LOCATOR_CHAIN_PROPERTIES:
+            parts.append(node.attr)
+            nodes.append(node)
+            node = node.value
+        else:
+            break
+
+    if not nodes or not _is_page(node):
+        return None
+    innermost = nodes[-1]
+    if (
+        not isinstance(innermost, ast.Call)
+        or not isinstance(innermost.func, ast.Attribute)
+        or innermost.func.attr not in LOCATOR_FACTORIES
+    ):
+        return None
+    return node, nodes[::-1], parts[::-1]
+
+
+class SelectorIndex:
+    """
+    Selectors used in the test files, by file and call site
+
+    Files are parsed with `ast` and re-parsed only when their stat changes,
+    so refreshing the index of a large suite after an edit costs one parse
+    of the edited files. A usage is a locator chain built from literals on
+    a page (`page.locator("#id")`, `page.get_by_role("button", name="OK")`)
+    or a page action taking a literal selector (`page.click("#id")`); its
+    selector is the one the heal map looks up at run time.
+    """
+
+    def __init__(self, roots: Iterable[Path] = ()):
+        self.roots = [Path(root) for root in roots]
+        self._files: Dict[str, Tuple[Tuple[int, int, int], List[SelectorUsage]]] = {}
+        self._lock = threading.Lock()
+
+    def _test_files(self) -> Iterable[Path]:
+        for root in self.roots:
+            if root.is_file():
+                yield root
+                continue
+            for directory, subdirectories, files in os.walk(root):
+                subdirectories[:] = [
+                    name for name in subdirectories if not name.startswith(".") and name not in _SKIPPED_DIRS
+                ]
+                for name in files:
+                    if any(Path(name).match(pattern) for pattern in TEST_PATTERNS):
+                        yield Path(directory) / name
+
+    def refresh(self) -> int:
+        """
+        Index the test files under the roots that changed since the last refresh
+
+        Returns:
+            The number of files (re)indexed
+        """
+        seen = set()
+        indexed = 0
+        for path in self._test_files():
+            seen.add(str(path.resolve()))
+            indexed += self._index_file(path)
+        with self._lock:
+            for key in set(self._files) - seen:
+                del self._files[key]
+        logger.debug(f"Selector index refreshed: {indexed} file(s) indexed, {len(self._files)} in total")
+        return indexed
+
+    def file_usages(self, path: Path) -> List[SelectorUsage]:
+        """Selector usages of one file (indexed on demand)"""
+        self._index_file(Path(path))
+        with self._lock:
+            entry = self._files.get(str(Path(path).resolve()))
+        return list(entry[1]) if entry else []
+
+    def usages(self, selector: Optional[str] = None) -> List[SelectorUsage]:
+        """Indexed usages of a selector (every usage if None)"""
+        with self._lock:
+            entries = list(self._files.values())
+        return [
+            usage for _, usages in entries for usage in usages if selector is None or usage.selector == selector
+        ]
+
+    def _index_file(self, path: Path) -> bool:
+        """Parse a file if it changed since it was indexed; returns True if it was parsed"""
+        key = str(path.resolve())
+        try:
+            stat = os.stat(key)
+        except OSError:
+            with self._lock:
+                self._files.pop(key, None)
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            entry = self._files.get(key)
+        if entry and entry[0] == signature:
+            return False
+
+        source = SourceIndex.for_file(path)
+        usages: List[SelectorUsage] = []
+        if source is not None:
+            try:
+                tree = ast.parse("".join(source.lines))
+            except (SyntaxError, ValueError) as e:
+                logger.debug(f"Could not parse {path} ({e}), selector usages not indexed")
+            else:
+                usages = self._collect(key, tree, source.lines)
+        with self._lock:
+            self._files[key] = (signature, usages)
+        return True
+
+    def _collect(self, filename: str, tree: ast.AST, lines: List[str]) -> List[SelectorUsage]:
+        """Selector usages of a parsed file"""
+        def column(line_number: int, offset: int) -> int:
+            # AST offsets count UTF-8 bytes
+            return len(lines[line_number - 1].encode("utf-8")[:offset].decode("utf-8", errors="ignore"))
+
+        # End positions are always set on parsed trees (Optional for hand-built nodes)
+        def span(start: ast.expr, end: ast.expr) -> Optional[Tuple[int, int]]:
+            if start.end_lineno is None or start.end_lineno != end.end_lineno:
+                return None
+            return (
+                column(start.end_lineno, start.end_col_offset or 0),
+                column(start.end_lineno, end.end_col_offset or 0),
+            )
+
+        def usage_line(node: ast.expr, columns: Optional[Tuple[int, int]], columns_node: ast.expr) -> int:
+            # Line holding the columns to rewrite (calls may span several lines)
+            return (columns_node.end_lineno or node.lineno) if columns else node.lineno
+
+        def literal(node: ast.expr) -> Tuple[Optional[Tuple[int, int]], str]:
+            if node.end_col_offset is None or node.lineno != node.end_lineno:
+                return None, '"'
+            start, end = column(node.lineno, node.col_offset), column(node.lineno, node.end_col_offset)
+            text = lines[node.lineno - 1][start:end].lstrip("rRuUbB")
+            return (start, end), text[:1] or '"'
+
+        chains: Dict[int, Tuple[ChainNode, Tuple[ast.expr, List[ChainNode], List[str]]]] = {}
+        inner: Set[int] = set()
+        # Page action calls with their method, selector literal and selector
+        actions: List[Tuple[ast.Call, str, ast.Constant, str]] = []
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Call, ast.Attribute)):
+                chain = _chain(node)
+                if chain is not None:
+                    chains[id(node)] = (node, chain)
+                    inner.update(id(part) for part in chain[1][:-1])
+                    continue
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in PAGE_ACTIONS
+                and _is_page(node.func.value)
+                and node.args
+                and isinstance(node.args[0], ast.Constant)
+                and isinstance(node.args[0].value, str)
+            ):
+                actions.append((node, node.func.attr, node.args[0], node.args[0].value))
+
+        usages = []
+        for node, (page, nodes, parts) in chains.values():
+            if id(node) in inner:
+                continue
+            innermost = nodes[0]
+            # _chain only returns chains starting with a factory call (page.locator(), page.get_by_*())
+            if not isinstance(innermost, ast.Call) or not isinstance(innermost.func, ast.Attribute):
+                continue
+            method = innermost.func.attr
+            literal_cols, quote, chain_cols = None, '"', span(page, node)
+            if innermost.args and isinstance(innermost.args[0], ast.Constant):
+                quote = literal(innermost.args[0])[1]
+            plain = len(nodes) == 1 and method == "locator" and not innermost.keywords
+            if plain and len(innermost.args) == 1 and isinstance(innermost.args[0], ast.Constant):
+                literal_cols = literal(innermost.args[0])[0]
+                line = usage_line(node, literal_cols, innermost.args[0])
+                if chain_cols and node.end_lineno != line:
+                    chain_cols = None
+            else:
+                line = usage_line(node, chain_cols, node)
+            usages.append(SelectorUsage(
+                selector=" >> ".join(parts),
+                kind=KIND_LOCATOR,
+                method=method,
+                test_file=filename,
+                line=line,
+                call_site=site_key(filename, node.lineno),
+                quote=quote,
+                literal_cols=literal_cols,
+                chain_cols=chain_cols,
+            ))
+
+        for node, method, constant, selector in actions:
+            literal_cols, quote = literal(constant)
+            usages.append(SelectorUsage(
+                selector=selector,
+                kind=KIND_ACTION,
+                method=method,
+                test_file=filename,
+                line=usage_line(node, literal_cols, constant),
+                call_site=site_key(filename, node.lineno),
+                quote=quote,
+                literal_cols=literal_cols,
+            ))
+
+        usages.sort(key=lambda usage: (usage.line, usage.literal_cols or usage.chain_cols or (0, 0)))
+        return usages
+
+    def patches(
+        self, rewrites: Iterable[Tuple[SelectorUsage, Dict[str, Any]]]
+    ) -> Tuple[List[PatchRequest], List[SelectorUsage]]:
+        """
+        Source patches rewriting usages with healed selectors
+
+        Usages on the same line are rewritten together (right to left), so
+        each line gets a single patch.
+
+        Args:
+            rewrites: Usage and patch information of the heal to apply to it
+                (healed `selector` and `selector_method`)
+
+        Returns:
+            The patches, and the usages that cannot be rewritten in place
+        """
+        by_line: "OrderedDict[Tuple[str, int], List[Tuple[SelectorUsage, Dict[str, Any]]]]" = OrderedDict()
+        for usage, patch_info in rewrites:
+            by_line.setdefault((usage.test_file, usage.line), []).append((usage, patch_info))
+
+        patches: List[PatchRequest] = []
+        skipped: List[SelectorUsage] = []
+        for (test_file, line_number), entries in by_line.items():
+            source = SourceIndex.for_file(Path(test_file))
+            if source is None or line_number > len(source.lines):
+                skipped.extend(usage for usage, _ in entries)
+                continue
+
+            original = source.lines[line_number - 1].rstrip("\r\n")
+            line = original
+            applied = []
+            entries.sort(key=lambda entry: (entry[0].literal_cols or entry[0].chain_cols or (0, 0))[0], reverse=True)
+            for usage, patch_info in entries:
+                rewritten = rewrite_line(usage, line, patch_info["selector"], patch_info.get("selector_method"))
+                if rewritten is None:
+                    skipped.append(usage)
+                else:
+                    line = rewritten
+                    applied.append(patch_info)
+            if not applied:
+                continue
+
+            patch_info = {
+                **applied[-1],
+                "test_file": test_file,
+                "line_number": line_number,
+                "original_code": original.strip(),
+                "patch_code": line.strip(),
+            }
+            patches.append(PatchRequest(
+                test_file=Path(test_file),
+                line_number=line_number,
+                original_code=patch_info["original_code"],
+                patch_code=patch_info["patch_code"],
+                patch_info=patch_info,
+                expected_hash=source.content_hash,
+            ))
+        return patches, skipped
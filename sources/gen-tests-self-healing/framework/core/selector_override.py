@@ -0,0 +1,634 @@
+"""
+Selector Override - Heal selectors in place while a test runs
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import playwright
+from playwright.async_api import Error as PlaywrightError, Locator, Page
+
+from .action_timings import ActionTimings, page_key
+from .config import config
+from .heal_ledger import HealLedger
+from .logger import get_logger
+from .source_index import SourceIndex
+
+logger = get_logger(__name__)
+
+# Methods building a locator (on pages and locators)
+LOCATOR_FACTORIES = frozenset({
+    "locator", "get_by_role", "get_by_text", "get_by_label", "get_by_placeholder",
+    "get_by_alt_text", "get_by_title", "get_by_test_id",
+})
+
+# Locator methods refining a locator into another one
+LOCATOR_CHAINS = LOCATOR_FACTORIES | {"nth", "filter", "and_", "or_"}
+
+# Locator properties refining a locator into another one
+LOCATOR_CHAIN_PROPERTIES = frozenset({"first", "last"})
+
+# Locator methods waiting for the element and acting on it
+LOCATOR_ACTIONS = frozenset({
+    "click", "dblclick", "fill", "type", "press", "press_sequentially", "clear", "check", "uncheck",
+    "set_checked", "hover", "focus", "tap", "select_option", "select_text", "set_input_files",
+    "dispatch_event", "drag_to", "scroll_into_view_if_needed", "text_content", "inner_text",
+    "inner_html", "input_value", "get_attribute", "bounding_box", "screenshot", "wait_for",
+    "element_handle",
+})
+
+# Page methods taking a selector as first argument, with the same name on Locator
+PAGE_ACTIONS = frozenset({
+    "click", "dblclick", "fill", "type", "press", "check", "uncheck", "set_checked", "hover", "focus",
+    "tap", "select_option", "set_input_files", "dispatch_event", "text_content", "inner_text",
+    "inner_html", "input_value", "get_attribute", "wait_for_selector",
+})
+
+# Frames of Playwright (e.g. expect() reading the wrapped locator) are not call sites
+PLAYWRIGHT_DIR = os.path.dirname(os.path.abspath(playwright.__file__)) + os.sep
+
+# Files marking the project root call site keys are relative to (pytest's rootdir configuration files)
+ROOT_MARKERS = ("pytest.ini", ".pytest.ini", "pyproject.toml", "tox.ini", "setup.cfg")
+
+# Seconds without network activity after which a page is idle
+NETWORK_IDLE_SECONDS = 0.5
+
+# Interval between two matches of the fail-fast probe, in seconds
+PROBE_INTERVAL = 0.1
+
+# File and line of the test statement calling the proxy
+Location = Tuple[str, int]
+
+# Healer called with (original selector, call site, error, location), returning patch info or None
+Healer = Callable[[str, str, Exception, Optional[Location]], Awaitable[Optional[Dict[str, Any]]]]
+
+# Called with the patch info of a heal once its selector was validated and recorded
+HealCallback = Callable[[Dict[str, Any]], None]
+
+# Called with the error of a failed action, False if the selector must not be healed (neither reused nor healed)
+HealGate = Callable[[Exception], bool]
+
+
+def call_location() -> Optional[Location]:
+    """File and line of the statement calling the proxy (first frame outside this module and Playwright)"""
+    frame = sys._getframe(1)
+    while frame is not None and (
+        frame.f_code.co_filename == __file__ or frame.f_code.co_filename.startswith(PLAYWRIGHT_DIR)
+    ):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+def call_site() -> str:
+    """
+    Identify the test statement calling the proxy
+
+    The statement is identified by file, enclosing function and hash of
+    its normalized code rather than by line number, so edits elsewhere in
+    the file do not orphan the overrides recorded for it.
+    """
+    location = call_location()
+    return site_key(*location) if location else "unknown"
+
+
+@lru_cache(maxsize=256)
+def project_root(directory: str) -> str:
+    """Nearest directory holding a pytest configuration file (the directory itself if none)"""
+    path = Path(directory)
+    for candidate in (path, *path.parents):
+        if any((candidate / marker).is_file() for marker in ROOT_MARKERS):
+            return str(candidate)
+    return directory
+
+
+def site_key(filename: str, line_number: int) -> str:
+    """
+    Call site key of the statement spanning a line of a file (see call_site)
+
+    The file is relative to its project root, so the key is the same
+    whatever directory the tests are run from.
+    """
+    filename = os.path.abspath(filename)
+    path = Path(os.path.relpath(filename, project_root(os.path.dirname(filename)))).as_posix()
+
+    index = SourceIndex.for_file(filename)
+    statement = index.statement_at(line_number) if index else None
+    if statement is None:
+        return f"{path}:{line_number}"
+    return f"{path}::{statement.scope or '<module>'}::{statement.digest}"
+
+
+def describe(method: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Selector string identifying a locator factory call (plain selectors are kept as is)"""
+    if method == "locator" and len(args) == 1 and not kwargs and isinstance(args[0], str):
+        return args[0]
+    arguments = [repr(arg) for arg in args] + [f"{key}={value!r}" for key, value in kwargs.items()]
+    return f"{method}({', '.join(arguments)})"
+
+
+def build_locator(page: Page, selector: str, method: Optional[str] = None) -> Locator:
+    """Build the locator of a healed selector (`get_by_*` methods take the selector as first argument)"""
+    if method and method != "locator" and method in LOCATOR_FACTORIES:
+        return getattr(page, method)(selector)
+    return page.locator(selector)
+
+
+class HealMap:
+    """
+    Healed selectors by original selector and call site
+
+    Overrides are persisted in the heal ledger and loaded once in memory,
+    so looking a selector up costs a dictionary access. The page each heal
+    was verified on is kept too, so another call site failing on the same
+    selector and page can reuse the heal.
+    """
+
+    def __init__(self, ledger: Optional[HealLedger] = None):
+        self.ledger = ledger or HealLedger()
+        self._overrides: Optional[Dict[Tuple[str, str], Tuple[str, Optional[str]]]] = None
+        self._by_page: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[Tuple[str, str], Tuple[str, Optional[str]]]:
+        if self._overrides is None:
+            with self._lock:
+                if self._overrides is None:
+                    rows = sorted(self.ledger.overrides(), key=lambda row: row["timestamp"])
+                    for row in rows:
+                        if row.get("page"):
+                            self._by_page[(row["selector"], row["page"])] = row
+                    self._overrides = {
+                        (row["selector"], row["call_site"]): (row["healed_selector"], row["selector_method"])
+                        for row in rows
+                    }
+                    logger.debug(f"{len(rows)} selector override(s) loaded")
+        return self._overrides
+
+    def get(self, selector: str, site: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Healed (selector, method) for a selector used at a call site, None if never healed"""
+        return self._load().get((selector, site))
+
+    def for_page(self, selector: str, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest heal of a selector verified on a page, at any call site
+
+        Returns:
+            The override (healed_selector, selector_method, call_site, confidence...), None if never healed there
+        """
+        self._load()
+        return self._by_page.get((selector, page_key(url)))
+
+    def put(
+        self,
+        selector: str,
+        site: str,
+        healed_selector: str,
+        method: Optional[str],
+        patch_info: Dict[str, Any],
+        page: Optional[str] = None,
+    ):
+        """Record a healed selector, the method building its locator and the page it was verified on"""
+        self._load()[(selector, site)] = (healed_selector, method)
+        page = page_key(page) if page else None
+        if page:
+            self._by_page[(selector, page)] = {
+                "selector": selector, "call_site": site, "healed_selector": healed_selector,
+                "selector_method": method, "confidence": patch_info.get("confidence"), "page": page,
+            }
+        self.ledger.save_override(
+            selector, site, healed_selector, method, patch_info.get("confidence"), patch_info.get("test_file"), page
+        )
+        logger.info(f"Selector override recorded: '{selector}' -> '{healed_selector}' at {site}")
+
+    def discard(self, selector: str, site: str):
+        """Forget the override of a selector at a call site"""
+        if self._load().pop((selector, site), None) is not None:
+            self.ledger.delete_override(selector, site)
+            for key, row in list(self._by_page.items()):
+                if key[0] == selector and row["call_site"] == site:
+                    del self._by_page[key]
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+class HealingLocator:
+    """
+    Locator proxy substituting healed selectors and healing failed actions in place
+
+    Anything that is not an action or a refinement is delegated to the
+    resolved Playwright locator, so the proxy can be passed to `expect()`:
+    the assertion runs on the selector healed at the statement calling
+    `expect()`, or on the heal of the selector verified on the same page at
+    another statement. A failed assertion is not healed in place: it fails
+    the test, which is then healed by patching its source.
+    """
+
+    def __init__(self, page: "HealingPage", description: str, build: Callable[[str], Locator]):
+        self._page = page
+        self._description = description
+        self._build = build
+
+    @property
+    def __class__(self):
+        # isinstance(proxy, Locator) holds for Playwright's expect()
+        return Locator
+
+    def _resolve(self, site: str, page_heals: bool = False) -> Locator:
+        """
+        Playwright locator to use at a call site (healed one if recorded)
+
+        With page_heals, a selector never healed at the call site uses its
+        heal verified on the current page at another call site, if any.
+        """
+        override = self._page.heal_map.get(self._description, site)
+        if override is None and page_heals:
+            verified = self._page.heal_map.for_page(self._description, self._page.raw.url)
+            if verified is not None:
+                override = (verified["healed_selector"], verified["selector_method"])
+        if override is not None:
+            return build_locator(self._page.raw, *override)
+        return self._build(site)
+
+    def _chain(self, suffix: str, build: Callable[[str], Locator]) -> "HealingLocator":
+        return HealingLocator(self._page, f"{self._description} >> {suffix}", build)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in LOCATOR_CHAINS:
+            def refine(*args, **kwargs):
+                return self._chain(
+                    describe(name, args, kwargs), lambda site: getattr(self._resolve(site), name)(*args, **kwargs)
+                )
+            return refine
+
+        if name in LOCATOR_CHAIN_PROPERTIES:
+            return self._chain(name, lambda site: getattr(self._resolve(site), name))
+
+        if name in LOCATOR_ACTIONS:
+            def act(*args, **kwargs):
+                site = self._page.site()
+                return self._page.act(
+                    self._description, site, self._resolve(site), self._build(site), name, args, kwargs
+                )
+            return act
+
+        if name == "_impl_obj":
+            # Read by expect(): assertions are not healed in place, so they reuse the heals of the page
+            return self._resolve(call_site(), page_heals=True)._impl_obj
+
+        return getattr(self._resolve(call_site()), name)
+
+    def __repr__(self) -> str:
+        return f"<HealingLocator {self._description}>"
+
+
+class HealingPage:
+    """
+    Page proxy healing selectors without restarting the test
+
+    Every selector used through `locator()`, `get_by_*()` or a page action
+    (`click`, `fill`...) is looked up in the heal map by selector and call
+    site, and replaced by its healed selector when one is recorded. When an
+    action fails, it is retried at once if the original selector matches
+    now (timing flake). Otherwise, if the heal gate lets the error through:
+    if another call site already healed the same selector on the same page,
+    its heal is checked against the live page and reused without calling
+    the healer; otherwise the healer is called, its selector is checked
+    against the live page, recorded, and the action is retried once in place.
+
+    The duration of every action is recorded in the action timings, which
+    give the next actions on the same selector an adaptive timeout. Before
+    acting, a selector matching nothing is probed for FAIL_FAST_PROBE ms:
+    if it still matches nothing while the page is idle (loaded, no network
+    activity), the action fails at once instead of waiting for its timeout.
+
+    Usage:
+        page = HealingPage(await context.new_page(), heal_map, healer)
+        await page.click("#submit")
+    """
+
+    def __init__(
+        self,
+        page: Page,
+        heal_map: HealMap,
+        healer: Healer,
+        on_healed: Optional[HealCallback] = None,
+        timings: Optional[ActionTimings] = None,
+        may_heal: Optional[HealGate] = None,
+    ):
+        self.raw = page
+        self.heal_map = heal_map
+        self.healer = healer
+        self.on_healed = on_healed
+        self.timings = timings
+        self.may_heal = may_heal
+        self.healed = 0
+        self.propagated = 0
+        self.flakes = 0
+        self.failed_fast = 0
+        self.heal_seconds = 0.0
+        self._unhealed: List[BaseException] = []
+        # Location of each call site, given to the healer (the error's traceback ends in the proxy)
+        self._locations: Dict[str, Location] = {}
+        self._requests = 0
+        self._network_at = time.monotonic()
+        page.on("request", lambda request: self._on_network(1))
+        page.on("requestfinished", lambda request: self._on_network(-1))
+        page.on("requestfailed", lambda request: self._on_network(-1))
+
+    @property
+    def __class__(self):
+        # isinstance(proxy, Page) holds for Playwright's expect()
+        return Page
+
+    def __getattr__(self, name: str) -> Any:
+        if name in LOCATOR_FACTORIES:
+            def factory(*args, **kwargs):
+                return HealingLocator(
+                    self, describe(name, args, kwargs), lambda site: getattr(self.raw, name)(*args, **kwargs)
+                )
+            return factory
+
+        if name in PAGE_ACTIONS:
+            def act(selector, *args, **kwargs):
+                return self._page_action(name, selector, self.site(), args, kwargs)
+            return act
+
+        return getattr(self.raw, name)
+
+    def __repr__(self) -> str:
+        return f"<HealingPage {self.raw!r}>"
+
+    def site(self) -> str:
+        """Call site key of the test statement calling the proxy, its location recorded for the healer"""
+        location = call_location()
+        if location is None:
+            return "unknown"
+        site = site_key(*location)
+        self._locations[site] = location
+        return site
+
+    def attempted(self, error: BaseException) -> bool:
+        """True if healing an error in place was already attempted (and failed)"""
+        return any(error is unhealed for unhealed in self._unhealed)
+
+    def _on_network(self, change: int):
+        self._requests = max(self._requests + change, 0)
+        self._network_at = time.monotonic()
+
+    async def _page_action(self, name: str, selector: str, site: str, args: tuple, kwargs: Dict[str, Any]):
+        """Run a page action, on the healed locator if the selector was healed at this call site"""
+        override = self.heal_map.get(selector, site)
+        locator = self.raw.locator(selector) if override is None else build_locator(self.raw, *override)
+
+        def run(target: Locator, **options):
+            return self._locator_action(target, name, args, {**kwargs, **options})
+
+        def first(**options):
+            if override is None:
+                return getattr(self.raw, name)(selector, *args, **kwargs, **options)
+            return run(locator, **options)
+
+        try:
+            return await self._timed(name, selector, locator, first, kwargs)
+        except PlaywrightError as error:
+            return await self._recover(selector, site, error, self.raw.locator(selector), run)
+
+    async def _locator_action(self, locator: Locator, name: str, args: tuple, kwargs: Dict[str, Any]):
+        """Run a page action on a locator (page-only options dropped)"""
+        kwargs = {key: value for key, value in kwargs.items() if key != "strict"}
+        if name == "wait_for_selector":
+            await locator.wait_for(*args, **kwargs)
+            return await locator.element_handle()
+        return await getattr(locator, name)(*args, **kwargs)
+
+    async def act(
+        self,
+        selector: str,
+        site: str,
+        locator: Locator,
+        original: Locator,
+        name: str,
+        args: tuple,
+        kwargs: Dict[str, Any],
+    ):
+        """Run a locator action, healing the selector and retrying once if it fails"""
+        def run(target: Locator, **options):
+            return getattr(target, name)(*args, **kwargs, **options)
+
+        try:
+            return await self._timed(name, selector, locator, lambda **options: run(locator, **options), kwargs)
+        except PlaywrightError as error:
+            return await self._recover(selector, site, error, original, run)
+
+    async def _timed(
+        self,
+        name: str,
+        selector: str,
+        locator: Locator,
+        first: Callable[..., Awaitable[Any]],
+        kwargs: Dict[str, Any],
+    ):
+        """
+        First attempt of an action: fail-fast probe, adaptive timeout, duration recorded
+
+        Retries after a failure run with the timeout of the test, so a slow
+        but valid selector is not healed because of its adaptive timeout.
+        """
+        url = self.raw.url
+        options: Dict[str, Any] = {}
+        if self.timings is not None and "timeout" not in kwargs:
+            timeout = self.timings.timeout_for(url, selector)
+            if timeout is not None:
+                options["timeout"] = timeout
+
+        if kwargs.get("state") not in ("hidden", "detached"):
+            await self._probe(name, selector, locator, url)
+
+        start = time.perf_counter()
+        result = await first(**options)
+        if self.timings is not None:
+            self.timings.record(url, selector, time.perf_counter() - start)
+        return result
+
+    async def _probe(self, name: str, selector: str, locator: Locator, url: str):
+        """
+        Fail fast when a selector matches nothing on an idle page
+
+        Raises:
+            PlaywrightError: The selector matched nothing for FAIL_FAST_PROBE ms and the page is idle
+        """
+        probe = config.playwright.fail_fast_probe / 1000
+        if probe <= 0:
+            return
+        if self.timings is not None and (self.timings.percentile(url, selector) or 0) > probe:
+            # This selector is known to take longer than the probe to appear
+            return
+
+        deadline = time.monotonic() + probe
+        while True:
+            try:
+                if await locator.count():
+                    return
+            except PlaywrightError:
+                # Invalid selector: the action reports it
+                return
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(PROBE_INTERVAL)
+
+        if not await self._idle():
+            # Still loading: the element may come, let the action wait for it
+            return
+
+        self.failed_fast += 1
+        expression = selector if selector.split("(", 1)[0] in LOCATOR_FACTORIES else f"locator({selector!r})"
+        raise PlaywrightError(
+            f"{name}: Timeout {config.playwright.fail_fast_probe}ms exceeded (fail fast).\n"
+            f"Call log:\n  - waiting for {expression}\n  - no element matched while the page was idle\n"
+        )
+
+    async def _idle(self) -> bool:
+        """True if the page is loaded and had no network activity for NETWORK_IDLE_SECONDS"""
+        if self._requests or time.monotonic() - self._network_at < NETWORK_IDLE_SECONDS:
+            return False
+        try:
+            return await self.raw.evaluate("document.readyState") == "complete"
+        except PlaywrightError:
+            return False
+
+    async def _recover(
+        self,
+        selector: str,
+        site: str,
+        error: PlaywrightError,
+        original: Locator,
+        run: Callable[[Locator], Awaitable[Any]],
+    ):
+        """
+        Retry a failed action once
+
+        If the original selector matches exactly one element now, the
+        failure was a timing flake: the action is retried on it without
+        calling the healer. Otherwise the selector is healed first, reusing
+        the heal verified at another call site of the page if there is one,
+        unless the heal gate rejects the error (then the error is raised).
+        """
+        if await self._matches_one(original):
+            logger.info(f"'{selector}' matches now at {site}: timing flake, retrying without healing")
+            self.flakes += 1
+            try:
+                result = await run(original)
+            except PlaywrightError as retry_error:
+                error = retry_error
+            else:
+                # A recorded override that failed is no longer needed
+                self.heal_map.discard(selector, site)
+                return result
+        if self.may_heal is not None and not self.may_heal(error):
+            self._unhealed.append(error)
+            raise error
+        locator = await self._propagate(selector, site)
+        if locator is None:
+            locator = await self._heal(selector, site, error)
+        return await run(locator)
+
+    async def _matches_one(self, locator: Locator) -> bool:
+        """True if a locator matches exactly one element of the live page"""
+        try:
+            return await locator.count() == 1
+        except PlaywrightError:
+            return False
+
+    async def _propagate(self, selector: str, site: str) -> Optional[Locator]:
+        """
+        Reuse the heal of a selector verified at another call site of the same page
+
+        Returns:
+            The locator to retry with, None if no heal applies (the healer is called then)
+        """
+        url = self.raw.url
+        verified = self.heal_map.for_page(selector, url)
+        if verified is None or verified["call_site"] == site:
+            return None
+        location = self._locations.get(site)
+
+        validated = await self._validate(verified["healed_selector"], verified["selector_method"])
+        if validated is None:
+            return None
+
+        locator, method = validated
+        patch_info = {
+            "selector": verified["healed_selector"],
+            "selector_method": method,
+            "confidence": verified.get("confidence"),
+            "explanation": f"Heal of '{selector}' verified at {verified['call_site']} on {page_key(url)}",
+            "original_selector": selector,
+            "call_site": site,
+            "propagated_from": verified["call_site"],
+            "test_file": location[0] if location else None,
+        }
+        self.heal_map.put(selector, site, verified["healed_selector"], method, patch_info, page=url)
+        logger.info(f"Heal of '{selector}' reused from {verified['call_site']} at {site}")
+        self.healed += 1
+        self.propagated += 1
+        if self.on_healed:
+            self.on_healed(patch_info)
+        return locator
+
+    async def _heal(self, selector: str, site: str, error: PlaywrightError) -> Locator:
+        """
+        Heal a selector and return the locator to retry with
+
+        Raises:
+            The original error if the selector could not be healed
+        """
+        logger.warning(f"Action on '{selector}' failed at {site}, healing in place...")
+        start = time.perf_counter()
+        try:
+            patch_info = await self.healer(selector, site, error, self._locations.get(site))
+        except Exception as e:
+            logger.error(f"In-place heal of '{selector}' failed: {e}")
+            patch_info = None
+
+        healed = (patch_info or {}).get("selector")
+        validated = await self._validate(healed, patch_info.get("selector_method")) if healed else None
+        self.heal_seconds += time.perf_counter() - start
+        if validated is None:
+            self._unhealed.append(error)
+            raise error
+
+        locator, method = validated
+        self.heal_map.put(selector, site, healed, method, patch_info, page=self.raw.url)
+        self.healed += 1
+        if self.on_healed:
+            self.on_healed(patch_info)
+        return locator
+
+    async def _validate(self, selector: str, method: Optional[str]) -> Optional[Tuple[Locator, Optional[str]]]:
+        """
+        Check a healed selector against the live page
+
+        The suggested method is tried first, then the selector as a plain
+        Playwright selector.
+
+        Returns:
+            The locator and the method building it, None if no element matches
+        """
+        methods = [method, None] if method and method != "locator" else [None]
+        for candidate_method in methods:
+            try:
+                locator = build_locator(self.raw, selector, candidate_method)
+                if await locator.count():
+                    return locator, candidate_method
+            except PlaywrightError as e:
+                logger.debug(f"Healed selector '{selector}' ({candidate_method or 'locator'}) is not valid: {e}")
+        logger.warning(f"Healed selector '{selector}' matches no element, not applied")
+        return None
@@ -0,0 +1,283 @@
+"""
+Source Index - Cached statement map of test files
+"""
+import ast
+import hashlib
+import io
+import os
+import textwrap
+import threading
+import tokenize
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .file_lock import content_hash
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Token types that carry no meaning for code comparison
+_IGNORED_TOKENS = {
+    tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER,
+}
+
+# AST fields holding nested statements (or handlers/cases holding them)
+_BLOCK_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+# Maximum number of indexed files kept in memory
+CACHE_SIZE = 256
+
+
+def split_lines(content: str) -> List[str]:
+    """Split source lines the way the Python compiler numbers them (\\n, \\r\\n or \\r)"""
+    return io.StringIO(content, newline="").readlines()
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize code for comparison: tokens joined without whitespace or comments
+
+    Formatting differences (line breaks inside brackets, spacing, trailing
+    comments) do not change the result. Snippets that cannot be tokenized
+    fall back to whitespace removal.
+    """
+    source = textwrap.dedent(code.strip("\r\n"))
+    if not source.strip():
+        return ""
+
+    try:
+        tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+        return "".join(token.string for token in tokens if token.type not in _IGNORED_TOKENS)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return "".join(code.split())
+
+
+def code_digest(normalized: str) -> str:
+    """Short hash of normalized code"""
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class SourceStatement(BaseModel):
+    """A logical statement of a source file"""
+    start_line: int = Field(description="First line of the statement (1-based)")
+    end_line: int = Field(description="Last line of the statement (1-based, inclusive)")
+    text: str = Field(description="Statement source, dedented to its first line")
+    digest: str = Field(description="Hash of the normalized statement")
+    scope: Optional[str] = Field(default=None, description="Qualified name of the enclosing function or class")
+
+
+class SourceIndex:
+    """
+    Maps the logical statements of a file to their line spans and hashes
+
+    Built once per file version with `tokenize` (statement spans) and `ast`
+    (enclosing scopes), then cached and invalidated when the file's stat
+    or content hash changes. Statement and line lookups are dictionary or
+    list accesses, whatever the size of the file.
+    """
+
+    _cache: "OrderedDict[str, Tuple[Tuple[int, int, int], SourceIndex]]" = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, path: Path, content: str):
+        self.path = Path(path)
+        self.content_hash = content_hash(content)
+        self.lines = split_lines(content)
+        self.statements: List[SourceStatement] = []
+        self._line_to_statement: List[Optional[int]] = [None] * (len(self.lines) + 1)
+        self._by_digest: Dict[str, List[int]] = {}
+        self._by_line_digest: Optional[Dict[str, List[int]]] = None
+        self._build(content)
+
+    @classmethod
+    def for_file(cls, path: Path) -> Optional["SourceIndex"]:
+        """
+        Get the index of a file, rebuilding it only when the file changed
+
+        Returns:
+            The index, None if the file cannot be read
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        with cls._cache_lock:
+            cached = cls._cache.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        try:
+            with open(key, "r", encoding="utf-8", newline="") as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Could not read {path}: {e}")
+            return None
+
+        index = cached[1] if cached and cached[1].content_hash == content_hash(content) else cls(path, content)
+        cls._store(key, signature, index)
+        return index
+
+    @classmethod
+    def for_content(cls, path: Path, content: str) -> "SourceIndex":
+        """Get the index of a file content already read (reused when the content hash matches)"""
+        key = str(Path(path).resolve())
+        with cls._cache_lock:
+            cached = cls._cache.get(key)
+        if cached and cached[1].content_hash == content_hash(content):
+            return cached[1]
+        return cls(path, content)
+
+    @classmethod
+    def invalidate(cls, path: Path):
+        """Drop the cached index of a file"""
+        with cls._cache_lock:
+            cls._cache.pop(str(Path(path).resolve()), None)
+
+    @classmethod
+    def _store(cls, key: str, signature: Tuple[int, int, int], index: "SourceIndex"):
+        with cls._cache_lock:
+            cls._cache[key] = (signature, index)
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    def _build(self, content: str):
+        """Index logical statements (tokenize) and their enclosing scopes (ast)"""
+        scopes = self._collect_scopes(content)
+        try:
+            for start, end, normalized in self._logical_lines(content):
+                self._add_statement(start, end, normalized, scopes.get(start))
+        except (tokenize.TokenError, IndentationError, SyntaxError) as e:
+            # Unfinished edit or syntax error: fall back to one statement per physical line
+            logger.debug(f"Could not tokenize {self.path} ({e}), indexing physical lines")
+            self.statements.clear()
+            self._by_digest.clear()
+            self._line_to_statement = [None] * (len(self.lines) + 1)
+            for number, line in enumerate(self.lines, start=1):
+                if line.strip():
+                    self._add_statement(number, number, "".join(line.split()), scopes.get(number))
+
+    def _logical_lines(self, content: str):
+        """Yield (start line, end line, normalized code) for each logical line"""
+        start = None
+        parts: List[str] = []
+        for token in tokenize.generate_tokens(io.StringIO(content, newline="").readline):
+            if token.type == tokenize.NEWLINE:
+                if start is not None:
+                    yield start, token.start[0], "".join(parts)
+                start, parts = None, []
+            elif token.type not in _IGNORED_TOKENS:
+                if start is None:
+                    start = token.start[0]
+                parts.append(token.string)
+        if start is not None:
+            yield start, len(self.lines), "".join(parts)
+
+    def _collect_scopes(self, content: str) -> Dict[int, str]:
+        """Map the first line of every statement to the qualified name of its enclosing scope"""
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            return {}
+
+        scopes: Dict[int, str] = {}
+
+        def visit(node: ast.AST, scope: Optional[str], prefix: str):
+            # Only statement blocks can hold statements: expressions are never visited
+            children = [child for field in _BLOCK_FIELDS for child in getattr(node, field, None) or []]
+            for child in children:
+                if isinstance(child, ast.stmt) and scope:
+                    scopes.setdefault(child.lineno, scope)
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    qualname = f"{prefix}{child.name}"
+                    if scope:
+                        for decorator in child.decorator_list:
+                            scopes.setdefault(decorator.lineno, scope)
+                    visit(child, qualname, f"{qualname}.<locals>.")
+                elif isinstance(child, ast.ClassDef):
+                    qualname = f"{prefix}{child.name}"
+                    visit(child, qualname, f"{qualname}.")
+                else:
+                    visit(child, scope, prefix)
+
+        visit(tree, None, "")
+        return scopes
+
+    def _add_statement(self, start: int, end: int, normalized: str, scope: Optional[str]):
+        """Register a statement"""
+        lines = self.lines[start - 1:end]
+        first = lines[0]
+        indent = first[:len(first) - len(first.lstrip())]
+        text = "".join(line[len(indent):] if line.startswith(indent) else line for line in lines)
+
+        position = len(self.statements)
+        statement = SourceStatement(
+            start_line=start, end_line=end, text=text.rstrip("\r\n"), digest=code_digest(normalized), scope=scope,
+        )
+        self.statements.append(statement)
+        self._by_digest.setdefault(statement.digest, []).append(position)
+        for number in range(start, end + 1):
+            self._line_to_statement[number] = position
+
+    def statement_at(self, line_number: int) -> Optional[SourceStatement]:
+        """Statement spanning a line"""
+        if 0 < line_number < len(self._line_to_statement):
+            position = self._line_to_statement[line_number]
+            if position is not None:
+                return self.statements[position]
+        return None
+
+    def find(self, code: str, near_line: int = 0) -> Optional[SourceStatement]:
+        """
+        Find the statement matching code
+
+        The statement spanning `near_line` wins; otherwise the closest
+        matching statement is used, so a shifted file still resolves to the
+        right occurrence when the same statement appears several times.
+
+        Args:
+            code: Statement source (any formatting)
+            near_line: Line reported for the statement
+
+        Returns:
+            The matching statement, None if the code is not in the file
+        """
+        normalized = normalize_code(code)
+        if not normalized:
+            return None
+
+        positions = self._by_digest.get(code_digest(normalized), [])
+        if not positions:
+            return None
+
+        current = self.statement_at(near_line)
+        if current is not None and current.digest == code_digest(normalized):
+            return current
+        position = min(positions, key=lambda p: abs(self.statements[p].start_line - near_line))
+        return self.statements[position]
+
+    def find_line(self, code: str, near_line: int = 0) -> Optional[int]:
+        """
+        Find a physical line matching code (whitespace-insensitive)
+
+        Used for single lines inside a multi-line statement.
+
+        Returns:
+            The 1-based line number closest to `near_line`, None if not found
+        """
+        if self._by_line_digest is None:
+            self._by_line_digest = {}
+            for number, line in enumerate(self.lines, start=1):
+                self._by_line_digest.setdefault(" ".join(line.split()), []).append(number)
+
+        numbers = self._by_line_digest.get(" ".join(code.split()), []) if code.strip() else []
+        if not numbers:
+            return None
+        return min(numbers, key=lambda number: abs(number - near_line))
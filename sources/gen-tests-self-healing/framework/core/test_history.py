@@ -0,0 +1,308 @@
+"""
+Test History - SQLite store of test outcomes, flakiness and quarantine
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import config
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_test ON runs (test_id, id);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS quarantine (
+    test_id TEXT PRIMARY KEY,
+    reason TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS action_timings (
+    page TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    samples TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (page, selector)
+);
+CREATE TABLE IF NOT EXISTS test_resources (
+    test_id TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (test_id, resource)
+);
+"""
+
+# Statements upgrading the schema to each version
+_MIGRATIONS = {
+    2: ["ALTER TABLE runs ADD COLUMN heals INTEGER NOT NULL DEFAULT 0"],
+}
+
+# Run outcomes
+OUTCOME_PASSED = "passed"
+OUTCOME_FAILED = "failed"
+# Failed, then passed on a plain re-run (no heal)
+OUTCOME_FLAKY = "flaky"
+# Failed, then passed after a heal
+OUTCOME_HEALED = "healed"
+# Failed while quarantined (not healed)
+OUTCOME_QUARANTINED = "quarantined"
+
+
+class TestHistory:
+    """
+    Outcome history of every test, in a single SQLite database
+
+    A test whose recent runs include too many flaky outcomes (failures that
+    passed on a plain re-run) is quarantined: its failures are reported but
+    never sent to the LLM. Tests can also be quarantined by hand.
+    """
+
+    # Not a test class, despite its name
+    __test__ = False
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or config.auto_heal.history_file)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path), timeout=config.auto_heal.lock_timeout, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema and upgrade it to SCHEMA_VERSION"""
+        conn.executescript(_SCHEMA)
+        # Serialize migrations between processes opening the history together
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0] or 1
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in _MIGRATIONS.get(target, []):
+                    conn.execute(statement)
+                logger.debug(f"Test history schema upgraded to version {target}")
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(
+        self,
+        test_id: str,
+        outcome: str,
+        duration: Optional[float] = None,
+        error: Optional[str] = None,
+        heals: int = 0,
+    ):
+        """
+        Record the outcome of a test run
+
+        Args:
+            test_id: Test identifier
+            outcome: passed, failed, flaky, healed or quarantined
+            duration: Duration of the run in seconds
+            error: First line of the error of a failed run
+            heals: Heals during the run (selectors healed in place and heal attempts)
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (test_id, timestamp, outcome, duration, error, heals) VALUES (?, ?, ?, ?, ?, ?)",
+                (test_id, datetime.now().isoformat(), outcome, duration, error, heals),
+            )
+
+    def recent(self, test_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent runs of a test, newest first"""
+        limit = limit or config.auto_heal.flake_window
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM runs WHERE test_id = ? ORDER BY id DESC LIMIT ?", (test_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def flaky_count(self, test_id: str, window: Optional[int] = None) -> int:
+        """Number of flaky outcomes in the last runs of a test"""
+        window = window or config.auto_heal.flake_window
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM (SELECT outcome FROM runs WHERE test_id = ? ORDER BY id DESC LIMIT ?) "
+                "WHERE outcome = ?",
+                (test_id, window, OUTCOME_FLAKY),
+            ).fetchone()
+        return row[0]
+
+    def is_quarantined(self, test_id: str) -> bool:
+        """True if a test is quarantined by hand or flaky too often"""
+        with self._lock:
+            manual = self.conn.execute("SELECT 1 FROM quarantine WHERE test_id = ?", (test_id,)).fetchone()
+        if manual:
+            return True
+        threshold = config.auto_heal.flake_quarantine_threshold
+        return bool(threshold) and self.flaky_count(test_id) >= threshold
+
+    def quarantine(self, test_id: str, reason: Optional[str] = None):
+        """Quarantine a test by hand"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO quarantine (test_id, reason, timestamp) VALUES (?, ?, ?)",
+                (test_id, reason, datetime.now().isoformat()),
+            )
+        logger.info(f"Test quarantined: {test_id}")
+
+    def release(self, test_id: str) -> bool:
+        """
+        Take a test out of quarantine
+
+        Its flaky outcomes are forgotten too, so it is not quarantined again
+        by its past runs.
+
+        Returns:
+            True if the test was quarantined
+        """
+        was_quarantined = self.is_quarantined(test_id)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM quarantine WHERE test_id = ?", (test_id,))
+            self.conn.execute("DELETE FROM runs WHERE test_id = ? AND outcome = ?", (test_id, OUTCOME_FLAKY))
+        if was_quarantined:
+            logger.info(f"Test released from quarantine: {test_id}")
+        return was_quarantined
+
+    def stats(self, window: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Duration, heals and outcomes of every test over its last runs
+
+        Args:
+            window: Number of recent runs per test (config.auto_heal.flake_window if None)
+
+        Returns:
+            Dictionary by test id with runs, duration (average in seconds, None if
+            never timed), heals, troubled (runs that failed, healed or were flaky),
+            last_outcome and last_run
+        """
+        window = window or config.auto_heal.flake_window
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT test_id, COUNT(*) AS runs, AVG(duration) AS duration, SUM(heals) AS heals, "
+                "SUM(outcome != ?) AS troubled, MAX(timestamp) AS last_run, "
+                "MAX(CASE WHEN position = 1 THEN outcome END) AS last_outcome FROM ("
+                "  SELECT test_id, outcome, duration, heals, timestamp, "
+                "  ROW_NUMBER() OVER (PARTITION BY test_id ORDER BY id DESC) AS position FROM runs"
+                ") WHERE position <= ? GROUP BY test_id",
+                (OUTCOME_PASSED, window),
+            ).fetchall()
+        return {row["test_id"]: dict(row) for row in rows}
+
+    def flaky_tests(self, window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Tests with flaky outcomes in their recent runs, most flaky first
+
+        Returns:
+            List of dictionaries with test_id, runs, flaky, last_run and quarantined
+        """
+        window = window or config.auto_heal.flake_window
+        threshold = config.auto_heal.flake_quarantine_threshold
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT test_id, COUNT(*) AS runs, SUM(outcome = ?) AS flaky, MAX(timestamp) AS last_run FROM ("
+                "  SELECT test_id, outcome, timestamp, "
+                "  ROW_NUMBER() OVER (PARTITION BY test_id ORDER BY id DESC) AS position FROM runs"
+                ") WHERE position <= ? GROUP BY test_id HAVING flaky > 0 ORDER BY flaky DESC",
+                (OUTCOME_FLAKY, window),
+            ).fetchall()
+            manual = {row[0] for row in self.conn.execute("SELECT test_id FROM quarantine").fetchall()}
+
+        tests = [
+            {**dict(row), "quarantined": row["test_id"] in manual or bool(threshold and row["flaky"] >= threshold)}
+            for row in rows
+        ]
+        tests.extend(
+            {"test_id": test_id, "runs": 0, "flaky": 0, "last_run": None, "quarantined": True}
+            for test_id in sorted(manual - {row["test_id"] for row in rows})
+        )
+        return tests
+
+    def action_timings(self) -> Dict[Tuple[str, str], List[float]]:
+        """Recent action durations in seconds, by page and selector"""
+        with self._lock:
+            rows = self.conn.execute("SELECT page, selector, samples FROM action_timings").fetchall()
+        return {(row["page"], row["selector"]): json.loads(row["samples"]) for row in rows}
+
+    def save_action_timings(self, timings: Dict[Tuple[str, str], List[float]]):
+        """Store the recent action durations of selectors (replacing the stored ones)"""
+        timestamp = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO action_timings (page, selector, samples, timestamp) VALUES (?, ?, ?, ?)",
+                [(page, selector, json.dumps(samples), timestamp) for (page, selector), samples in timings.items()],
+            )
+
+    def record_resources(self, test_id: str, resources: Iterable[str]):
+        """Replace the project resources (pages, scripts, styles) a test loads"""
+        timestamp = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM test_resources WHERE test_id = ?", (test_id,))
+            self.conn.executemany(
+                "INSERT INTO test_resources (test_id, resource, timestamp) VALUES (?, ?, ?)",
+                [(test_id, resource, timestamp) for resource in set(resources)],
+            )
+
+    def resources(self) -> Dict[str, Set[str]]:
+        """Project resources loaded by each test in its last passing run"""
+        tests: Dict[str, Set[str]] = {}
+        with self._lock:
+            rows = self.conn.execute("SELECT test_id, resource FROM test_resources").fetchall()
+        for row in rows:
+            tests.setdefault(row["test_id"], set()).add(row["resource"])
+        return tests
+
+    def apply_retention(self, days: Optional[int] = None) -> int:
+        """
+        Delete runs and action timings older than the retention period
+
+        Args:
+            days: Retention in days, config.auto_heal.retention_days if None (0 keeps everything)
+
+        Returns:
+            Number of runs deleted
+        """
+        days = config.auto_heal.retention_days if days is None else days
+        if not days:
+            return 0
+
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM runs WHERE timestamp < ?", (cutoff,)).rowcount
+            self.conn.execute("DELETE FROM action_timings WHERE timestamp < ?", (cutoff,))
+        logger.info(f"Test history retention ({days} days): {deleted} run(s) deleted")
+        return deleted
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
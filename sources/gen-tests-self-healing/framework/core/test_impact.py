@@ -0,0 +1,126 @@
+"""
+Test Impact - Select the tests affected by changed project files
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import unquote, urlsplit
+from urllib.request import url2pathname
+
+import git
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Prefix of resources served over HTTP, recorded by URL path
+URL_PREFIX = "url:"
+
+# Files whose change may affect every test
+GLOBAL_FILES = frozenset({"conftest.py", "pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini", ".env"})
+
+
+def is_global(name: str, test_files: Set[str]) -> bool:
+    """
+    True if a changed file may affect every test
+
+    Besides the configuration files, this is any Python module that is not
+    a test file (page objects, helpers, the framework): the modules a test
+    imports are not recorded, so any test may depend on it.
+    """
+    path = Path(name)
+    if path.name in GLOBAL_FILES:
+        return True
+    if path.suffix != ".py" or name in test_files:
+        return False
+    return not (path.name.startswith("test_") or path.stem.endswith("_test"))
+
+
+def resource_of(url: str, root: Path) -> Optional[str]:
+    """
+    Project resource loaded by a request
+
+    Args:
+        url: URL of the request
+        root: Project root directory
+
+    Returns:
+        The file path relative to the root for file:// URLs inside the project,
+        `url:<path>` for HTTP URLs, None for anything else (data:, external files)
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "file":
+        path = Path(url2pathname(unquote(parts.path))).resolve()
+        try:
+            return path.relative_to(root).as_posix()
+        except ValueError:
+            return None
+    if parts.scheme in ("http", "https") and parts.path not in ("", "/"):
+        return f"{URL_PREFIX}{unquote(parts.path)}"
+    return None
+
+
+def changed_files(ref: str, root: Path) -> Optional[Set[str]]:
+    """
+    Files changed since a git ref (committed, uncommitted and untracked)
+
+    Args:
+        ref: Git ref to compare with (branch, tag, commit)
+        root: Project root directory
+
+    Returns:
+        Changed file paths relative to the root (files outside it are
+        kept as `../` paths), None if the changes cannot be listed
+    """
+    try:
+        repo = git.Repo(root, search_parent_directories=True)
+        changed = repo.git.diff("--name-only", ref).splitlines()
+        changed += repo.git.ls_files("--others", "--exclude-standard").splitlines()
+    except (git.InvalidGitRepositoryError, git.GitCommandError) as e:
+        logger.error(f"Could not list the files changed since {ref}: {e}")
+        return None
+
+    repo_root = Path(repo.working_tree_dir)
+    return {Path(os.path.relpath(repo_root / name, root)).as_posix() for name in changed if name}
+
+
+def _matches(resource: str, changed: Set[str]) -> bool:
+    """True if a recorded resource is one of the changed files"""
+    if not resource.startswith(URL_PREFIX):
+        return resource in changed
+    # Served files are matched by the end of their path (the server root is unknown)
+    path = resource[len(URL_PREFIX):]
+    return any(f"/{name}".endswith(path) for name in changed)
+
+
+def select_tests(
+    tests: Dict[str, str],
+    resources: Dict[str, Set[str]],
+    changed: Iterable[str],
+) -> Optional[List[str]]:
+    """
+    Tests affected by changed files
+
+    A test is selected when its file changed, when one of the resources it
+    loaded changed, or when no resources were ever recorded for it.
+
+    Args:
+        tests: Test file (relative to the project root) by test id
+        resources: Recorded resources by test id
+        changed: Changed files (relative to the project root)
+
+    Returns:
+        The selected test ids, None if a change affects every test (configuration,
+        conftest.py, a Python module other than a test file)
+    """
+    changed = set(changed)
+    test_files = set(tests.values())
+    if any(is_global(name, test_files) for name in changed):
+        return None
+
+    selected = []
+    for test_id, test_file in tests.items():
+        recorded = resources.get(test_id)
+        if test_file in changed or not recorded or any(_matches(resource, changed) for resource in recorded):
+            selected.append(test_id)
+    return selected
@@ -0,0 +1,90 @@
+"""
+Test Order - Schedule tests from their history (failures first, longest first, balanced shards)
+"""
+import heapq
+import statistics
+from typing import Any, Dict, List, Optional, Sequence
+
+from .test_history import OUTCOME_FAILED, OUTCOME_QUARANTINED
+
+# Test orders
+# Collection order
+ORDER_NONE = "none"
+# Tests that failed, were healed or flaky in their recent runs first, then new tests (fast feedback)
+ORDER_FAILED_FIRST = "failed-first"
+# Slowest tests first (balanced parallel packing)
+ORDER_LONGEST_FIRST = "longest-first"
+
+ORDERS = (ORDER_NONE, ORDER_FAILED_FIRST, ORDER_LONGEST_FIRST)
+
+
+def estimated_durations(test_ids: Sequence[str], stats: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Expected duration of each test in seconds
+
+    Tests never timed are expected to take the median duration of the
+    others (1 s when no test was ever timed).
+    """
+    known = [stats[test_id]["duration"] for test_id in test_ids if (stats.get(test_id) or {}).get("duration")]
+    default = statistics.median(known) if known else 1.0
+    return {test_id: (stats.get(test_id) or {}).get("duration") or default for test_id in test_ids}
+
+
+def _failure_rank(entry: Optional[Dict[str, Any]]) -> int:
+    """0: last run failed, 1: failed, healed or flaky recently, 2: never run, 3: passing"""
+    if not entry:
+        return 2
+    if entry["last_outcome"] in (OUTCOME_FAILED, OUTCOME_QUARANTINED):
+        return 0
+    return 1 if entry["troubled"] else 3
+
+
+def order_tests(test_ids: Sequence[str], stats: Dict[str, Dict[str, Any]], order: str) -> List[str]:
+    """
+    Order tests from their history
+
+    Sorting is stable: tests ranked equal keep their collection order.
+
+    Args:
+        test_ids: Tests in collection order
+        stats: Test history stats (TestHistory.stats())
+        order: none, failed-first or longest-first
+
+    Returns:
+        The tests in the order to run them
+    """
+    if order == ORDER_FAILED_FIRST:
+        return sorted(test_ids, key=lambda test_id: _failure_rank(stats.get(test_id)))
+    if order == ORDER_LONGEST_FIRST:
+        durations = estimated_durations(test_ids, stats)
+        return sorted(test_ids, key=lambda test_id: -durations[test_id])
+    if order != ORDER_NONE:
+        raise ValueError(f"Unknown test order '{order}' (expected one of {', '.join(ORDERS)})")
+    return list(test_ids)
+
+
+def assign_shards(test_ids: Sequence[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """
+    Split tests into shards of balanced total duration
+
+    Longest processing time first: each test, slowest first, goes to the
+    shard with the smallest total so far. The assignment only depends on
+    the tests and their durations, so parallel jobs computing it
+    separately agree on it.
+
+    Args:
+        test_ids: Tests to split
+        durations: Expected duration of each test in seconds
+        shards: Number of shards
+
+    Returns:
+        The tests of each shard, in the order they were given
+    """
+    position = {test_id: index for index, test_id in enumerate(test_ids)}
+    heap = [(0.0, shard) for shard in range(shards)]
+    assigned: List[List[str]] = [[] for _ in range(shards)]
+    for test_id in sorted(test_ids, key=lambda test_id: (-durations[test_id], test_id)):
+        total, shard = heapq.heappop(heap)
+        assigned[shard].append(test_id)
+        heapq.heappush(heap, (total + durations[test_id], shard))
+    return [sorted(tests, key=position.__getitem__) for tests in assigned]
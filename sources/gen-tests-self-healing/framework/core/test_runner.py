@@ -2,16 +2,33 @@
 Test Runner with Auto-Heal capabilities
 """
 import asyncio
+import time
 import traceback
 import inspect
-from typing import Optional, Dict, Any
+from functools import partial
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
 from pathlib import Path
 from playwright.async_api import async_playwright, Page, Error as PlaywrightError
 
+from .action_timings import ActionTimings
+from .artifact_store import KIND_TRACE, ArtifactStore
+from .collectors import ContextCapture, default_collectors
 from .config import config
-from .logger import get_logger
+from .error_classifier import ErrorClassification, classify_error
+from .event_bus import FAILURE_CAPTURED, RETRY, TEST_FINISHED, TEST_STARTED, event_bus
+from .heal_candidates import SOURCE_LLM, collect_candidates, rank_candidates
+from .heal_ledger import OUTCOME_OVERRIDE
+from .hot_reload import reload_patched_code
+from .logger import get_logger, log_context, set_log_context
 from ..agents.orchestrator import AgentOrchestrator
-from .patch_manager import PatchManager
+from ..llm.usage import usage_tracker
+from .patch_manager import PatchManager, PatchRequest
+from .screenshots import ScreenshotRecorder
+from .selector_index import SelectorIndex
+from .selector_override import HealingPage, HealMap
+from .test_history import (
+    OUTCOME_FAILED, OUTCOME_FLAKY, OUTCOME_HEALED, OUTCOME_PASSED, OUTCOME_QUARANTINED, TestHistory
+)
 
 logger = get_logger(__name__)
 
@@ -22,6 +39,16 @@ class AutoHealTestRunner:
     def __init__(self):
         self.orchestrator = AgentOrchestrator()
         self.patch_manager = PatchManager()
+        self.artifacts = ArtifactStore()
+        self.screenshots = ScreenshotRecorder(self.artifacts)
+        self.context_capture = ContextCapture(default_collectors(self.screenshots))
+        self.heal_map = HealMap(self.patch_manager.ledger)
+        self.history = TestHistory()
+        self.timings = ActionTimings(self.history)
+        # Selector usages of the test files, to patch the call sites reusing another site's heal
+        self.selector_index = SelectorIndex()
+        # Source patches of selectors healed in place, applied in one batch at teardown
+        self.patch_session = self.patch_manager.begin_session()
         self.playwright = None
         self.browser = None
         self.context = None
@@ -29,12 +56,14 @@ class AutoHealTestRunner:
     async def setup(self):
         """Setup Playwright browser"""
         logger.info("Setting up Playwright...")
+        config.ensure_directories()
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch(
             headless=config.playwright.headless,
             slow_mo=config.playwright.slow_mo
         )
         self.context = await self.browser.new_context()
+        self.context.set_default_timeout(config.playwright.timeout)
 
         # Enable tracing
         await self.context.tracing.start(screenshots=True, snapshots=True, sources=True)
@@ -44,8 +73,9 @@ class AutoHealTestRunner:
         """Teardown Playwright browser"""
         if self.context:
             # Save trace
-            trace_path = config.playwright.trace_dir / f"trace_{asyncio.get_event_loop().time()}.zip"
+            trace_path = config.playwright.trace_dir / f"trace_{event_bus.run_id}.zip"
             await self.context.tracing.stop(path=str(trace_path))
+            self.artifacts.register(KIND_TRACE, trace_path)
             logger.info(f"Trace saved: {trace_path}")
 
         if self.browser:
@@ -54,6 +84,20 @@ class AutoHealTestRunner:
         if self.playwright:
             await self.playwright.stop()
 
+        await self.screenshots.drain()
+        self.timings.save()
+        if len(self.patch_session):
+            self.patch_session.flush()
+        # Waiting for the git worker and the event writer blocks: keep it off the event loop
+        await asyncio.to_thread(self.patch_manager.flush_commits, timeout=60)
+        await asyncio.to_thread(event_bus.flush, timeout=10)
+        usage_tracker.save_summary()
+        if config.artifacts.gc_on_teardown:
+            try:
+                # File and database work, possibly waiting for another worker's collection
+                await asyncio.to_thread(self.artifacts.gc)
+            except Exception as e:
+                logger.warning(f"Artifact GC skipped: {e}")
         logger.info("Playwright teardown complete")
 
     async def run_test_with_healing(
@@ -71,155 +115,487 @@ class AutoHealTestRunner:
         Returns:
             Dictionary with test results
         """
+        with log_context(test_id=self._get_test_id(test_func), retry=0):
+            return await self._run_test_with_healing(test_func, max_retries)
+
+    async def _run_test_with_healing(self, test_func, max_retries: Optional[int]) -> Dict[str, Any]:
+        """Run a test with automatic healing (see run_test_with_healing), in its log context"""
         if max_retries is None:
             max_retries = config.auto_heal.max_retries
 
         retry_count = 0
         last_error = None
+        test_id = self._get_test_id(test_func)
+        attempts = []
+        healed_in_place = 0
+        flaky = quarantined = False
+        start = time.perf_counter()
+        event_bus.publish(TEST_STARTED, test_id=test_id)
 
         while retry_count <= max_retries:
+            test_page = None
             try:
                 page = await self.context.new_page()
+                test_page = self.prepare_page(page, test_func, test_id)
 
                 # Run the test
-                if asyncio.iscoroutinefunction(test_func):
-                    await test_func(page)
-                else:
-                    test_func(page)
+                try:
+                    await self._call_test(test_func, test_page)
+                finally:
+                    healed_in_place += getattr(test_page, "healed", 0)
 
                 logger.success(f"Test '{test_func.__name__}' passed")
                 await page.close()
-
-                return {
-                    "status": "passed",
-                    "retries": retry_count,
-                    "test_name": test_func.__name__
-                }
+                last_error = None
+                break
 
             except Exception as e:
                 last_error = e
                 logger.error(f"Test '{test_func.__name__}' failed: {e}")
+                if attempts:
+                    attempts[-1]["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+
+                # Flake gate: a failure that passes on a plain re-run is not worth a heal
+                if retry_count == 0 and await self.flake_gate(partial(self._call_test, test_func), test_id):
+                    await page.close()
+                    last_error, flaky = None, True
+                    break
 
                 if retry_count >= max_retries:
                     logger.error(f"Max retries ({max_retries}) reached. Giving up.")
                     break
 
-                # Capture failure context
-                context = await self._capture_failure_context(page, e, test_func)
+                if usage_tracker.budget_exceeded:
+                    logger.error("LLM budget for this run exhausted. Healing stopped.")
+                    await page.close()
+                    break
+
+                if self.history.is_quarantined(test_id):
+                    logger.warning(f"Test '{test_func.__name__}' is quarantined as flaky, not healed")
+                    await page.close()
+                    quarantined = True
+                    break
 
-                # Take screenshot
-                screenshot_path = config.playwright.screenshot_dir / f"failure_{test_func.__name__}_{retry_count}.png"
-                await page.screenshot(path=str(screenshot_path))
-                context["screenshot"] = str(screenshot_path)
+                if isinstance(test_page, HealingPage) and test_page.attempted(e):
+                    # The selector was already sent to the healer during the run
+                    logger.error("In-place healing failed. Stopping retries.")
+                    await page.close()
+                    break
 
+                healed_func = await self.heal_failure(page, e, test_func, attempts)
                 await page.close()
 
-                # Analyze and attempt to heal
-                healed = await self._attempt_heal(context)
-
-                if not healed:
+                if healed_func is None:
                     logger.error("Healing failed. Stopping retries.")
                     break
 
+                test_func = healed_func
                 retry_count += 1
+                set_log_context(retry=retry_count)
                 logger.info(f"Retry {retry_count}/{max_retries}")
+                event_bus.publish(RETRY, test_id=test_id, reason="heal", attempt=retry_count)
+
+        await self.screenshots.drain()
+
+        if last_error is not None:
+            outcome = OUTCOME_QUARANTINED if quarantined else OUTCOME_FAILED
+        elif flaky:
+            outcome = OUTCOME_FLAKY
+        else:
+            outcome = OUTCOME_HEALED if retry_count or healed_in_place else OUTCOME_PASSED
+        error = str(last_error).splitlines()[0] if last_error is not None and str(last_error) else None
+        duration = time.perf_counter() - start
+        self.history.record(test_id, outcome, duration, error, heals=retry_count + healed_in_place)
+        event_bus.publish(
+            TEST_FINISHED, test_id=test_id, outcome=outcome, duration=duration, heals=retry_count + healed_in_place
+        )
 
-        return {
-            "status": "failed",
+        result = {
+            "status": "failed" if last_error is not None else "passed",
             "retries": retry_count,
+            "healed_in_place": healed_in_place,
+            "flaky": flaky,
+            "quarantined": quarantined,
             "test_name": test_func.__name__,
-            "error": str(last_error)
+            "screenshots": self.screenshots.screenshots_for(test_func.__name__),
+            "usage": self._get_test_usage(test_id)
         }
+        if last_error is not None:
+            result["error"] = str(last_error)
+        return result
+
+    async def _call_test(self, test_func, page: Page):
+        """Call a sync or async test function"""
+        if asyncio.iscoroutinefunction(test_func):
+            await test_func(page)
+        else:
+            test_func(page)
+
+    async def flake_gate(self, run: Callable[[Page], Awaitable[Any]], test_id: str) -> bool:
+        """
+        Re-run a failed test as is, with relaxed timeouts, before healing it
 
-    async def _capture_failure_context(
+        Each re-run gets a fresh browser context and a plain page (no
+        selector healing), so no LLM call is made.
+
+        Args:
+            run: Runs the test on a page
+            test_id: Test identifier
+
+        Returns:
+            True if a re-run passed (the failure was a flake)
+        """
+        reruns = config.auto_heal.flake_reruns
+        timeout = config.playwright.timeout * config.auto_heal.flake_timeout_factor
+
+        for attempt in range(1, reruns + 1):
+            event_bus.publish(RETRY, test_id=test_id, reason="flake", attempt=attempt)
+            context = await self.browser.new_context()
+            context.set_default_timeout(timeout)
+            try:
+                await run(await context.new_page())
+                logger.warning(f"{test_id} passed on re-run {attempt}/{reruns}: flaky failure, not healed")
+                return True
+            except Exception as e:
+                logger.info(f"Re-run {attempt}/{reruns} of {test_id} failed: {e}")
+            finally:
+                await context.close()
+        return False
+
+    def prepare_page(self, page: Page, test_func, test_id: Optional[str] = None) -> Page:
+        """
+        Prepare a new page for a test
+
+        Collectors start listening to the page and, in override mode, the
+        page is wrapped in a HealingPage: a failing action heals its selector
+        and continues instead of restarting the test, and actions get
+        adaptive timeouts and fail fast on selectors matching nothing.
+
+        Args:
+            page: New Playwright page
+            test_func: Test function the page is handed to
+            test_id: Test identifier (derived from the function if None)
+
+        Returns:
+            The page to hand to the test
+        """
+        self.context_capture.attach(page)
+        if config.auto_heal.heal_mode != "override":
+            return page
+        test_id = test_id or self._get_test_id(test_func)
+        return HealingPage(
+            page,
+            self.heal_map,
+            partial(self._heal_in_place, test_func, test_id, page),
+            on_healed=self._on_healed_in_place,
+            timings=self.timings,
+            may_heal=partial(self._may_heal_in_place, test_id),
+        )
+
+    async def heal_failure(self, page: Page, error: Exception, test_func, attempts: List[Dict[str, Any]]):
+        """
+        Heal a failed test: capture the failure context, patch the source and reload the patched code
+
+        Args:
+            page: Page of the failed test (still open)
+            error: Exception raised by the test
+            test_func: Failed test function
+            attempts: Previous heal attempts of the test, the new one is appended
+
+        Returns:
+            The function to call on retry, None if the test could not be healed
+        """
+        classification = classify_error(error)
+        if not self._routes_to_healer(classification):
+            return None
+
+        # Capture failure context (DOM, accessibility, screenshot, console, network, source)
+        context = await self._capture_failure_context(page, error, test_func, classification)
+        context["test_id"] = self._get_test_id(test_func)
+        context["previous_attempts"] = list(attempts)
+
+        # Analyze and attempt to heal
+        if not await self._attempt_heal(context, page):
+            return None
+
+        attempts.append({"patch_code": context.get("patch_info", {}).get("patch_code")})
+
+        # Run the patched code on retry, not the function loaded before the patch
+        if config.auto_heal.hot_reload:
+            line_number = context.get("patch_info", {}).get("patched_line") or context.get("line_number", 0)
+            return reload_patched_code(test_func, line_number)
+        return test_func
+
+    async def _heal_in_place(
         self,
+        test_func,
+        test_id: str,
         page: Page,
+        selector: str,
+        call_site: str,
         error: Exception,
-        test_func
-    ) -> Dict[str, Any]:
-        """Capture context when test fails"""
-        try:
-            # Get DOM snapshot
-            dom_snapshot = await page.content()
-
-            # Get test file and line number
-            test_file, line_number, original_code = self._get_test_location(test_func, error)
-
-            # Extract failed selector from error message
-            selector = self._extract_selector_from_error(str(error))
-
-            context = {
-                "error": type(error).__name__,
-                "message": str(error),
-                "url": page.url,
-                "dom_snapshot": dom_snapshot,
-                "test_file": str(test_file),
-                "line_number": line_number,
-                "original_code": original_code,
-                "selector": selector,
-                "stack_trace": traceback.format_exc()
-            }
-
-            logger.debug(f"Captured failure context: {context['error']}")
-            return context
+        location: Optional[Tuple[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Heal a selector while the test runs (healer of the selector override layer)
 
-        except Exception as e:
-            logger.error(f"Failed to capture context: {e}")
-            return {
-                "error": type(error).__name__,
-                "message": str(error),
-                "capture_error": str(e)
-            }
-
-    def _get_test_location(self, test_func, error) -> tuple:
-        """Get test file path, line number, and original code"""
-        try:
-            # Get source file
-            source_file = Path(inspect.getfile(test_func))
+        Only called for errors let through by _may_heal_in_place.
 
-            # Get line number from traceback
-            tb = traceback.extract_tb(error.__traceback__)
-            for frame in reversed(tb):
-                if frame.filename == str(source_file):
-                    line_number = frame.lineno
+        Args:
+            test_func: Running test function
+            test_id: Test identifier
+            page: Page of the test
+            selector: Selector that failed
+            call_site: Statement using the selector
+            error: Playwright error raised by the action
+            location: File and line of the statement (the error's traceback has no test frame)
 
-                    # Read the line
-                    with open(source_file, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        if 0 <= line_number - 1 < len(lines):
-                            original_code = lines[line_number - 1].strip()
-                            return source_file, line_number, original_code
+        Returns:
+            Patch information, None if the heal is not confident enough
+        """
+        classification = classify_error(error)
+        context = await self._capture_failure_context(page, error, test_func, classification, location)
+        context["selector"] = selector
+        context["call_site"] = call_site
+        context["test_id"] = test_id
+        context["previous_attempts"] = []
+
+        patch_info = await self.orchestrator.heal_test(context)
+        confidence = patch_info.get("confidence", 0.0)
+        if confidence < config.auto_heal.confidence_threshold:
+            logger.warning(f"Confidence ({confidence:.2f}) below threshold ({config.auto_heal.confidence_threshold})")
+            return None
+
+        # Source location, used to patch the test file in the teardown batch
+        for key in ("test_file", "line_number", "original_code", "source_hash"):
+            patch_info[key] = context.get(key)
+        patch_info = await self._select_candidate(page, selector, patch_info)
+        if patch_info is not None and patch_info.get("candidate_source", SOURCE_LLM) != SOURCE_LLM:
+            # The LLM patch targets its own selector: the call site is rewritten with the winner at teardown
+            patch_info.update(patch_code=None, original_selector=selector, call_site=call_site)
+        return patch_info
+
+    def _may_heal_in_place(self, test_id: str, error: Exception) -> bool:
+        """
+        Heal gate of the selector override layer
+
+        Checked before a heal verified at another call site is reused and
+        before the healer is called: nothing is healed once the LLM budget is
+        exhausted, for a quarantined test, or for an error a new selector
+        cannot fix.
+        """
+        if usage_tracker.budget_exceeded:
+            logger.error("LLM budget for this run exhausted. Healing stopped.")
+            return False
+
+        if self.history.is_quarantined(test_id):
+            logger.warning(f"Test '{test_id}' is quarantined as flaky, selector not healed")
+            return False
 
-            # Fallback
-            return source_file, 1, ""
+        return self._routes_to_healer(classify_error(error))
 
+    async def _select_candidate(
+        self, page: Page, selector: str, patch_info: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Pick the best candidate selector of a heal on the live page
+
+        The LLM selector, its backup selectors, the selectors of the extra
+        analysis samples and selectors derived from the failed one are
+        validated against the page at the same time (see heal_candidates);
+        the best ranked one reaching the confidence threshold replaces the
+        LLM selector, so a wrong first answer does not cost a retry.
+
+        Args:
+            page: Page of the failure (still open)
+            selector: Selector that failed
+            patch_info: Patch information of the heal
+
+        Returns:
+            The patch information with the selected selector and its confidence
+            (`candidate_source` tells where it comes from), None if no candidate
+            confident enough matches the page
+        """
+        limit = config.auto_heal.heal_candidates
+        if limit <= 1 or not selector:
+            return patch_info
+
+        candidates = collect_candidates(patch_info, selector, limit)
+        try:
+            ranked = await rank_candidates(page, candidates)
         except Exception as e:
-            logger.error(f"Failed to get test location: {e}")
-            return Path("unknown"), 0, ""
-
-    def _extract_selector_from_error(self, error_message: str) -> str:
-        """Extract selector from error message"""
-        # Common patterns in Playwright errors
-        patterns = [
-            r'locator\([\'"]([^\'"]+)[\'"]\)',
-            r'selector [\'"]([^\'"]+)[\'"]',
-            r'waiting for selector [\'"]([^\'"]+)[\'"]',
+            logger.warning(f"Candidate selectors could not be validated, keeping the LLM selector: {e}")
+            return patch_info
+        if not ranked:
+            logger.warning(f"None of the {len(candidates)} candidate selector(s) for '{selector}' matches the page")
+            return None
+
+        threshold = config.auto_heal.confidence_threshold
+        confident = [candidate for candidate in ranked if candidate.confidence >= threshold]
+        if not confident:
+            logger.warning(
+                f"None of the {len(ranked)} candidate selector(s) matching the page for '{selector}' reaches "
+                f"the confidence threshold ({threshold})"
+            )
+            return None
+
+        best = confident[0]
+        patch_info["candidates"] = [candidate.model_dump() for candidate in ranked]
+        patch_info["candidate_source"] = best.source
+        if best.source != SOURCE_LLM:
+            logger.info(
+                f"Candidate '{best.selector}' ({best.source}) ranks above the LLM selector "
+                f"'{patch_info.get('selector')}'"
+            )
+            patch_info.update(
+                selector=best.selector,
+                selector_method=best.method,
+                confidence=best.confidence,
+                explanation=f"{patch_info.get('explanation') or ''} (best of {len(ranked)} candidate selector(s): "
+                            f"{best.source}, {best.matches} match(es))".strip(),
+            )
+        return patch_info
+
+    def _routes_to_healer(self, classification: ErrorClassification) -> bool:
+        """True if an error goes to the healer, False for the classes a new selector cannot fix"""
+        if classification.healable:
+            logger.info(f"{classification.error_class} error on '{classification.selector}', healing")
+            return True
+        logger.warning(f"{classification.error_class} error, not healed: {classification.skip_reason}")
+        return False
+
+    def _on_healed_in_place(self, patch_info: Dict[str, Any]):
+        """Record a validated in-place heal and queue its source patch"""
+        test_file = patch_info.get("test_file")
+        if patch_info.get("original_selector"):
+            # Propagated heal or selected candidate: no LLM patch for this selector, the call site is rewritten
+            patch = self._rewrite_patch(patch_info)
+        elif test_file and patch_info.get("patch_code"):
+            patch = PatchRequest(
+                test_file=Path(test_file),
+                line_number=patch_info.get("line_number") or 0,
+                original_code=patch_info.get("original_code") or "",
+                patch_code=patch_info["patch_code"],
+                patch_info=patch_info,
+                expected_hash=patch_info.get("source_hash")
+            )
+        else:
+            patch = None
+
+        event_bus.publish(
+            RETRY, reason="propagated" if patch_info.get("propagated_from") else "in_place",
+            test_file=test_file, selector=patch_info.get("selector"), call_site=patch_info.get("call_site"),
+        )
+        if config.auto_heal.override_patch_source and patch is not None:
+            self.patch_session.queue(patch)
+        else:
+            self.patch_manager.ledger.record(test_file or "unknown", patch_info, outcome=OUTCOME_OVERRIDE)
+        if patch_info.get("propagated_from"):
+            logger.success(f"Selector healed in place with the heal verified at {patch_info['propagated_from']}")
+        else:
+            logger.success(f"Selector healed in place with confidence {patch_info.get('confidence', 0.0):.2f}")
+
+    def _rewrite_patch(self, patch_info: Dict[str, Any]) -> Optional[PatchRequest]:
+        """
+        Source patch rewriting the selector of a call site
+
+        Used when there is no LLM patch for the healed selector: the call
+        site reuses the heal of another one, or a candidate other than the
+        LLM selector was selected.
+        """
+        site = patch_info["call_site"]
+        if not patch_info.get("test_file"):
+            logger.warning(f"No source file known for {site}, '{patch_info['original_selector']}' kept as an override")
+            return None
+        usages = [
+            usage for usage in self.selector_index.file_usages(Path(patch_info["test_file"]))
+            if usage.call_site == site and usage.selector == patch_info["original_selector"]
         ]
+        patches, _ = self.selector_index.patches([(usage, patch_info) for usage in usages[:1]])
+        if not patches:
+            logger.warning(f"'{patch_info['original_selector']}' cannot be rewritten at {site}, kept as an override")
+            return None
+        return patches[0]
+
+    def _rewrite_failing_line(self, test_file: Path, context: Dict[str, Any], patch_info: Dict[str, Any]) -> bool:
+        """
+        Replace the LLM patch by the failing line rewritten with the selected candidate
 
-        for pattern in patterns:
-            import re
-            match = re.search(pattern, error_message)
-            if match:
-                return match.group(1)
+        Returns:
+            False if the line has no selector usage that can be rewritten
+        """
+        line_number = context.get("line_number", 0)
+        usages = [usage for usage in self.selector_index.file_usages(test_file) if usage.line == line_number]
+        matching = [usage for usage in usages if usage.selector == context.get("selector")]
+        usages = matching or (usages if len(usages) == 1 else [])
+        patches, _ = self.selector_index.patches([(usage, patch_info) for usage in usages[:1]])
+        if not patches:
+            logger.error(f"Line {line_number} of {test_file} cannot be rewritten with '{patch_info['selector']}'")
+            return False
+        patch_info["patch_code"] = patches[0].patch_code
+        return True
+
+    def _get_test_id(self, test_func) -> str:
+        """Build a stable identifier for a test function"""
+        try:
+            source_file = inspect.getfile(test_func)
+        except TypeError:
+            source_file = "unknown"
+        return f"{source_file}::{getattr(test_func, '__qualname__', test_func.__name__)}"
 
-        return "unknown"
+    def _get_test_usage(self, test_id: str) -> Dict[str, Any]:
+        """Get the LLM usage rolled up for a test"""
+        totals = usage_tracker.by_test.get(test_id)
+        return totals.model_dump() if totals else {}
 
-    async def _attempt_heal(self, context: Dict[str, Any]) -> bool:
+    async def _capture_failure_context(
+        self,
+        page: Page,
+        error: Exception,
+        test_func,
+        classification: Optional[ErrorClassification] = None,
+        location: Optional[Tuple[str, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Capture context when test fails (collectors run concurrently)
+
+        The failing statement is located from the error's traceback, or at
+        `location` (file, line) when the failure was caught by the selector
+        override proxy.
+        """
+        start = time.perf_counter()
+        classification = classification or classify_error(error)
+        base = {
+            "error": type(error).__name__,
+            "message": str(error),
+            "url": page.url,
+            "selector": classification.selector,
+            "error_class": classification.error_class,
+            "hint": classification.hint,
+            "stack_trace": "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        }
+        if classification.locator is not None:
+            base["locator_method"] = classification.locator.method
+        if classification.matches is not None:
+            base["matches"] = classification.matches
+        if location is not None:
+            base["call_location"] = location
+        context = await self.context_capture.capture(page, error, test_func, base)
+        event_bus.publish(
+            FAILURE_CAPTURED, test_id=self._get_test_id(test_func), error_class=classification.error_class,
+            selector=classification.selector, url=page.url, seconds=time.perf_counter() - start,
+        )
+
+        logger.debug(f"Captured failure context: {context['error']}")
+        return context
+
+    async def _attempt_heal(self, context: Dict[str, Any], page: Optional[Page] = None) -> bool:
         """
         Attempt to heal the failing test
 
         Args:
             context: Failure context
+            page: Page of the failure, to select the best candidate selector on it
 
         Returns:
             True if healing successful, False otherwise
@@ -228,6 +604,7 @@ class AutoHealTestRunner:
 
         # Analyze with Agents
         patch_info = await self.orchestrator.heal_test(context)
+        context["patch_info"] = patch_info
 
         # Check confidence
         confidence = patch_info.get("confidence", 0.0)
@@ -242,12 +619,27 @@ class AutoHealTestRunner:
             logger.error(f"Test file not found: {test_file}")
             return False
 
+        if page is not None:
+            llm_patch_info = dict(patch_info)
+            patch_info = await self._select_candidate(page, context.get("selector"), patch_info)
+            if patch_info is None:
+                logger.error("No confident candidate selector matches the page, patch not applied")
+                return False
+            if patch_info.get("candidate_source", SOURCE_LLM) != SOURCE_LLM:
+                if not self._rewrite_failing_line(test_file, context, patch_info):
+                    if not any(candidate["source"] == SOURCE_LLM for candidate in patch_info["candidates"]):
+                        return False
+                    logger.info("Falling back to the LLM patch, its selector matches the page too")
+                    patch_info = llm_patch_info
+            context["patch_info"] = patch_info
+
         success = self.patch_manager.apply_patch(
             test_file=test_file,
             line_number=context.get("line_number", 0),
             original_code=context.get("original_code", ""),
             patch_code=patch_info.get("patch_code", ""),
-            patch_info=patch_info
+            patch_info=patch_info,
+            expected_hash=context.get("source_hash")
         )
 
         if not success:
@@ -258,7 +650,7 @@ class AutoHealTestRunner:
         if config.auto_heal.auto_commit:
             self.patch_manager.commit_changes(test_file, patch_info)
 
-        logger.success(f"Test healed with confidence {confidence:.2f}")
+        logger.success(f"Test healed with confidence {patch_info.get('confidence', 0.0):.2f}")
         return True
 
 
@@ -287,246 +679,3 @@ async def run_test_example():
 
 if __name__ == "__main__":
     asyncio.run(run_test_example())
-"""
-Patch Manager - Handles creation and application of test patches
-"""
-import shutil
-import re
-from typing import Dict, Any, Optional
-from pathlib import Path
-from datetime import datetime
-import git
-from git.exc import GitCommandError
-
-from .config import config
-from .logger import get_logger
-
-logger = get_logger(__name__)
-
-
-class PatchManager:
-    """Manages test patches and Git integration"""
-
-    def __init__(self):
-        self.patch_dir = config.auto_heal.patch_dir
-        self.backup_dir = config.auto_heal.backup_dir
-        self.repo = self._init_repo()
-
-    def _init_repo(self) -> Optional[git.Repo]:
-        """Initialize Git repository"""
-        try:
-            repo = git.Repo(search_parent_directories=True)
-            logger.info(f"Git repo found at: {repo.working_dir}")
-            return repo
-        except git.InvalidGitRepositoryError:
-            logger.warning("Not a git repository. Auto-commit disabled.")
-            return None
-
-    def create_backup(self, file_path: Path) -> Path:
-        """
-        Create backup of test file before patching
-
-        Args:
-            file_path: Path to the file to backup
-
-        Returns:
-            Path to the backup file
-        """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{file_path.stem}_{timestamp}{file_path.suffix}"
-        backup_path = self.backup_dir / backup_name
-
-        shutil.copy2(file_path, backup_path)
-        logger.info(f"Backup created: {backup_path}")
-
-        return backup_path
-
-    def apply_patch(
-        self,
-        test_file: Path,
-        line_number: int,
-        original_code: str,
-        patch_code: str,
-        patch_info: Dict[str, Any]
-    ) -> bool:
-        """
-        Apply patch to test file
-
-        Args:
-            test_file: Path to the test file
-            line_number: Line number where the error occurred
-            original_code: Original code that failed
-            patch_code: New code to apply
-            patch_info: Full patch information from LLM
-
-        Returns:
-            True if patch applied successfully, False otherwise
-        """
-        try:
-            # Create backup
-            backup_path = self.create_backup(test_file)
-
-            # Read file content
-            with open(test_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # Find and replace the failing line
-            if line_number > 0 and line_number <= len(lines):
-                # Try exact match first
-                if self._normalize_code(lines[line_number - 1]) == self._normalize_code(original_code):
-                    lines[line_number - 1] = patch_code if patch_code.endswith('\n') else patch_code + '\n'
-                    logger.info(f"Exact match found at line {line_number}")
-                else:
-                    # Try fuzzy match
-                    found = False
-                    for i, line in enumerate(lines):
-                        if self._normalize_code(line) == self._normalize_code(original_code):
-                            lines[i] = patch_code if patch_code.endswith('\n') else patch_code + '\n'
-                            logger.info(f"Fuzzy match found at line {i + 1}")
-                            found = True
-                            break
-
-                    if not found:
-                        logger.error(f"Could not find matching line in {test_file}")
-                        return False
-            else:
-                logger.error(f"Invalid line number: {line_number}")
-                return False
-
-            # Write patched content
-            with open(test_file, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
-
-            # Save patch metadata
-            self._save_patch_metadata(test_file, patch_info, backup_path)
-
-            logger.success(f"Patch applied to {test_file}")
-            return True
-
-        except Exception as e:
-            logger.error(f"Failed to apply patch: {e}")
-            return False
-
-    def _normalize_code(self, code: str) -> str:
-        """Normalize code for comparison (remove extra whitespace)"""
-        return ' '.join(code.split())
-
-    def _save_patch_metadata(
-        self,
-        test_file: Path,
-        patch_info: Dict[str, Any],
-        backup_path: Path
-    ):
-        """Save patch metadata for tracking"""
-        timestamp = datetime.now().isoformat()
-        metadata = {
-            "timestamp": timestamp,
-            "test_file": str(test_file),
-            "backup_file": str(backup_path),
-            "selector": patch_info.get("selector"),
-            "selector_method": patch_info.get("selector_method"),
-            "confidence": patch_info.get("confidence"),
-            "explanation": patch_info.get("explanation"),
-            "patch_code": patch_info.get("patch_code")
-        }
-
-        # Save as JSON
-        import json
-        metadata_file = self.patch_dir / f"patch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
-
-        logger.info(f"Patch metadata saved: {metadata_file}")
-
-    def commit_changes(self, test_file: Path, patch_info: Dict[str, Any]) -> bool:
-        """
-        Commit changes to Git
-
-        Args:
-            test_file: Path to the modified test file
-            patch_info: Patch information
-
-        Returns:
-            True if committed successfully, False otherwise
-        """
-        if not config.auto_heal.auto_commit:
-            logger.info("Auto-commit disabled")
-            return False
-
-        if not self.repo:
-            logger.warning("No Git repository available")
-            return False
-
-        try:
-            # Stage the file
-            self.repo.index.add([str(test_file)])
-
-            # Create commit message
-            commit_msg = self._create_commit_message(test_file, patch_info)
-
-            # Commit
-            self.repo.index.commit(commit_msg)
-            logger.success(f"Changes committed: {commit_msg[:50]}...")
-
-            return True
-
-        except GitCommandError as e:
-            logger.error(f"Git commit failed: {e}")
-            return False
-
-    def _create_commit_message(self, test_file: Path, patch_info: Dict[str, Any]) -> str:
-        """Create descriptive commit message"""
-        selector = patch_info.get("selector", "unknown")
-        confidence = patch_info.get("confidence", 0.0)
-        explanation = patch_info.get("explanation", "No explanation")
-
-        return f"""[Auto-Heal] Fix selector in {test_file.name}
-
-Selector: {selector}
-Confidence: {confidence:.2f}
-Method: {patch_info.get('selector_method', 'unknown')}
-
-Explanation:
-{explanation}
-
-Auto-generated by Playwright Auto-Heal Framework
-"""
-
-    def create_pull_request(self, test_file: Path, patch_info: Dict[str, Any]) -> bool:
-        """
-        Create pull request for the patch (GitHub integration)
-
-        Args:
-            test_file: Path to the modified test file
-            patch_info: Patch information
-
-        Returns:
-            True if PR created successfully, False otherwise
-        """
-        if not config.auto_heal.auto_pr:
-            logger.info("Auto-PR disabled")
-            return False
-
-        # TODO: Implement GitHub API integration
-        logger.warning("Pull request creation not yet implemented")
-        return False
-
-    def restore_backup(self, backup_path: Path, original_path: Path) -> bool:
-        """
-        Restore file from backup
-
-        Args:
-            backup_path: Path to the backup file
-            original_path: Path to restore to
-
-        Returns:
-            True if restored successfully, False otherwise
-        """
-        try:
-            shutil.copy2(backup_path, original_path)
-            logger.success(f"Restored {original_path} from backup")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to restore backup: {e}")
-            return False
-
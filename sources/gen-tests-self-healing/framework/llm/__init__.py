@@ -1,7 +1,27 @@
 """
 LLM integration components
+
+Provider SDKs (openai, anthropic) are loaded on first access (PEP 562).
 """
-from .llm_analyzer import LLMAnalyzer
+from importlib import import_module
+
+_LAZY_ATTRIBUTES = {
+    "LLMAnalyzer": ".llm_analyzer",
+    "UsageTracker": ".usage",
+    "usage_tracker": ".usage",
+}
+
+__all__ = ["LLMAnalyzer", "UsageTracker", "usage_tracker"]
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-__all__ = ["LLMAnalyzer"]
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
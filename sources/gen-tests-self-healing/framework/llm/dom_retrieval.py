@@ -0,0 +1,333 @@
+"""
+DOM Retrieval - Select the DOM elements relevant to a failure with local hashed embeddings
+"""
+import math
+import re
+import zlib
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from ..core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Dimension of the hashed feature space
+DIMENSIONS = 2 ** 14
+
+# Characters of an element's own text kept in its features and in the prompt
+MAX_TEXT = 120
+
+# Attributes describing an element; the others (style, event handlers, data blobs) are noise
+ATTRIBUTES = (
+    "id", "class", "name", "type", "role", "href", "src", "alt", "title", "value", "for", "placeholder",
+    "aria-label", "aria-labelledby", "data-testid", "data-test", "data-test-id", "data-qa", "data-cy",
+)
+
+# Attributes shown on the ancestors of a retrieved element
+ANCESTOR_ATTRIBUTES = ("id", "class", "role", "name", "data-testid", "aria-label")
+
+# Elements never rendered and never retrieved
+SKIPPED_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "head", "meta", "link"})
+
+# Elements without end tag
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+})
+
+# Implicit ARIA role of the common elements (explicit `role` attributes take precedence)
+IMPLICIT_ROLES = {
+    "a": "link", "button": "button", "select": "combobox", "textarea": "textbox", "img": "img",
+    "nav": "navigation", "form": "form", "table": "table", "ul": "list", "ol": "list", "li": "listitem",
+    "h1": "heading", "h2": "heading", "h3": "heading", "h4": "heading", "h5": "heading", "h6": "heading",
+    "dialog": "dialog", "main": "main", "header": "banner", "footer": "contentinfo", "option": "option",
+}
+INPUT_ROLES = {"checkbox": "checkbox", "radio": "radio", "submit": "button", "button": "button", "range": "slider"}
+
+# Words of the test code that say nothing about the element (Playwright API, Python keywords)
+STOP_WORDS = frozenset({
+    "page", "await", "async", "self", "locator", "get", "by", "test", "id", "nth", "first", "last", "filter",
+    "expect", "to", "be", "have", "is", "the", "and", "or", "not", "true", "false", "none", "timeout",
+    "exact", "name", "has", "fill", "click", "press", "check", "hover", "wait", "for", "selector", "internal",
+    "css", "xpath", "text", "role", "label", "placeholder", "alt", "title",
+})
+
+_WORD_RE = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+|[^\W\d_]+", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+class DOMElement(BaseModel):
+    """An element of a DOM snapshot"""
+    index: int = Field(description="Position in document order")
+    tag: str = Field(description="Tag name")
+    attributes: Dict[str, str] = Field(default_factory=dict, description="Descriptive attributes (see ATTRIBUTES)")
+    text: str = Field(default="", description="Own text of the element (not of its children)")
+    parent: Optional[int] = Field(default=None, description="Index of the parent element")
+    depth: int = Field(default=0, description="Depth in the document")
+
+    @property
+    def role(self) -> Optional[str]:
+        if self.attributes.get("role"):
+            return self.attributes["role"]
+        if self.tag == "input":
+            return INPUT_ROLES.get(self.attributes.get("type", "text"), "textbox")
+        if self.tag == "a" and "href" not in self.attributes:
+            return None
+        return IMPLICIT_ROLES.get(self.tag)
+
+    def describe(self) -> str:
+        """Text embedded for the element: tag, role, attributes and own text"""
+        values = " ".join(f"{name} {value}" for name, value in self.attributes.items())
+        return f"{self.tag} {self.role or ''} {values} {self.text}"
+
+    def render(self, attributes: Sequence[str] = ATTRIBUTES, text: bool = True) -> str:
+        """Opening tag of the element, with its own text"""
+        shown = "".join(
+            f' {name}="{self.attributes[name]}"' for name in attributes if name in self.attributes
+        )
+        content = f"{self.text}</{self.tag}>" if text and self.text and self.tag not in VOID_TAGS else ""
+        return f"<{self.tag}{shown}>{content}"
+
+
+class _ElementParser(HTMLParser):
+    """Flattens a DOM snapshot into its elements, tolerating unclosed tags"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.elements: List[DOMElement] = []
+        self._open: List[int] = []
+        self._skipping: Optional[str] = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if self._skipping:
+            if tag == self._skipping:
+                self._skip_depth += 1
+            return
+        if tag in SKIPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self._skipping, self._skip_depth = tag, 1
+            return
+
+        attributes = {
+            name: _SPACE_RE.sub(" ", value).strip()[:MAX_TEXT]
+            for name, value in attrs if name in ATTRIBUTES and value
+        }
+        parent = self._open[-1] if self._open else None
+        element = DOMElement(
+            index=len(self.elements), tag=tag, attributes=attributes, parent=parent, depth=len(self._open)
+        )
+        self.elements.append(element)
+        if tag not in VOID_TAGS:
+            self._open.append(element.index)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and not self._skipping and self._open and self.elements[self._open[-1]].tag == tag:
+            self._open.pop()
+
+    def handle_endtag(self, tag: str):
+        if self._skipping:
+            if tag == self._skipping:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skipping = None
+            return
+        # Close up to the matching open tag (implicitly closing the unclosed ones)
+        for position in range(len(self._open) - 1, -1, -1):
+            if self.elements[self._open[position]].tag == tag:
+                del self._open[position:]
+                return
+
+    def handle_data(self, data: str):
+        if self._skipping or not self._open:
+            return
+        text = _SPACE_RE.sub(" ", data).strip()
+        if text:
+            element = self.elements[self._open[-1]]
+            if len(element.text) < MAX_TEXT:
+                element.text = f"{element.text} {text}".strip()[:MAX_TEXT]
+
+
+def parse_elements(html: str) -> List[DOMElement]:
+    """Elements of a DOM snapshot, in document order"""
+    parser = _ElementParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"DOM snapshot partially parsed: {e}")
+    return parser.elements
+
+
+@lru_cache(maxsize=1)
+def _load_numpy():
+    """NumPy, None if it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        logger.debug("NumPy not installed, DOM retrieval uses pure Python similarity")
+        return None
+    return numpy
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text, camelCase, snake_case and kebab-case split"""
+    return [word.lower() for word in _WORD_RE.findall(text or "")]
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str) -> Tuple[int, float]:
+    """Hashed index and sign of a feature (stable across processes, unlike hash())"""
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % DIMENSIONS, 1.0 if digest & 0x80000000 else -1.0
+
+
+def features(text: str, stop_words: frozenset = frozenset()) -> Dict[str, int]:
+    """
+    Features of a text: its words and their character trigrams
+
+    Trigrams make `submitBtn`, `submit-button` and `btn-submit` close
+    without any trained model.
+    """
+    counts: Dict[str, int] = {}
+    for word in tokenize(text):
+        if word in stop_words:
+            continue
+        counts[word] = counts.get(word, 0) + 1
+        padded = f"^{word}$"
+        for position in range(len(padded) - 2):
+            trigram = f"#{padded[position:position + 3]}"
+            counts[trigram] = counts.get(trigram, 0) + 1
+    return counts
+
+
+class DOMRetriever:
+    """
+    Finds the elements of a DOM snapshot nearest to a query (failed selector, test code)
+
+    Each element is embedded with a hashing vectorizer over its tag, role,
+    attributes and own text, weighted by inverse document frequency over
+    the snapshot (so `div` and `container` weigh little); the query is
+    embedded the same way and elements are ranked by cosine similarity.
+    Nothing leaves the machine and no model is loaded.
+    """
+
+    def __init__(self, html: str):
+        self._all = parse_elements(html)
+        self.elements = [element for element in self._all if element.tag not in ("html", "body")]
+        self._features = [features(element.describe()) for element in self.elements]
+        self._idf = self._inverse_frequencies()
+        self._vectors = [self._vector(element_features) for element_features in self._features]
+        self._matrix = self._sparse_matrix()
+
+    def _sparse_matrix(self):
+        """Element vectors as NumPy (row, bucket, value) arrays, None without NumPy"""
+        numpy = _load_numpy()
+        if numpy is None:
+            return None
+        rows = numpy.repeat(numpy.arange(len(self._vectors)), [len(vector) for vector in self._vectors])
+        buckets = numpy.fromiter((bucket for vector in self._vectors for bucket in vector), dtype=numpy.int64)
+        values = numpy.fromiter(
+            (value for vector in self._vectors for value in vector.values()), dtype=numpy.float64
+        )
+        return rows, buckets, values
+
+    def _inverse_frequencies(self) -> Dict[str, float]:
+        frequencies: Dict[str, int] = {}
+        for element_features in self._features:
+            for feature in element_features:
+                frequencies[feature] = frequencies.get(feature, 0) + 1
+        total = len(self._features)
+        return {feature: math.log((1 + total) / (1 + count)) + 1 for feature, count in frequencies.items()}
+
+    def _vector(self, counts: Dict[str, int]) -> Dict[int, float]:
+        """Sparse hashed TF-IDF vector, L2-normalized"""
+        vector: Dict[int, float] = {}
+        for feature, count in counts.items():
+            idf = self._idf.get(feature)
+            if idf is None:
+                # Unknown to the snapshot: cannot match any element
+                continue
+            bucket, sign = _bucket(feature)
+            vector[bucket] = vector.get(bucket, 0.0) + sign * (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {bucket: value / norm for bucket, value in vector.items()} if norm else {}
+
+    def search(self, query: str, top_k: int) -> List[Tuple[DOMElement, float]]:
+        """
+        Elements most similar to a query
+
+        Returns:
+            Up to top_k (element, cosine similarity) pairs, most similar first
+            (elements sharing no feature with the query are left out)
+        """
+        query_vector = self._vector(features(query, STOP_WORDS))
+        if not query_vector or not self.elements:
+            return []
+
+        if self._matrix is not None:
+            # Sparse element vectors dotted with the dense query vector
+            numpy = _load_numpy()
+            rows, buckets, values = self._matrix
+            query_array = numpy.zeros(DIMENSIONS)
+            query_array[list(query_vector)] = list(query_vector.values())
+            scores = numpy.bincount(rows, weights=values * query_array[buckets], minlength=len(self._vectors))
+            count = min(top_k, len(scores))
+            best = numpy.argpartition(-scores, count - 1)[:count]
+            ranked = [(int(row), float(scores[row])) for row in best[numpy.argsort(-scores[best])]]
+        else:
+            scores = [
+                sum(value * query_vector.get(bucket, 0.0) for bucket, value in vector.items())
+                for vector in self._vectors
+            ]
+            ranked = sorted(enumerate(scores), key=lambda item: -item[1])[:top_k]
+        return [(self.elements[row], score) for row, score in ranked if score > 0]
+
+    def render(self, matches: List[Tuple[DOMElement, float]]) -> str:
+        """
+        Outline of the matched elements and their ancestors, in document order
+
+        Ancestors show their identifying attributes only; matched elements
+        show their descriptive attributes, own text and similarity.
+        """
+        scores = {element.index: score for element, score in matches}
+        shown = set(scores)
+        for element, _ in matches:
+            parent = element.parent
+            while parent is not None and parent not in shown:
+                shown.add(parent)
+                parent = self._all[parent].parent
+
+        lines = []
+        for index in sorted(shown):
+            element = self._all[index]
+            if index in scores:
+                lines.append(f"{'  ' * element.depth}{element.render()}  <!-- similarity {scores[index]:.2f} -->")
+            else:
+                lines.append(f"{'  ' * element.depth}{element.render(ANCESTOR_ATTRIBUTES, text=False)}")
+        return "\n".join(lines)
+
+
+def relevant_dom(html: str, query: str, top_k: int) -> str:
+    """
+    Outline of the DOM elements nearest to a query, with their ancestors
+
+    Args:
+        html: DOM snapshot
+        query: Failed selector and test code
+        top_k: Number of elements retrieved
+
+    Returns:
+        The outline, empty if no element resembles the query
+    """
+    retriever = DOMRetriever(html)
+    matches = retriever.search(query, top_k)
+    if not matches:
+        return ""
+    logger.debug(
+        f"DOM retrieval: {len(matches)}/{len(retriever.elements)} element(s) kept, best similarity {matches[0][1]:.2f}"
+    )
+    return retriever.render(matches)
@@ -2,13 +2,17 @@
 LLM Analyzer - Analyzes test failures and generates patches
 """
 import json
+import time
 from typing import Dict, Any, Optional
 from pathlib import Path
 import openai
 from anthropic import Anthropic
 
 from ..core.config import config
+from ..core.event_bus import LLM_REQUEST, event_bus
 from ..core.logger import get_logger
+from .prompt_builder import PromptBuilder
+from .usage import extract_usage, get_project_name, usage_tracker
 
 logger = get_logger(__name__)
 
@@ -18,6 +22,7 @@ class LLMAnalyzer:
 
     def __init__(self):
         self.provider = config.llm.provider
+        self._last_response = None
         self.setup_client()
 
     def setup_client(self):
@@ -60,13 +65,17 @@ class LLMAnalyzer:
         """
         logger.info(f"Analyzing failure with {self.provider}")
 
-        # Truncate DOM snapshot if too large
-        dom_snapshot = context.get("dom_snapshot", "")
-        if len(dom_snapshot) > 50000:
-            dom_snapshot = dom_snapshot[:50000] + "\n... [DOM truncated for brevity]"
+        if usage_tracker.budget_exceeded:
+            logger.warning("LLM budget for this run exhausted, skipping analysis")
+            return self._create_fallback_result("LLM budget exceeded")
 
-        prompt = self._build_prompt(context, dom_snapshot)
+        prompt = self._build_prompt(context)
 
+        self._last_response = None
+        event_bus.publish(
+            LLM_REQUEST, test_id=context.get("test_id"), operation="analysis", model=getattr(self, "model", "unknown")
+        )
+        start = time.perf_counter()
         try:
             if self.provider == "openai":
                 result = await self._analyze_with_openai(prompt)
@@ -75,6 +84,19 @@ class LLMAnalyzer:
             else:
                 raise ValueError(f"Unknown provider: {self.provider}")
 
+            usage = extract_usage(
+                self._last_response,
+                model=getattr(self, "model", "unknown"),
+                operation="analysis",
+                latency_ms=(time.perf_counter() - start) * 1000,
+            )
+            usage_tracker.record(
+                usage,
+                test_id=context.get("test_id"),
+                project=get_project_name(context.get("test_file")),
+            )
+            result["usage"] = usage.model_dump()
+
             logger.info(f"Analysis complete. Confidence: {result.get('confidence', 0)}")
             return result
 
@@ -87,30 +109,13 @@ class LLMAnalyzer:
                 "error": str(e)
             }
 
-    def _build_prompt(self, context: Dict[str, Any], dom_snapshot: str) -> str:
-        """Build prompt for LLM"""
-        return f"""You are an expert test automation engineer specializing in Playwright with Python.
-
-A Playwright test has failed with the following context:
+    def _build_prompt(self, context: Dict[str, Any]) -> str:
+        """Build prompt for LLM within the configured token budget"""
+        header = """You are an expert test automation engineer specializing in Playwright with Python.
 
-**Error Type:** {context.get('error', 'Unknown')}
-**Error Message:** {context.get('message', 'Unknown')}
-**URL:** {context.get('url', 'Unknown')}
-**Failed Selector:** {context.get('selector', 'Unknown')}
-**Test File:** {context.get('test_file', 'Unknown')}
-**Line Number:** {context.get('line_number', 'Unknown')}
+A Playwright test has failed with the following context:"""
 
-**DOM Snapshot (at time of failure):**
-```html
-{dom_snapshot}
-```
-
-**Original Code (that failed):**
-```python
-{context.get('original_code', 'Unknown')}
-```
-
-Your task is to:
+        footer = """Your task is to:
 1. Analyze why the selector failed
 2. Propose an alternative, more robust selector (prefer text-based or role-based selectors)
 3. Generate a minimal Python patch to fix the issue
@@ -124,17 +129,19 @@ Your task is to:
 - The patch should be valid Python code that can be directly inserted
 
 Return your response as a JSON object with this exact structure:
-{{
+{
     "selector": "the new selector string",
     "selector_method": "the Playwright method to use (e.g., 'get_by_role', 'get_by_text', 'locator')",
     "patch_code": "complete line(s) of Python code to replace the failing line",
     "explanation": "brief explanation of why the original failed and why this will work",
     "confidence": 0.9,
     "alternative_selectors": ["backup option 1", "backup option 2"]
-}}
+}
 
-Respond ONLY with valid JSON, no additional text.
-"""
+Respond ONLY with valid JSON, no additional text."""
+
+        builder = PromptBuilder(model=getattr(self, "model", None))
+        return builder.add_failure_context(context).build(header=header, footer=footer)
 
     async def _analyze_with_openai(self, prompt: str) -> Dict[str, Any]:
         """Analyze using OpenAI API"""
@@ -148,6 +155,7 @@ Respond ONLY with valid JSON, no additional text.
                 temperature=config.llm.temperature,
                 max_tokens=config.llm.max_tokens
             )
+            self._last_response = response
 
             content = response.choices[0].message.content.strip()
 
@@ -179,6 +187,7 @@ Respond ONLY with valid JSON, no additional text.
                     {"role": "user", "content": prompt}
                 ]
             )
+            self._last_response = message
 
             content = message.content[0].text.strip()
 
@@ -209,66 +218,3 @@ Respond ONLY with valid JSON, no additional text.
             "alternative_selectors": [],
             "error": error_msg
         }
-"""
-Configuration for Playwright Auto-Heal Framework
-"""
-import os
-from pathlib import Path
-from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-
-# Load environment variables
-load_dotenv()
-
-class PlaywrightConfig(BaseModel):
-    """Playwright configuration"""
-    headless: bool = Field(default_factory=lambda: os.getenv("HEADLESS", "true").lower() == "true")
-    slow_mo: int = Field(default_factory=lambda: int(os.getenv("SLOW_MO", "0")))
-    timeout: int = Field(default_factory=lambda: int(os.getenv("TIMEOUT", "30000")))
-    trace_dir: Path = Field(default=Path("traces"))
-    screenshot_dir: Path = Field(default=Path("screenshots"))
-
-class LLMConfig(BaseModel):
-    """LLM configuration"""
-    provider: str = Field(default_factory=lambda: os.getenv("LLM_PROVIDER", "openai"))
-    openai_api_key: str = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY", ""))
-    openai_model: str = Field(default_factory=lambda: os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
-    anthropic_api_key: str = Field(default_factory=lambda: os.getenv("ANTHROPIC_API_KEY", ""))
-    anthropic_model: str = Field(default_factory=lambda: os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229"))
-    temperature: float = 0.0
-    max_tokens: int = 1000
-
-class AutoHealConfig(BaseModel):
-    """Auto-heal configuration"""
-    auto_commit: bool = Field(default_factory=lambda: os.getenv("AUTO_COMMIT", "true").lower() == "true")
-    auto_pr: bool = Field(default_factory=lambda: os.getenv("AUTO_PR", "false").lower() == "true")
-    confidence_threshold: float = Field(default_factory=lambda: float(os.getenv("CONFIDENCE_THRESHOLD", "0.7")))
-    max_retries: int = Field(default_factory=lambda: int(os.getenv("MAX_RETRIES", "3")))
-    patch_dir: Path = Field(default=Path("patches"))
-    backup_dir: Path = Field(default=Path("backups"))
-
-class Config:
-    """Main configuration class"""
-    def __init__(self):
-        self.playwright = PlaywrightConfig()
-        self.llm = LLMConfig()
-        self.auto_heal = AutoHealConfig()
-
-        # Create necessary directories
-        self._create_directories()
-
-    def _create_directories(self):
-        """Create necessary directories if they don't exist"""
-        directories = [
-            self.playwright.trace_dir,
-            self.playwright.screenshot_dir,
-            self.auto_heal.patch_dir,
-            self.auto_heal.backup_dir,
-            Path("logs")
-        ]
-        for directory in directories:
-            directory.mkdir(parents=True, exist_ok=True)
-
-# Global config instance
-config = Config()
-
@@ -0,0 +1,260 @@
+"""
+Prompt Builder - Token-budget-aware prompt assembly
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from ..core.config import config
+from ..core.logger import get_logger
+from .dom_retrieval import relevant_dom
+
+logger = get_logger(__name__)
+
+# Context piece priorities (higher = kept first when the budget is tight)
+PRIORITY_ERROR = 100
+PRIORITY_CODE = 90
+PRIORITY_SOURCE_CONTEXT = 70
+PRIORITY_PREVIOUS_ATTEMPTS = 60
+PRIORITY_DOM = 50
+PRIORITY_NETWORK = 45
+PRIORITY_ACCESSIBILITY = 40
+PRIORITY_CONSOLE = 35
+PRIORITY_STACK_TRACE = 30
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_SVG_RE = re.compile(r"<svg\b[^>]*>.*?</svg\s*>", re.IGNORECASE | re.DOTALL)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+_TAG_GAP_RE = re.compile(r">\s+<")
+
+
+def compact_html(html: str) -> str:
+    """Remove content that never helps selector repair (scripts, styles, comments, SVG, whitespace)"""
+    if not html:
+        return ""
+    html = _SCRIPT_STYLE_RE.sub("", html)
+    html = _SVG_RE.sub("<svg></svg>", html)
+    html = _COMMENT_RE.sub("", html)
+    html = _WHITESPACE_RE.sub(" ", html)
+    return _TAG_GAP_RE.sub("><", html).strip()
+
+
+class TokenCounter:
+    """Counts tokens with the target model's tokenizer (tiktoken when available)"""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or config.llm.openai_model
+        self.encoding = self._get_encoding(self.model)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _get_encoding(model: str):
+        """Load the tokenizer for a model, None if tiktoken is not installed"""
+        try:
+            import tiktoken
+        except ImportError:
+            logger.debug("tiktoken not installed, using approximate token counts")
+            return None
+
+        try:
+            try:
+                return tiktoken.encoding_for_model(model.split("/")[-1])
+            except KeyError:
+                # Anthropic and local models: o200k is close enough for budgeting
+                return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Encodings are downloaded on first use, which fails on offline agents
+            logger.warning(f"Could not load tokenizer for '{model}', using approximate token counts: {e}")
+            return None
+
+    def count(self, text: str) -> int:
+        """Count tokens in a text"""
+        if not text:
+            return 0
+        if self.encoding is None:
+            return (len(text) + 3) // 4
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """
+        Truncate a text to a number of tokens
+
+        Args:
+            text: Text to truncate
+            max_tokens: Maximum number of tokens to keep
+            keep: Part of the text to keep ('head', 'tail' or 'middle')
+
+        Returns:
+            Truncated text with an elision marker
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        marker = "\n... [truncated] ...\n"
+        budget = max(max_tokens - self.count(marker), 1)
+
+        if self.encoding is None:
+            chars = budget * 4
+            pieces = {"head": (text[:chars], ""), "tail": ("", text[-chars:])}
+            head, tail = pieces.get(keep, (text[:chars // 2], text[-(chars // 2):]))
+        else:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if keep == "head":
+                head, tail = self.encoding.decode(tokens[:budget]), ""
+            elif keep == "tail":
+                head, tail = "", self.encoding.decode(tokens[-budget:])
+            else:
+                half = budget // 2
+                head = self.encoding.decode(tokens[:half])
+                tail = self.encoding.decode(tokens[-(budget - half):])
+
+        return f"{head}{marker}{tail}"
+
+
+class PromptSection(BaseModel):
+    """A piece of context that may be included in a prompt"""
+    name: str = Field(description="Section title shown in the prompt")
+    text: str = Field(description="Section content")
+    priority: int = Field(default=50, description="Higher priority sections are kept first")
+    required: bool = Field(default=False, description="Always included (truncated if necessary)")
+    min_tokens: int = Field(default=64, description="Minimum useful size when truncated")
+    keep: str = Field(default="head", description="Part kept when truncated (head, tail, middle)")
+    fence: str = Field(default="", description="Code fence language, empty for plain text")
+
+
+class PromptBuilder:
+    """Fills a token budget with the most valuable context pieces"""
+
+    def __init__(self, model: Optional[str] = None, budget: Optional[int] = None):
+        self.counter = TokenCounter(model)
+        self.budget = budget or config.llm.prompt_token_budget
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, text: Any, priority: int = 50, **kwargs) -> "PromptBuilder":
+        """Add a context section (empty sections are ignored)"""
+        if text is None or text == "":
+            return self
+        self.sections.append(PromptSection(name=name, text=str(text), priority=priority, **kwargs))
+        return self
+
+    def add_failure_context(self, context: Dict[str, Any]) -> "PromptBuilder":
+        """Add the standard failure context pieces shared by all prompts"""
+        error_lines = [
+            f"Error Type: {context.get('error', 'Unknown')}",
+            f"Error Message: {context.get('message', 'Unknown')}",
+            f"URL: {context.get('url', 'Unknown')}",
+            f"Failed Selector: {context.get('selector', 'Unknown')}",
+            f"Test File: {context.get('test_file', 'Unknown')}",
+            f"Line Number: {context.get('line_number', 'Unknown')}",
+        ]
+        if context.get("error_class"):
+            error_lines.insert(1, f"Error Class: {context['error_class']}")
+        if context.get("hint"):
+            error_lines.append(f"Hint: {context['hint']}")
+        self.add("Failure", "\n".join(error_lines), PRIORITY_ERROR, required=True, min_tokens=32)
+        self.add(
+            "Original Code (that failed)", context.get("original_code"), PRIORITY_CODE,
+            required=True, fence="python",
+        )
+        self.add(
+            "Surrounding Source Lines", context.get("source_context"), PRIORITY_SOURCE_CONTEXT,
+            keep="middle", fence="python",
+        )
+        self.add(
+            "Previous Attempts (did not fix the test)", self._format_attempts(context.get("previous_attempts")),
+            PRIORITY_PREVIOUS_ATTEMPTS, keep="tail",
+        )
+        self._add_dom(context)
+        self.add(
+            "Accessibility Tree", context.get("accessibility_tree"), PRIORITY_ACCESSIBILITY,
+            min_tokens=128,
+        )
+        self.add("Network Errors", context.get("network_errors"), PRIORITY_NETWORK, keep="tail")
+        self.add("Browser Console Errors", context.get("console_logs"), PRIORITY_CONSOLE, keep="tail")
+        self.add("Stack Trace", context.get("stack_trace"), PRIORITY_STACK_TRACE, keep="tail")
+        return self
+
+    def _add_dom(self, context: Dict[str, Any]):
+        """
+        Add the DOM snapshot, reduced to the elements relevant to the failure when it is large
+
+        The elements nearest to the failed selector and the original code
+        (see dom_retrieval) are kept with their ancestors; a snapshot with
+        no element resembling them is sent whole, truncated to the budget.
+        """
+        html = compact_html(context.get("dom_snapshot", ""))
+        top_k = config.llm.dom_top_k
+        if top_k > 0 and self.counter.count(html) > config.llm.dom_retrieval_min_tokens:
+            query = f"{context.get('selector') or ''} {context.get('original_code') or ''}"
+            outline = relevant_dom(html, query, top_k)
+            if outline:
+                self.add(
+                    f"Relevant DOM Elements (the {top_k} nearest to the failed selector, with their ancestors)",
+                    outline, PRIORITY_DOM, min_tokens=128, fence="html",
+                )
+                return
+        self.add("DOM Snapshot (at time of failure)", html, PRIORITY_DOM, min_tokens=256, fence="html")
+
+    def _format_attempts(self, attempts: Optional[List[Dict[str, Any]]]) -> str:
+        """Format previous heal attempts for the prompt"""
+        if not attempts:
+            return ""
+        return "\n".join(
+            f"- {attempt.get('patch_code')} -> {attempt.get('error', 'failed')}" for attempt in attempts
+        )
+
+    def build(self, header: str = "", footer: str = "") -> str:
+        """
+        Assemble the prompt within the token budget
+
+        Sections are selected by priority and rendered in insertion order.
+
+        Args:
+            header: Fixed text placed before the sections (always included)
+            footer: Fixed text placed after the sections (always included)
+
+        Returns:
+            The assembled prompt
+        """
+        remaining = self.budget - self.counter.count(header) - self.counter.count(footer)
+        selected: Dict[int, str] = {}
+
+        order = sorted(
+            range(len(self.sections)), key=lambda i: (not self.sections[i].required, -self.sections[i].priority)
+        )
+        for index in order:
+            section = self.sections[index]
+            rendered = self._render(section, section.text)
+            tokens = self.counter.count(rendered)
+
+            if tokens <= remaining:
+                selected[index] = rendered
+                remaining -= tokens
+                continue
+
+            overhead = self.counter.count(self._render(section, ""))
+            available = remaining - overhead
+            if section.required or available >= section.min_tokens:
+                text = self.counter.truncate(section.text, max(available, section.min_tokens), section.keep)
+                rendered = self._render(section, text)
+                selected[index] = rendered
+                remaining -= self.counter.count(rendered)
+            else:
+                logger.debug(f"Prompt section '{section.name}' dropped ({tokens} tokens, {remaining} left)")
+
+        body = "\n\n".join(selected[i] for i in sorted(selected))
+        prompt = "\n\n".join(part for part in (header.strip("\n"), body, footer.strip("\n")) if part)
+
+        logger.debug(f"Prompt built: {self.counter.count(prompt)} tokens (budget {self.budget})")
+        return prompt + "\n"
+
+    def _render(self, section: PromptSection, text: str) -> str:
+        """Render a section with its title"""
+        if section.fence:
+            return f"**{section.name}:**\n```{section.fence}\n{text}\n```"
+        return f"**{section.name}:**\n{text}"
@@ -0,0 +1,213 @@
+"""
+Usage Tracker - Token and cost accounting for LLM interactions
+"""
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from ..core.config import config
+from ..core.event_bus import LLM_RESPONSE, event_bus
+from ..core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Prices in USD per 1M tokens: (input, output, cached input)
+MODEL_PRICING: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "claude-3-haiku": (0.25, 1.25, 0.03),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08),
+    "claude-3-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-opus": (15.00, 75.00, 1.50),
+}
+
+
+def get_model_pricing(model: str) -> Tuple[float, float, float]:
+    """
+    Get pricing for a model (longest matching prefix wins)
+
+    Local models (LM Studio) and unknown models are free.
+    """
+    if config.llm.openai_base_url and not config.llm.openai_base_url.startswith("https://api.openai.com"):
+        return (0.0, 0.0, 0.0)
+
+    name = (model or "").split("/")[-1]
+    matches = [prefix for prefix in MODEL_PRICING if name.startswith(prefix)]
+    if not matches:
+        logger.debug(f"No pricing known for model '{model}', assuming free")
+        return (0.0, 0.0, 0.0)
+    return MODEL_PRICING[max(matches, key=len)]
+
+
+class LLMCallUsage(BaseModel):
+    """Usage figures of a single LLM call"""
+    model: str = Field(default="unknown", description="Model identifier")
+    operation: str = Field(default="analysis", description="Kind of call (analysis, patch, ...)")
+    input_tokens: int = Field(default=0, description="Prompt tokens billed")
+    output_tokens: int = Field(default=0, description="Completion tokens billed")
+    cached_tokens: int = Field(default=0, description="Prompt tokens served from cache")
+    latency_ms: float = Field(default=0.0, description="Wall time of the call in milliseconds")
+    cost_usd: float = Field(default=0.0, description="Estimated cost in USD")
+
+
+class UsageTotals(BaseModel):
+    """Aggregated usage over several LLM calls"""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+
+    def add(self, usage: LLMCallUsage):
+        """Add a single call to the totals"""
+        self.calls += 1
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cached_tokens += usage.cached_tokens
+        self.latency_ms += usage.latency_ms
+        self.cost_usd += usage.cost_usd
+
+
+def _read(obj: Any, name: str, default: Any = None) -> Any:
+    """Read an attribute or a mapping key"""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def extract_usage(response: Any, model: str, operation: str, latency_ms: float) -> LLMCallUsage:
+    """
+    Build usage figures from a provider response
+
+    Supports OpenAI chat completions, Anthropic messages and Agent Framework run responses.
+
+    Args:
+        response: Raw response object returned by the provider
+        model: Model identifier used for the call
+        operation: Kind of call (analysis, patch, ...)
+        latency_ms: Measured wall time of the call
+
+    Returns:
+        LLMCallUsage with the estimated cost filled in
+    """
+    input_tokens = output_tokens = cached_tokens = 0
+
+    details = _read(response, "usage_details")
+    usage = _read(response, "usage")
+    if details is not None:
+        # Agent Framework (AgentRunResponse.usage_details)
+        input_tokens = _read(details, "input_token_count", 0) or 0
+        output_tokens = _read(details, "output_token_count", 0) or 0
+        additional = _read(details, "additional_counts", {}) or {}
+        cached_tokens = additional.get("openai.cached_input_tokens", 0) if isinstance(additional, dict) else 0
+    elif usage is not None:
+        if _read(usage, "prompt_tokens") is not None:
+            # OpenAI chat completions
+            input_tokens = _read(usage, "prompt_tokens", 0) or 0
+            output_tokens = _read(usage, "completion_tokens", 0) or 0
+            cached_tokens = _read(_read(usage, "prompt_tokens_details"), "cached_tokens", 0) or 0
+        else:
+            # Anthropic messages
+            input_tokens = _read(usage, "input_tokens", 0) or 0
+            output_tokens = _read(usage, "output_tokens", 0) or 0
+            cached_tokens = _read(usage, "cache_read_input_tokens", 0) or 0
+            input_tokens += cached_tokens
+
+    input_price, output_price, cached_price = get_model_pricing(model)
+    billed_input = max(input_tokens - cached_tokens, 0)
+    cost = (billed_input * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+    return LLMCallUsage(
+        model=model or "unknown",
+        operation=operation,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        latency_ms=round(latency_ms, 1),
+        cost_usd=round(cost, 6),
+    )
+
+
+def get_project_name(test_file: Optional[str]) -> str:
+    """Derive the project name from a test file path (parent of the 'tests' directory)"""
+    if not test_file:
+        return "unknown"
+    path = Path(test_file)
+    for parent in path.parents:
+        if parent.name == "tests":
+            return parent.parent.name
+    return path.parent.name or "unknown"
+
+
+class UsageTracker:
+    """Rolls up LLM usage per test, per run and per project"""
+
+    def __init__(self, max_run_cost: Optional[float] = None):
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.max_run_cost = config.llm.max_run_cost if max_run_cost is None else max_run_cost
+        self.run = UsageTotals()
+        self.by_test: Dict[str, UsageTotals] = {}
+        self.by_project: Dict[str, UsageTotals] = {}
+        self.by_model: Dict[str, UsageTotals] = {}
+
+    def record(self, usage: LLMCallUsage, test_id: Optional[str] = None, project: Optional[str] = None):
+        """Record one LLM call"""
+        was_exceeded = self.budget_exceeded
+        self.run.add(usage)
+        self.by_test.setdefault(test_id or "unknown", UsageTotals()).add(usage)
+        self.by_project.setdefault(project or "unknown", UsageTotals()).add(usage)
+        self.by_model.setdefault(usage.model, UsageTotals()).add(usage)
+
+        logger.debug(
+            f"LLM {usage.operation} call: {usage.input_tokens} in / {usage.output_tokens} out "
+            f"({usage.cached_tokens} cached), {usage.latency_ms:.0f} ms, ${usage.cost_usd:.4f}"
+        )
+        event_bus.publish(LLM_RESPONSE, test_id=test_id, project=project, **usage.model_dump())
+        if self.budget_exceeded and not was_exceeded:
+            logger.warning(f"Run budget reached: ${self.run.cost_usd:.4f} >= ${self.max_run_cost:.4f}")
+
+    @property
+    def budget_exceeded(self) -> bool:
+        """True when the run has spent its maximum budget (0 means unlimited)"""
+        return bool(self.max_run_cost) and self.run.cost_usd >= self.max_run_cost
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the usage roll-up of the current run"""
+        return {
+            "run_id": self.run_id,
+            "timestamp": datetime.now().isoformat(),
+            "run": self.run.model_dump(),
+            "by_test": {key: value.model_dump() for key, value in self.by_test.items()},
+            "by_project": {key: value.model_dump() for key, value in self.by_project.items()},
+            "by_model": {key: value.model_dump() for key, value in self.by_model.items()},
+        }
+
+    def save_summary(self, usage_file: Optional[Path] = None) -> Optional[Path]:
+        """Append the run roll-up to the usage history (JSON lines)"""
+        if not self.run.calls:
+            return None
+
+        usage_file = usage_file or config.llm.usage_file
+        usage_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(usage_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.summary()) + "\n")
+
+        logger.info(
+            f"LLM usage for run {self.run_id}: {self.run.calls} calls, "
+            f"{self.run.input_tokens + self.run.output_tokens} tokens, ${self.run.cost_usd:.4f}"
+        )
+        return usage_file
+
+
+# Global usage tracker for the current run
+usage_tracker = UsageTracker()
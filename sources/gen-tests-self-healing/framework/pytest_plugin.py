@@ -0,0 +1,405 @@
+"""
+Pytest Plugin - Self-healing Playwright tests without boilerplate
+
+Registered through the `pytest11` entry point (disable with `-p no:auto_heal`).
+Tests taking the `heal_page` fixture get a page of a browser launched once
+per session (once per worker with pytest-xdist) whose selectors heal in
+place; tests marked `auto_heal` are also healed and re-run when they fail.
+The project files each test loads are recorded, so `--changed-since REF`
+runs only the tests affected by the files changed since a git ref.
+
+Usage:
+    @pytest.mark.auto_heal(retries=2)
+    async def test_login(heal_page):
+        await heal_page.goto(URL)
+        await heal_page.click("#submit")
+"""
+import inspect
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import pytest
+import pytest_asyncio
+
+# Page fixture handed to the tests
+PAGE_FIXTURE = "heal_page"
+
+# User property carrying the heal results of a test (serialized by pytest-xdist)
+REPORT_PROPERTY = "auto_heal"
+
+_runner_key = pytest.StashKey[Any]()
+_loop_key = pytest.StashKey[Any]()
+_page_key = pytest.StashKey[Any]()
+_resources_key = pytest.StashKey[Set[str]]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("auto-heal", "Self-healing Playwright tests")
+    group.addoption(
+        "--no-auto-heal",
+        action="store_true",
+        default=False,
+        help="Run tests without healing (heal_page is a plain Playwright page)",
+    )
+    group.addoption(
+        "--auto-heal-retries",
+        type=int,
+        default=None,
+        help="Heal attempts of a failed auto_heal test (default: MAX_RETRIES)",
+    )
+    group.addoption(
+        "--changed-since",
+        default=None,
+        metavar="GIT_REF",
+        help="Only run the tests whose file or recorded page resources changed since a git ref",
+    )
+    group.addoption(
+        "--auto-heal-order",
+        default=None,
+        choices=("none", "failed-first", "longest-first"),
+        help="Run recently failing tests first, or the slowest first (default: TEST_ORDER)",
+    )
+    group.addoption(
+        "--auto-heal-shard",
+        default=None,
+        metavar="K/N",
+        help="Only run shard K of N, shards balanced by recorded test durations",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "auto_heal(retries=None): heal the test and re-run it when it fails",
+    )
+    config.pluginmanager.register(AutoHealReporter(), "auto_heal_reporter")
+
+
+def _uses_plugin(obj: Any) -> bool:
+    """True if a test function takes the heal page or is marked auto_heal"""
+    try:
+        parameters = inspect.signature(obj).parameters
+    except (TypeError, ValueError):
+        return False
+    marks = getattr(obj, "pytestmark", [])
+    return PAGE_FIXTURE in parameters or any(mark.name == "auto_heal" for mark in marks)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pycollect_makeitem(collector, name, obj):
+    # The browser lives in the session event loop: run the tests using it in the same loop
+    if not inspect.iscoroutinefunction(obj) or not _uses_plugin(obj):
+        return None
+    if not any(mark.name == "asyncio" for mark in getattr(obj, "pytestmark", [])):
+        pytest.mark.asyncio(loop_scope="session")(obj)
+    return None
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    from .core.config import config as heal_config
+
+    ref = config.getoption("changed_since")
+    shard = config.getoption("auto_heal_shard")
+    order = config.getoption("auto_heal_order") or heal_config.auto_heal.test_order
+    if not ref and not shard and order == "none":
+        return
+
+    from .core.test_history import TestHistory
+    from .core.test_order import ORDERS, order_tests
+
+    if order not in ORDERS:
+        raise pytest.UsageError(f"Unknown test order '{order}' (expected one of {', '.join(ORDERS)})")
+    history = TestHistory()
+    kept = _changed_tests(config, items, ref, history) if ref else items
+    stats = history.stats() if shard or order != "none" else {}
+    if shard:
+        kept = _shard_tests(kept, shard, stats)
+
+    if len(kept) < len(items):
+        kept_ids = {item.nodeid for item in kept}
+        config.hook.pytest_deselected(items=[item for item in items if item.nodeid not in kept_ids])
+
+    by_id = {item.nodeid: item for item in kept}
+    items[:] = [by_id[test_id] for test_id in order_tests(list(by_id), stats, order)]
+
+
+def _changed_tests(config, items: List[Any], ref: str, history) -> List[Any]:
+    """Tests whose file or recorded resources changed since a git ref"""
+    from .core.test_impact import changed_files, select_tests
+
+    root = config.rootpath
+    changed = changed_files(ref, root)
+    if changed is None:
+        return items
+    tests = {item.nodeid: Path(os.path.relpath(item.path, root)).as_posix() for item in items}
+    selected = select_tests(tests, history.resources(), changed)
+    if selected is None:
+        # conftest.py or pytest configuration changed: every test may be affected
+        return items
+    selected = set(selected)
+    return [item for item in items if item.nodeid in selected]
+
+
+def _shard_tests(items: List[Any], shard: str, stats: Dict[str, Dict[str, Any]]) -> List[Any]:
+    """Tests of one shard (K/N) of the suite, shards balanced by recorded durations"""
+    from .core.test_order import assign_shards, estimated_durations
+
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+        if not 1 <= index <= count:
+            raise ValueError
+    except ValueError:
+        raise pytest.UsageError(f"--auto-heal-shard expects K/N with 1 <= K <= N, got '{shard}'")
+
+    test_ids = [item.nodeid for item in items]
+    selected = set(assign_shards(test_ids, estimated_durations(test_ids, stats), count)[index - 1])
+    return [item for item in items if item.nodeid in selected]
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def auto_heal_runner(request):
+    """Runner and browser shared by the tests of the session (one per xdist worker)"""
+    import asyncio
+
+    from .core.test_runner import AutoHealTestRunner
+
+    runner = AutoHealTestRunner()
+    await runner.setup()
+    request.config.stash[_runner_key] = runner
+    request.config.stash[_loop_key] = asyncio.get_running_loop()
+    yield runner
+    await runner.teardown()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def heal_page(request, auto_heal_runner):
+    """
+    Page of a fresh browser context, healing its selectors in place
+
+    With --no-auto-heal (or HEAL_MODE=patch) this is a plain Playwright page.
+    """
+    from .core.config import config
+    from .core.event_bus import TEST_STARTED, event_bus
+
+    event_bus.publish(TEST_STARTED, test_id=request.node.nodeid)
+    context = await auto_heal_runner.browser.new_context()
+    context.set_default_timeout(config.playwright.timeout)
+    page = await context.new_page()
+    request.node.stash[_page_key] = page
+    request.node.stash[_resources_key] = _record_resources(page, request.config.rootpath)
+
+    if request.config.getoption("no_auto_heal"):
+        yield page
+    else:
+        yield auto_heal_runner.prepare_page(page, request.node.function, request.node.nodeid)
+    await context.close()
+
+
+def _record_resources(page, root: Path) -> Set[str]:
+    """Collect the project resources (pages, scripts, styles) a page loads"""
+    from .core.test_impact import resource_of
+
+    root = root.resolve()
+    resources: Set[str] = set()
+
+    def on_request(request):
+        resource = resource_of(request.url, root)
+        if resource:
+            resources.add(resource)
+
+    page.on("request", on_request)
+    return resources
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Log the messages of a test using the plugin with its node id (and retry number)"""
+    if PAGE_FIXTURE not in getattr(item, "fixturenames", ()):
+        yield
+        return
+
+    from .core.logger import log_context
+
+    with log_context(test_id=item.nodeid, retry=0):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if report.when != "call" or PAGE_FIXTURE not in getattr(item, "fixturenames", ()):
+        return
+
+    page = item.stash.get(_page_key, None)
+    test_page = item.funcargs.get(PAGE_FIXTURE)
+    result: Dict[str, Any] = {
+        "healed_in_place": getattr(test_page, "healed", 0),
+        "propagated": getattr(test_page, "propagated", 0),
+        "heal_seconds": getattr(test_page, "heal_seconds", 0.0),
+        "attempts": 0,
+        "status": "passed" if report.passed else "failed",
+    }
+
+    marker = item.get_closest_marker("auto_heal")
+    can_heal = (
+        report.failed
+        and marker is not None
+        and page is not None
+        and not item.config.getoption("no_auto_heal")
+        and not hasattr(report, "wasxfail")
+        and call.excinfo is not None
+        and isinstance(call.excinfo.value, Exception)
+    )
+    if can_heal:
+        retries = marker.kwargs.get("retries", item.config.getoption("auto_heal_retries"))
+        loop = item.config.stash[_loop_key]
+        start = time.perf_counter()
+        error = loop.run_until_complete(_heal_and_rerun(item, page, call.excinfo.value, retries, result))
+        result["heal_seconds"] += time.perf_counter() - start
+
+        if error is None:
+            result["status"] = "flaky" if result["status"] == "flaky" else "healed"
+            report.outcome = "passed"
+            report.longrepr = None
+        report.sections.append(("auto-heal", _describe(result, error)))
+    elif result["healed_in_place"] and report.passed:
+        result["status"] = "healed"
+
+    runner = item.config.stash.get(_runner_key, None)
+    if runner is not None:
+        from .core.event_bus import TEST_FINISHED, event_bus
+
+        heals = result["healed_in_place"] + result["attempts"]
+        runner.history.record(item.nodeid, result["status"], report.duration, heals=heals)
+        event_bus.publish(
+            TEST_FINISHED, test_id=item.nodeid, outcome=result["status"], duration=report.duration, heals=heals
+        )
+        resources = item.stash.get(_resources_key, None)
+        if resources and not can_heal and report.passed:
+            # Resources of a run that passed on its own page (used by --changed-since)
+            runner.history.record_resources(item.nodeid, resources)
+    if result["healed_in_place"] or result["attempts"] or result["status"] in ("flaky", "quarantined"):
+        report.user_properties.append((REPORT_PROPERTY, result))
+
+
+def _describe(result: Dict[str, Any], error: Optional[Exception]) -> str:
+    """Report section describing what the plugin did with a failed test"""
+    if result["status"] == "flaky":
+        return "passed on a plain re-run: flaky failure, not healed"
+    if result["status"] == "quarantined":
+        return "quarantined as flaky, not healed (auto-heal flaky --release to heal it again)"
+    message = str(error).splitlines()[0] if error is not None and str(error) else ""
+    return f"{result['attempts']} heal attempt(s), test {result['status']}" + (f": {message}" if message else "")
+
+
+def _call_test(item, test_func, page):
+    """Call a test function with its fixture values and another page"""
+    arguments = {name: item.funcargs[name] for name in item._fixtureinfo.argnames}
+    arguments[PAGE_FIXTURE] = page
+    # Hot reload swaps the code of the test in place, a module reload returns a new function
+    if test_func is item.function:
+        return item.obj(**arguments)
+    if item.instance is not None:
+        return test_func.__get__(item.instance)(**arguments)
+    return test_func(**arguments)
+
+
+async def _heal_and_rerun(item, page, error: Exception, retries: Optional[int], result: Dict[str, Any]):
+    """
+    Heal a failed test and re-run it on a fresh page until it passes
+
+    A failure that passes on a plain re-run is a flake and is not healed;
+    quarantined tests are not healed either.
+
+    Returns:
+        None if the test passed on a re-run, the last error otherwise
+    """
+    from .core.config import config
+    from .core.event_bus import RETRY, event_bus
+    from .core.logger import set_log_context
+
+    runner = item.config.stash[_runner_key]
+    retries = config.auto_heal.max_retries if retries is None else retries
+    test_func = item.function
+    attempts: List[Dict[str, Any]] = []
+
+    if await runner.flake_gate(lambda flake_page: _call_test(item, test_func, flake_page), item.nodeid):
+        result["status"] = "flaky"
+        return None
+    if runner.history.is_quarantined(item.nodeid):
+        result["status"] = "quarantined"
+        return error
+    attempted = getattr(item.funcargs.get(PAGE_FIXTURE), "attempted", None)
+    if attempted and attempted(error):
+        # The selector was already sent to the healer during the run
+        return error
+
+    while result["attempts"] < retries:
+        healed_func = await runner.heal_failure(page, error, test_func, attempts)
+        result["attempts"] += 1
+        if healed_func is None:
+            return error
+        test_func = healed_func
+        set_log_context(retry=result["attempts"])
+        event_bus.publish(RETRY, test_id=item.nodeid, reason="heal", attempt=result["attempts"])
+
+        context = await runner.browser.new_context()
+        context.set_default_timeout(config.playwright.timeout)
+        page = await context.new_page()
+        try:
+            await _call_test(item, test_func, runner.prepare_page(page, test_func, item.nodeid))
+            return None
+        except Exception as e:
+            error = e
+            if attempts:
+                attempts[-1]["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+        finally:
+            await context.close()
+    return error
+
+
+class AutoHealReporter:
+    """Collects heal results (from xdist workers too) and prints the heal summary"""
+
+    def __init__(self):
+        self.results: List[Dict[str, Any]] = []
+
+    def pytest_runtest_logreport(self, report):
+        # Runs in the controller for reports sent by pytest-xdist workers too
+        for name, value in report.user_properties:
+            if name == REPORT_PROPERTY:
+                self.results.append({"nodeid": report.nodeid, **value})
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.results:
+            return
+
+        terminalreporter.write_sep("=", "auto-heal summary")
+        for result in self.results:
+            parts = []
+            if result["healed_in_place"]:
+                parts.append(f"{result['healed_in_place']} selector(s) healed in place")
+            if result["propagated"]:
+                parts.append(f"{result['propagated']} reused from another call site")
+            if result["attempts"]:
+                parts.append(f"{result['attempts']} heal attempt(s)")
+            if result["status"] == "flaky":
+                parts.append("passed on a plain re-run")
+            if result["status"] == "quarantined":
+                parts.append("quarantined, not healed")
+            terminalreporter.write_line(f"{result['status'].upper():<11} {result['nodeid']} ({', '.join(parts)})")
+
+        counts = {status: sum(1 for result in self.results if result["status"] == status) for status in (
+            "healed", "flaky", "quarantined", "failed"
+        )}
+        terminalreporter.write_line(", ".join(f"{count} {status}" for status, count in counts.items() if count))
+
+        terminalreporter.write_sep("-", "auto-heal timings")
+        total = sum(result["heal_seconds"] for result in self.results)
+        for result in sorted(self.results, key=lambda result: result["heal_seconds"], reverse=True)[:10]:
+            terminalreporter.write_line(f"{result['heal_seconds']:8.2f}s {result['nodeid']}")
+        terminalreporter.write_line(f"{total:8.2f}s spent healing")
@@ -2,17 +2,23 @@
 Dev UI Server for GenTestsSH
 """
 import asyncio
+from typing import Optional
 from agent_framework.devui import serve
 from ..agents.agents import AgentFactory
 from ..core.logger import get_logger
+from .event_stream import serve_events
 
 logger = get_logger(__name__)
 
-def start_dev_ui(port: int = 8080):
+def start_dev_ui(port: int = 8080, events_port: Optional[int] = None):
     """
     Start the Dev UI server
+
+    The live event stream of the runs (SSE) is served next to it, on
+    events_port (port + 1 by default).
     """
     logger.info(f"Starting Dev UI on port {port}...")
+    events_server = serve_events(events_port or port + 1)
     
     # Import and create the workflow
     from ..agents.workflow import workflow
@@ -32,3 +38,5 @@ def start_dev_ui(port: int = 8080):
     except Exception as e:
         logger.error(f"Failed to start Dev UI: {e}")
         raise
+    finally:
+        events_server.shutdown()
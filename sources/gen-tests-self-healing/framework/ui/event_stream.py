@@ -0,0 +1,261 @@
+"""
+Event Stream - Server-Sent Events endpoint and live statistics of the run events
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from ..core.event_bus import (
+    FAILURE_CAPTURED, LLM_REQUEST, LLM_RESPONSE, PATCH_APPLIED, RETRY, TEST_FINISHED, TEST_STARTED, Event,
+    EventBus, event_bus,
+)
+from ..core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between two reads of the event log
+POLL_INTERVAL = 0.25
+
+# Seconds without events after which a keep-alive comment is sent
+KEEP_ALIVE = 15.0
+
+# Recent events kept in memory for the connected clients
+BUFFER_SIZE = 2000
+
+# Seconds of events the statistics cover
+STATS_WINDOW = 60.0
+
+# Latency of each phase: event type and payload field (converted to milliseconds)
+PHASES = {
+    "test": (TEST_FINISHED, "duration", 1000),
+    "capture": (FAILURE_CAPTURED, "seconds", 1000),
+    "llm": (LLM_RESPONSE, "latency_ms", 1),
+    "patch": (PATCH_APPLIED, "seconds", 1000),
+}
+
+
+def _log_id(event: Event) -> int:
+    """Position of an event read from the log (always set by EventBus.since())"""
+    return event.id or 0
+
+
+class EventStats:
+    """
+    Live statistics of the events of the last STATS_WINDOW seconds
+
+    Throughput counts finished tests, LLM calls and patches per minute;
+    queue depth counts the tests started and LLM requests sent that have
+    not finished yet by the runs active in the window (a crashed run stops
+    counting once it is silent); latency gives the mean and 95th percentile of each
+    phase (test, failure capture, LLM call, patch).
+    """
+
+    def __init__(self, window: float = STATS_WINDOW):
+        self.window = window
+        self._events: Deque[Event] = deque()
+        self._running: Set[Tuple[str, str]] = set()
+        self._llm_pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, event: Event):
+        """Account for an event"""
+        with self._lock:
+            self._events.append(event)
+            key = (event.run_id, str(event.data.get("test_id")))
+            if event.type == TEST_STARTED:
+                self._running.add(key)
+            elif event.type == TEST_FINISHED:
+                self._running.discard(key)
+            elif event.type == LLM_REQUEST:
+                self._llm_pending[event.run_id] = self._llm_pending.get(event.run_id, 0) + 1
+            elif event.type == LLM_RESPONSE and self._llm_pending.get(event.run_id):
+                self._llm_pending[event.run_id] -= 1
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Statistics of the current window"""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._events and self._events[0].timestamp < now - self.window:
+                self._events.popleft()
+            events = list(self._events)
+            active = {event.run_id for event in events}
+            running = sum(1 for run_id, _ in self._running if run_id in active)
+            llm_pending = sum(count for run_id, count in self._llm_pending.items() if run_id in active)
+
+        per_minute = 60.0 / self.window
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event.type] = counts.get(event.type, 0) + 1
+
+        latency = {}
+        for phase, (event_type, field, factor) in PHASES.items():
+            values = sorted(
+                event.data[field] * factor for event in events
+                if event.type == event_type and isinstance(event.data.get(field), (int, float))
+            )
+            latency[phase] = {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values), 1) if values else None,
+                "p95_ms": round(values[min(int(len(values) * 0.95), len(values) - 1)], 1) if values else None,
+            }
+
+        return {
+            "window_seconds": self.window,
+            "throughput_per_minute": {
+                "tests": round(counts.get(TEST_FINISHED, 0) * per_minute, 1),
+                "llm_calls": round(counts.get(LLM_RESPONSE, 0) * per_minute, 1),
+                "patches": round(counts.get(PATCH_APPLIED, 0) * per_minute, 1),
+                "retries": round(counts.get(RETRY, 0) * per_minute, 1),
+            },
+            "queue_depth": {"tests_running": running, "llm_pending": llm_pending},
+            "latency": latency,
+            "runs": len(active),
+        }
+
+
+class EventStream:
+    """
+    Tails the event log of every process and fans the events out to clients
+
+    A single thread reads the log every POLL_INTERVAL seconds, so any number
+    of connected clients costs one query per interval.
+    """
+
+    def __init__(self, bus: Optional[EventBus] = None):
+        self.bus = bus or event_bus
+        self.stats = EventStats()
+        self.last_id = self.bus.last_id()
+        self._recent: Deque[Event] = deque(maxlen=BUFFER_SIZE)
+        self._changed = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def start(self):
+        """Start tailing the event log"""
+        self._thread = threading.Thread(target=self._tail, name="auto-heal-event-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop tailing and release the waiting clients"""
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _tail(self):
+        while not self._stopped.is_set():
+            try:
+                events = self.bus.since(self.last_id)
+            except Exception as e:
+                logger.error(f"Could not read the event log: {e}")
+                events = []
+            if not events:
+                self._stopped.wait(POLL_INTERVAL)
+                continue
+            for event in events:
+                self.stats.add(event)
+            with self._changed:
+                self._recent.extend(events)
+                self.last_id = _log_id(events[-1])
+                self._changed.notify_all()
+
+    def wait(self, after_id: int, timeout: float) -> List[Event]:
+        """Events after an id, waiting up to timeout seconds for new ones"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.last_id > after_id or self._stopped.is_set(), timeout)
+            oldest = _log_id(self._recent[0]) if self._recent else self.last_id + 1
+            if after_id + 1 >= oldest:
+                return [event for event in self._recent if _log_id(event) > after_id]
+        # Client resuming from before the buffer: replay from the log
+        return self.bus.since(after_id)
+
+
+class EventStreamServer(ThreadingHTTPServer):
+    """HTTP server of the event stream (one thread per connected client)"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], stream: EventStream):
+        super().__init__(address, _Handler)
+        self.stream = stream
+
+    def shutdown(self):
+        self.stream.stop()
+        super().shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: EventStreamServer
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"Event stream: {format % args}")
+
+    def _headers(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/events":
+            self._events(parse_qs(url.query))
+        elif url.path == "/stats":
+            self._headers("application/json")
+            self.wfile.write(json.dumps(self.server.stream.stats.snapshot()).encode("utf-8"))
+        else:
+            self.send_error(404, "Unknown endpoint (use /events or /stats)")
+
+    def _events(self, query: Dict[str, List[str]]):
+        """Server-Sent Events: one `id`/`event`/`data` record per event, resumable with Last-Event-ID"""
+        stream = self.server.stream
+        resume = self.headers.get("Last-Event-ID") or (query.get("since") or [""])[0]
+        last_id = int(resume) if resume and resume.isdigit() else stream.last_id
+        types = set(",".join(query.get("types", [])).split(",")) - {""}
+
+        self._headers("text/event-stream")
+        sent_at = time.monotonic()
+        try:
+            while not stream.stopped:
+                events = stream.wait(last_id, KEEP_ALIVE)
+                for event in events:
+                    last_id = _log_id(event)
+                    if types and event.type not in types:
+                        continue
+                    payload = event.model_dump_json(exclude={"id"})
+                    self.wfile.write(f"id: {event.id}\nevent: {event.type}\ndata: {payload}\n\n".encode("utf-8"))
+                    sent_at = time.monotonic()
+                if time.monotonic() - sent_at >= KEEP_ALIVE:
+                    self.wfile.write(b": keep-alive\n\n")
+                    sent_at = time.monotonic()
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Event stream client disconnected")
+
+
+def serve_events(port: int = 8081, host: str = "127.0.0.1", bus: Optional[EventBus] = None) -> EventStreamServer:
+    """
+    Serve the run events in a background thread
+
+    Endpoints:
+        /events: Server-Sent Events stream (`?types=test_finished,retry`
+            filters, `?since=ID` or Last-Event-ID replays from an event)
+        /stats: Throughput, queue depth and per-phase latency (JSON)
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    stream = EventStream(bus)
+    stream.start()
+    server = EventStreamServer((host, port), stream)
+    threading.Thread(target=server.serve_forever, name="auto-heal-event-server", daemon=True).start()
+    logger.info(f"Event stream on http://{host}:{port}/events (statistics on /stats)")
+    return server
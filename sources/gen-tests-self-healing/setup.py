@@ -34,7 +34,7 @@ setup(
         "playwright>=1.40.0",
         "pytest>=8.0.0",
         "pytest-playwright>=0.4.0",
-        "pytest-asyncio>=0.23.0",
+        "pytest-asyncio>=0.24.0",
         "openai>=1.12.0",
         "anthropic>=0.18.0",
         "click>=8.1.0",
@@ -58,12 +58,24 @@ setup(
             "flake8>=7.0.0",
             "mypy>=1.8.0",
             "pytest-cov>=4.1.0",
+            "pytest-xdist>=3.5.0",
+        ],
+        # Perceptual deduplication of failure screenshots and WebP output
+        "imaging": [
+            "Pillow>=10.0.0",
+        ],
+        # Vectorized similarity of the DOM retrieval (pure Python without it)
+        "retrieval": [
+            "numpy>=1.24.0",
         ],
     },
     entry_points={
         "console_scripts": [
             "auto-heal=framework.cli:cli",
         ],
+        "pytest11": [
+            "auto_heal=framework.pytest_plugin",
+        ],
     },
     include_package_data=True,
 )
@@ -0,0 +1,133 @@
+"""
+Tests of the Playwright error classifier
+"""
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+from framework.core.error_classifier import (
+    ASSERTION, DETACHED, NAVIGATION, NOT_FOUND, NOT_VISIBLE, STRICT_MODE, TIMEOUT, UNKNOWN, classify_error,
+    parse_locator,
+)
+
+
+@pytest.mark.parametrize(
+    "error, error_class, selector",
+    [
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Timeout 30000ms exceeded.\nCall log:\n  - waiting for locator(\"#submit\")\n"
+            ),
+            NOT_FOUND, "#submit", id="not-found-timeout",
+        ),
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Timeout 5000ms exceeded.\nCall log:\n"
+                "  - waiting for get_by_role(\"button\", name=\"Log in\")\n"
+            ),
+            NOT_FOUND, 'get_by_role("button", name="Log in")', id="get-by-role-call-log",
+        ),
+        pytest.param(
+            AssertionError(
+                "Locator expected to be visible\nActual value: <element(s) not found>\nCall log:\n"
+                "  - Expect \"to_be_visible\" with timeout 5000ms\n  - waiting for locator(\"h1.title\")\n"
+            ),
+            NOT_FOUND, "h1.title", id="expect-element-not-found",
+        ),
+        pytest.param(
+            AssertionError(
+                "Locator expected to have text 'Welcome'\nActual value: Hello\nCall log:\n"
+                "  - Expect \"to_have_text\" with timeout 5000ms\n  - waiting for locator(\"h1\")\n"
+            ),
+            ASSERTION, "h1", id="expect-wrong-text",
+        ),
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Error: strict mode violation: locator(\"button\") resolved to 3 elements:\n"
+                "    1) <button>Save</button>\n"
+            ),
+            STRICT_MODE, "button", id="strict-mode",
+        ),
+        pytest.param(
+            PlaywrightError("Page.goto: net::ERR_CONNECTION_REFUSED at http://localhost:3000/\n"),
+            NAVIGATION, "unknown", id="net-err",
+        ),
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Timeout 30000ms exceeded.\nCall log:\n  - waiting for locator(\"#save\")\n"
+                "    - locator resolved to <button disabled id=\"save\">Save</button>\n"
+                "  - attempting click action\n    - element is not enabled\n"
+            ),
+            TIMEOUT, "#save", id="not-enabled",
+        ),
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Timeout 30000ms exceeded.\nCall log:\n  - waiting for locator(\"#menu\")\n"
+                "    - element is not visible\n"
+            ),
+            NOT_VISIBLE, "#menu", id="not-visible",
+        ),
+        pytest.param(
+            PlaywrightError("Locator.click: Element is not attached to the DOM\nCall log:\n"
+                            "  - waiting for locator(\"#row\")\n"),
+            DETACHED, "#row", id="detached",
+        ),
+        pytest.param(
+            PlaywrightError(
+                "Locator.click: Timeout 30000ms exceeded.\nCall log:\n"
+                "  - waiting for locator(\"form\").get_by_role(\"button\").first\n"
+            ),
+            NOT_FOUND, 'locator("form").get_by_role("button").first', id="chained-first",
+        ),
+        pytest.param(ValueError("invalid literal for int()"), UNKNOWN, "unknown", id="test-code-error"),
+    ],
+)
+def test_classify_error(error, error_class, selector):
+    classification = classify_error(error)
+
+    assert classification.error_class == error_class
+    assert classification.selector == selector
+
+
+def test_strict_mode_reports_the_match_count():
+    error = PlaywrightError("strict mode violation: get_by_text(\"Delete\") resolved to 2 elements")
+
+    assert classify_error(error).matches == 2
+
+
+def test_not_found_is_healable_and_navigation_is_not():
+    assert classify_error(PlaywrightError(
+        "Timeout 1000ms exceeded.\nCall log:\n  - waiting for locator(\"#a\")\n"
+    )).healable
+    assert not classify_error(PlaywrightError("Page.goto: net::ERR_NAME_NOT_RESOLVED")).healable
+
+
+@pytest.mark.parametrize(
+    "expression, method, selector, options",
+    [
+        pytest.param('locator("#submit")', "locator", "#submit", {}, id="locator"),
+        pytest.param(
+            'get_by_role("button", name="Log in", exact=True)', "get_by_role", "button",
+            {"name": "Log in", "exact": True}, id="get-by-role",
+        ),
+        pytest.param(
+            'locator("form").get_by_label("Email").first', "get_by_label", "Email", {}, id="chained-first",
+        ),
+        pytest.param(
+            'get_by_text(re.compile("welcome", re.IGNORECASE))', "get_by_text",
+            "re.compile('welcome', re.IGNORECASE)", {}, id="regex-argument",
+        ),
+        pytest.param("internal:role=button", "locator", "internal:role=button", {}, id="selector-engine"),
+    ],
+)
+def test_parse_locator(expression, method, selector, options):
+    locator = parse_locator(expression)
+
+    assert locator.method == method
+    assert locator.selector == selector
+    assert locator.options == options
+
+
+def test_parse_locator_heal_selector():
+    assert parse_locator('locator("#submit")').heal_selector == "#submit"
+    assert parse_locator('locator("form").locator("#submit")').heal_selector == 'locator("form").locator("#submit")'
+    assert parse_locator("not a locator ()") is None
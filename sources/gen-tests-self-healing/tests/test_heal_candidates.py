@@ -0,0 +1,17 @@
+"""
+Tests of the candidate selectors of a heal
+"""
+from framework.core.heal_candidates import parse_selector
+
+
+def test_role_call_with_exact_name_becomes_a_case_sensitive_role_selector():
+    assert parse_selector('page.get_by_role("button", name="Log in", exact=True)') == (
+        'role=button[name="Log in"s]', None
+    )
+    assert parse_selector('get_by_role("button", name="Log in")') == ('role=button[name="Log in"]', None)
+
+
+def test_role_call_options_become_role_attributes():
+    assert parse_selector('get_by_role("checkbox", checked=True, include_hidden=True, exact=True)') == (
+        "role=checkbox[checked=true][include-hidden=true]", None
+    )
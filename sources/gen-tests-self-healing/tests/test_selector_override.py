@@ -0,0 +1,100 @@
+"""
+Tests of the selector override proxy
+"""
+import asyncio
+
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+from framework.core.collectors import ContextCapture, SourceCollector
+from framework.core.config import config
+from framework.core.heal_ledger import HealLedger
+from framework.core.selector_override import HealingPage, HealMap
+
+
+class FakeLocator:
+    """Locator matching only the healed selector"""
+
+    def __init__(self, selector: str):
+        self.selector = selector
+
+    @property
+    def _impl_obj(self) -> "FakeLocator":
+        return self
+
+    async def count(self) -> int:
+        return 1 if self.selector == "#healed" else 0
+
+    async def click(self, **kwargs):
+        if self.selector != "#healed":
+            raise PlaywrightError(
+                f"click: Timeout 30000ms exceeded.\nCall log:\n  - waiting for locator('{self.selector}')\n"
+            )
+
+
+class FakePage:
+    """Page of a loaded document, without browser"""
+
+    url = "http://localhost/login"
+
+    def on(self, event, handler):
+        pass
+
+    def locator(self, selector: str) -> FakeLocator:
+        return FakeLocator(selector)
+
+    async def evaluate(self, expression: str) -> str:
+        return "complete"
+
+
+def test_in_place_heal_locates_the_failing_test_statement(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.playwright, "fail_fast_probe", 0)
+    raw = FakePage()
+    captured = {}
+
+    async def scenario(page):
+        await page.locator("#submit").click()
+
+    async def healer(selector, site, error, location):
+        context = await ContextCapture([SourceCollector()]).capture(
+            raw, error, scenario, {"call_location": location}
+        )
+        captured.update(context)
+        return {"selector": "#healed", "confidence": 0.9}
+
+    page = HealingPage(raw, HealMap(HealLedger(tmp_path / "ledger.db")), healer)
+    asyncio.run(scenario(page))
+
+    assert page.healed == 1
+    assert captured["line_number"] == scenario.__code__.co_firstlineno + 1
+    assert captured["original_code"] == 'await page.locator("#submit").click()'
+
+
+def test_expect_uses_the_heal_verified_on_the_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.playwright, "fail_fast_probe", 0)
+
+    async def healer(selector, site, error, location):
+        return {"selector": "#healed", "confidence": 0.9}
+
+    page = HealingPage(FakePage(), HealMap(HealLedger(tmp_path / "ledger.db")), healer)
+    asyncio.run(page.locator("#submit").click())
+
+    # What expect() reads from the locator it is given, at another statement
+    assert page.locator("#submit")._impl_obj.selector == "#healed"
+    assert page.locator("#other")._impl_obj.selector == "#other"
+
+
+def test_rejected_error_does_not_reuse_the_page_heal(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.playwright, "fail_fast_probe", 0)
+    heal_map = HealMap(HealLedger(tmp_path / "ledger.db"))
+    heal_map.put("#submit", "elsewhere", "#healed", None, {"confidence": 0.9}, page=FakePage.url)
+
+    async def healer(selector, site, error, location):
+        raise AssertionError("the healer must not be called")
+
+    page = HealingPage(FakePage(), heal_map, healer, may_heal=lambda error: False)
+    with pytest.raises(PlaywrightError):
+        asyncio.run(page.locator("#submit").click())
+
+    assert page.propagated == 0
+    assert len(heal_map) == 1
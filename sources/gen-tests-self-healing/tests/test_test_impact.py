@@ -0,0 +1,60 @@
+"""
+Tests of the selection of the tests affected by changed files
+"""
+import pytest
+
+from framework.core.test_impact import _matches, select_tests
+
+TESTS = {
+    "tests/test_login.py::test_a": "tests/test_login.py",
+    "tests/test_cart.py::test_b": "tests/test_cart.py",
+}
+
+RESOURCES = {
+    "tests/test_login.py::test_a": {"src/index.html"},
+    "tests/test_cart.py::test_b": {"src/cart.html", "url:/static/cart.js"},
+}
+
+
+@pytest.mark.parametrize(
+    "changed, selected",
+    [
+        pytest.param(["tests/test_login.py"], ["tests/test_login.py::test_a"], id="test-file"),
+        pytest.param(["src/cart.html"], ["tests/test_cart.py::test_b"], id="file-resource"),
+        pytest.param(["public/static/cart.js"], ["tests/test_cart.py::test_b"], id="served-resource"),
+        pytest.param(["README.md"], [], id="unrelated-file"),
+        pytest.param(["tests/test_other.py"], [], id="other-test-file"),
+    ],
+)
+def test_select_tests(changed, selected):
+    assert select_tests(TESTS, RESOURCES, changed) == selected
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        pytest.param(["tests/conftest.py"], id="conftest"),
+        pytest.param(["pytest.ini"], id="pytest-config"),
+        pytest.param(["tests/pages/login_page.py"], id="page-object"),
+        pytest.param(["../gen-tests-self-healing/framework/core/config.py"], id="framework-module"),
+    ],
+)
+def test_global_changes_select_every_test(changed):
+    assert select_tests(TESTS, RESOURCES, changed) is None
+
+
+def test_tests_without_recorded_resources_are_always_selected():
+    assert select_tests(TESTS, {}, ["README.md"]) == list(TESTS)
+
+
+@pytest.mark.parametrize(
+    "resource, changed, matched",
+    [
+        pytest.param("src/index.html", {"src/index.html"}, True, id="same-file"),
+        pytest.param("src/index.html", {"src/other.html"}, False, id="other-file"),
+        pytest.param("url:/static/app.js", {"public/static/app.js"}, True, id="url-path-suffix"),
+        pytest.param("url:/app.js", {"public/static/webapp.js"}, False, id="url-partial-name"),
+    ],
+)
+def test_matches(resource, changed, matched):
+    assert _matches(resource, changed) is matched
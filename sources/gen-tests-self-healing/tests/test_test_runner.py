@@ -0,0 +1,72 @@
+"""
+Tests of the candidate selection of the test runner
+"""
+import asyncio
+
+import pytest
+
+from framework.core.config import config
+from framework.core.heal_candidates import HEURISTIC_CONFIDENCE, SOURCE_HEURISTIC
+from framework.core.test_runner import AutoHealTestRunner
+
+
+class FakeLocator:
+    """Locator matching one element for the selectors of the page"""
+
+    def __init__(self, page: "FakePage", selector: str):
+        self.page = page
+        self.selector = selector
+
+    async def count(self) -> int:
+        return 1 if self.selector in self.page.selectors else 0
+
+
+class FakePage:
+    """Page holding the elements of some selectors, without browser"""
+
+    def __init__(self, *selectors: str):
+        self.selectors = set(selectors)
+
+    def locator(self, selector: str) -> FakeLocator:
+        return FakeLocator(self, selector)
+
+    def get_by_test_id(self, selector: str) -> FakeLocator:
+        return FakeLocator(self, f"[data-testid={selector}]")
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    monkeypatch.setattr(config.auto_heal, "heal_candidates", 6)
+    # Candidate selection only needs the page, not the agents or the browser
+    return AutoHealTestRunner.__new__(AutoHealTestRunner)
+
+
+def test_low_confidence_heuristic_candidate_is_rejected(runner, monkeypatch):
+    monkeypatch.setattr(config.auto_heal, "confidence_threshold", 0.7)
+    page = FakePage('[name="submit-btn"]')
+    patch_info = {"selector": "#send", "confidence": 0.9}
+
+    assert asyncio.run(runner._select_candidate(page, "#submit-btn", patch_info)) is None
+
+
+def test_winning_heuristic_candidate_carries_its_own_confidence(runner, monkeypatch):
+    monkeypatch.setattr(config.auto_heal, "confidence_threshold", HEURISTIC_CONFIDENCE)
+    page = FakePage('[name="submit-btn"]')
+    patch_info = {"selector": "#send", "confidence": 0.9}
+
+    selected = asyncio.run(runner._select_candidate(page, "#submit-btn", patch_info))
+
+    assert selected["selector"] == '[name="submit-btn"]'
+    assert selected["candidate_source"] == SOURCE_HEURISTIC
+    assert selected["confidence"] == HEURISTIC_CONFIDENCE
+
+
+def test_confident_llm_selector_is_kept(runner, monkeypatch):
+    monkeypatch.setattr(config.auto_heal, "confidence_threshold", 0.7)
+    page = FakePage("#send", '[name="submit-btn"]')
+    patch_info = {"selector": "#send", "confidence": 0.9}
+
+    selected = asyncio.run(runner._select_candidate(page, "#submit-btn", patch_info))
+
+    assert selected["selector"] == "#send"
+    assert selected["confidence"] == 0.9
@@ -0,0 +1,13 @@
+"""
+Pytest configuration for project-sample-1
+"""
+import sys
+from pathlib import Path
+
+try:
+    # The installed package registers the auto-heal pytest plugin itself
+    import framework  # noqa: F401
+except ImportError:
+    # Fallback: load the framework and its plugin from the repository
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent / "gen-tests-self-healing"))
+    pytest_plugins = ["framework.pytest_plugin"]